@@ -1,28 +1,48 @@
 #!/usr/bin/env python3
 
 """
-Convert a Dynalist doc to a Markdown file.
+Convert a Dynalist doc to a Markdown or HTML file.
 """
 
 # Python
 import argparse
 import logging
+import os
 import sys
 
 # Project
 from dynalist_utils import app_utils
+from dynalist_utils import export
+from dynalist_utils import html_export
 from dynalist_utils import markdown
 
+CSS_FILENAME = os.path.join(os.path.dirname(os.path.realpath(__file__)), "dl2md.css")
+
 
 def main():
     """ Check args and download doc """
     try:
         args = get_arguments()
         doc = app_utils.read_doc(args)
-        zoom_node_id = doc.get_metadata()["zoom_node_id"]
+        zoom_node_id = doc.get_metadata().get("zoom_node_id")
         if not zoom_node_id:
             zoom_node_id = "root"
-        args.outfile.write(markdown.convert(doc, zoom_node_id))
+        children = app_utils.get_search_tree(args, doc, zoom_node_id,
+                                             bool(args.outdir or args.incremental))
+        css = None
+        if args.format == "html":
+            with open(args.css) as css_file:
+                css = css_file.read()
+        if args.outdir:
+            export_all(doc, zoom_node_id, css, args)
+        elif args.incremental:
+            result = export.export_incremental(doc, zoom_node_id, args.incremental,
+                                               args.format, css)
+            logging.info("Rendered %d sections, reused %d.", result.rendered, result.reused)
+        elif args.format == "html":
+            html_export.write(doc, zoom_node_id, args.outfile, css, children=children)
+        else:
+            markdown.write(doc, zoom_node_id, args.outfile, children=children)
     except Exception: # pylint: disable=broad-except
         logging.exception("An error occured.")
         sys.exit(1)
@@ -30,15 +50,60 @@ def main():
 
 def get_arguments():
     """ Parse command line arguments """
-    parser = argparse.ArgumentParser(description="Convert a Dynalist doc to a Markdown file.")
+    parser = argparse.ArgumentParser(
+        description="Convert a Dynalist doc to a Markdown or HTML file.")
     app_utils.add_argument_url(parser)
     app_utils.add_argument_infile(parser)
     app_utils.add_argument_token(parser)
     app_utils.add_argument_outfile(parser)
     app_utils.add_argument_cached(parser)
+    app_utils.add_argument_compact(parser)
+    parser.add_argument("--query",
+                        help="Render only the nodes matching this Dynalist search, "
+                        "with their ancestors (default: the #q= of --url, if any, "
+                        "unless exporting with --outdir or --incremental)")
+    parser.add_argument("--format",
+                        choices=["markdown", "html"],
+                        default="markdown",
+                        help="Output format (default: %(default)s)")
+    parser.add_argument("--css",
+                        action="store",
+                        default=CSS_FILENAME,
+                        help="Stylesheet to inline in HTML output (default: dl2md.css)")
+    parser.add_argument("--outdir",
+                        action="store",
+                        help="Write each child of the zoom node, or each --node, "
+                        "to its own file in this directory")
+    parser.add_argument("--node",
+                        action="append",
+                        help="Node id to export with --outdir; may be given more than once")
+    parser.add_argument("--incremental",
+                        action="store",
+                        metavar="FILE",
+                        help="Write to FILE, only re-rendering the sections that "
+                        "changed since the last run (tracked in FILE.manifest.json)")
+    parser.add_argument("--workers",
+                        type=int,
+                        help="Number of processes rendering with --outdir "
+                        "(default: one per CPU)")
     return parser.parse_args()
 
 
+def export_all(doc, zoom_node_id, css, args):
+    """ Render many subtrees of the doc in parallel, one file each """
+    node_ids = args.node or [child["id"] for child in doc.get_children(zoom_node_id)]
+    failures = 0
+    for result in export.export_subtrees(doc, node_ids, args.outdir, args.format, css,
+                                         args.workers):
+        if result.error:
+            logging.error("Could not export %s: %s", result.node_id, result.error)
+            failures += 1
+            continue
+        logging.info("Wrote %s", result.filename)
+    if failures:
+        raise Exception("ERROR: {} of {} exports failed.".format(failures, len(node_ids)))
+
+
 if __name__ == "__main__":
     main()
 
@@ -1,10 +1,8 @@
 #!/usr/bin/env bash
 
-# This is a convenience script for creating HTML and PDF from DynaList
-# using Pandoc.
+# This is a convenience script for creating Markdown, HTML and PDF from
+# DynaList.  The document is downloaded once and converted locally.
 #
-# - You may need a more recent version of Pandoc than comes with your
-#   system to support HTML->PDF with stylesheets.
 # - Set the DL2MD_OUTPUT_FOLDER to the absolute path of your output folder.
 # - You may set DL2MD_OUTPUT_FILENAME if you wish, default 'dl2md'
 # - Requires xclip to copy Dynalist URL from the clipboard.
@@ -45,39 +43,36 @@ if [ -z "$DL2MD_OUTPUT_FILENAME" ]; then
     export DL2MD_OUTPUT_FILENAME="dl2md"
 fi
 
-# Copy stylesheet if needed
-STYLESHEET_SOURCE_FILENAME="${DIR}/dl2md.css"
-STYLESHEET_TARGET_FILENAME="${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.css"
-if [ ! -f "${STYLESHEET_TARGET_FILENAME}" ]; then
-    cp ${STYLESHEET_SOURCE_FILENAME} ${STYLESHEET_TARGET_FILENAME}
-fi
-
 # Create json file from Dynalist
 ${DIR}/../dlget/dlget \
     --url "${DL2MD_DYNALIST_URL}" \
-    --outfile "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.json"
+    --outfile "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.json" \
+    || exit 1
 
-# Create md file from Dynalist
+# Create md file from the downloaded json, re-rendering only what changed
 ${DIR}/dl2md \
-    --url "${DL2MD_DYNALIST_URL}" \
-    --outfile "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.md"
+    --infile "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.json" \
+    --incremental "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.md" \
+    || exit 1
 
-# Create html file
-pandoc \
-    --standalone \
-    --css ${DL2MD_OUTPUT_FILENAME}.css \
-    --output "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.html" \
-    "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.md" \
+# Create html file, with the stylesheet inlined
+${DIR}/dl2md \
+    --format html \
+    --infile "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.json" \
+    --incremental "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.html" \
+    || exit 1
 
-# Create PDF file
-pandoc \
-    --standalone \
-    --css "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.css" \
-    --variable papersize=Letter \
-    --variable margin-left=1in \
-    --variable margin-right=1in \
-    --variable margin-top=1in \
-    --variable margin-bottom=1in \
-    --pdf-engine=wkhtmltopdf \
-    --output "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.pdf" \
-    "${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.md" \
+# Create PDF file, unless the html file didn't change
+HTML_FILENAME="${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.html"
+PDF_FILENAME="${DL2MD_OUTPUT_FOLDER}/${DL2MD_OUTPUT_FILENAME}.pdf"
+if [ "${HTML_FILENAME}" -nt "${PDF_FILENAME}" ]; then
+    wkhtmltopdf \
+        --quiet \
+        --page-size Letter \
+        --margin-left 1in \
+        --margin-right 1in \
+        --margin-top 1in \
+        --margin-bottom 1in \
+        "${HTML_FILENAME}" \
+        "${PDF_FILENAME}"
+fi
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
 """
-Download a Dynalist document to a JSON file.
+Download Dynalist documents to JSON files.
 """
 
 # Python
@@ -12,17 +12,32 @@ import sys
 
 # Project
 from dynalist_utils import app_utils
-from dynalist_utils import dynalist
+from dynalist_utils import batch
+from dynalist_utils import sync
 
 
 def main():
     """ Check args and download doc """
     try:
         args = get_arguments()
+        logging.basicConfig(format=app_utils.LOGGING_FORMAT,
+                            level=logging.DEBUG if args.trace else logging.WARNING)
         token = app_utils.get_token(args, os.environ)
-        url = app_utils.get_url(args, os.environ)
-        doc = dynalist.Document.from_url(url, token)
-        args.outfile.write(doc.to_json())
+        if args.all:
+            refs = batch.list_document_ids(token)
+        elif args.url:
+            refs = args.url
+        else:
+            refs = [app_utils.get_url(args, os.environ)]
+        if args.sync:
+            sync_all(refs, token, args)
+        elif args.outdir:
+            download_all(refs, token, args)
+        elif len(refs) == 1:
+            doc = batch.load_document(refs[0], token)
+            args.outfile.write(doc.to_json())
+        else:
+            raise Exception("ERROR: Please pass --outdir to download more than one document.")
     except Exception: # pylint: disable=broad-except
         logging.exception("An error occured.")
         sys.exit(1)
@@ -30,13 +45,64 @@ def main():
 
 def get_arguments():
     """ Parse command line arguments """
-    parser = argparse.ArgumentParser(description="Download a Dynalist document to a JSON file.")
-    app_utils.add_argument_url(parser)
+    parser = argparse.ArgumentParser(description="Download Dynalist documents to JSON files.")
+    parser.add_argument("--url",
+                        action="append",
+                        help="Dynalist URL or doc id, may be repeated, "
+                        "or set DYNALIST_URL env var")
+    parser.add_argument("--all",
+                        action="store_true",
+                        help="Download every document in the account")
     app_utils.add_argument_token(parser)
     app_utils.add_argument_outfile(parser)
+    parser.add_argument("--outdir",
+                        action="store",
+                        help="Write each document to <doc id>.json in this directory")
+    parser.add_argument("--workers",
+                        type=int,
+                        default=batch.DEFAULT_MAX_WORKERS,
+                        help="Number of documents to download at once (default: %(default)s)")
+    parser.add_argument("--rate",
+                        type=float,
+                        help="Maximum number of downloads to start per second")
+    parser.add_argument("--sync",
+                        action="store_true",
+                        help="Keep --outdir up to date, only downloading documents "
+                        "whose version changed since the last run")
+    app_utils.add_argument_trace(parser)
     return parser.parse_args()
 
 
+def download_all(refs, token, args):
+    """ Download documents concurrently, one JSON file per document """
+    os.makedirs(args.outdir, exist_ok=True)
+    failures = 0
+    for result in batch.load_documents(refs, token, args.workers, args.rate):
+        if result.error:
+            logging.error("Could not download %s: %s", result.ref, result.error)
+            failures += 1
+            continue
+        filename = os.path.join(args.outdir, result.doc.get_metadata()["doc_id"] + ".json")
+        with open(filename, "w") as outfile:
+            outfile.write(result.doc.to_json())
+        logging.info("Wrote %s", filename)
+    if failures:
+        raise Exception("ERROR: {} of {} downloads failed.".format(failures, len(refs)))
+
+
+def sync_all(refs, token, args):
+    """ Download only the documents that changed since the last sync """
+    if not args.outdir:
+        raise Exception("ERROR: Please pass --outdir with --sync.")
+    doc_ids = [batch.get_doc_id(ref) for ref in refs]
+    result = sync.SyncDirectory(args.outdir).sync(doc_ids, token, args.workers, args.rate)
+    logging.info("Updated %d, unchanged %d, failed %d.",
+                 len(result.updated), len(result.unchanged), len(result.failed))
+    if result.failed:
+        raise Exception("ERROR: {} of {} downloads failed.".format(
+            len(result.failed), len(doc_ids)))
+
+
 if __name__ == "__main__":
     main()
 
@@ -13,8 +13,6 @@ import sys
 
 # Project
 from dynalist_utils import app_utils
-from dynalist_utils import dynalist
-from dynalist_utils import markdown
 
 class Level(enum.Enum):
     """ Enumerates message levels """
@@ -48,25 +46,25 @@ def get_arguments():
 
 def check_bad_internal_links(doc):
     """ Check for internal links that don't point to a valid node. """
-    for node in doc.get_nodes():
-        links = markdown.find_links(node["content"])
-        if "note" in node:
-            links.extend(markdown.find_links(node["note"]))
-        for link in links:
-            try:
-                url = dynalist.parse_url(link["url"])
-            except dynalist.ParseException:
-                continue
-            if not url:
-                continue
-            if url["doc_id"] != doc.get_metadata()["file_id"]:
-                continue
-            if "zoom_node_id" not in url:
-                continue
-            if doc.has_node(url["zoom_node_id"]):
-                continue
-            logging.warning("Target node does not exist:\nNode id: %s\nContent: %s\nBad link: %s",
-                            node["id"], node["content"], link["url"])
+    file_id = doc.get_metadata()["file_id"]
+    for link in doc.iter_links():
+        url = link.target
+        if not url:
+            continue
+        if url["doc_id"] != file_id:
+            continue
+        if doc.has_node(url["zoom_node_id"]):
+            continue
+        node = doc.get_node(link.source_id)
+        logging.warning("Target node does not exist:\nNode id: %s\nPath: %s\n"
+                        "Content: %s\nBad link: %s",
+                        node["id"], get_breadcrumb(doc, node["id"]),
+                        node["content"], link.url)
+
+
+def get_breadcrumb(doc, node_id):
+    """ Returns the contents of the node's ancestors, joined with ' > '. """
+    return " > ".join(ancestor["content"] for ancestor in doc.get_path(node_id)[:-1])
 
 
 if __name__ == "__main__":
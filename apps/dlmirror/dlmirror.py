@@ -12,30 +12,36 @@ This script will find mirror nodes in a document and update their title,
 note, etc. to be an exact duplicate of the source node, plus a mirror link
 at the end of the note.
 
+A mirror node may mirror another mirror node; it then gets the original
+source's content and note, with its own mirror link.  Mirrors that mirror
+themselves through a cycle are reported and left alone.
+
 This script is idempotent -- if there are no mirror nodes, or if the nodes
-are already up-to-date, the document will be unchanged.
+are already up-to-date, the document will be unchanged.  With --state, it
+remembers fingerprints of each mirror's source from the previous run and
+only examines the mirrors whose source changed.
+With --watch, it keeps running and syncs whenever the document changes.
 
 """
 
 # Python
 import argparse
+import json
 import logging
+import signal
 import sys
 import os
-from collections import namedtuple
-from typing import List
-
-# Libraries
-import requests
+import threading
 
 # Project
 from dynalist_utils import app_utils
+from dynalist_utils import batch
+from dynalist_utils import cache
+from dynalist_utils import client
 from dynalist_utils import dynalist
-from dynalist_utils import markdown
-
-MIRROR_LINK_TEXT = "mirror"
-
-MirrorNode = namedtuple("MirrorNode", ["source_node", "target_node", "link"])
+from dynalist_utils import edits
+from dynalist_utils import mirror
+from dynalist_utils import mirror_watch
 
 def main():
     """ Check args and download doc """
@@ -43,10 +49,15 @@ def main():
         args = get_arguments()
         logging.basicConfig(format=app_utils.LOGGING_FORMAT,
                             level=logging.DEBUG if args.trace else logging.WARNING)
+        if args.watch:
+            run_watch(args)
+            return
         doc = app_utils.read_doc(args)
-        mirror_nodes = find_mirror_nodes(doc)
+        plan = mirror.plan_changes(doc, read_state(args.state))
+        logging.info("Examined %d mirror nodes, skipped %d unchanged.",
+                     plan.examined, plan.skipped)
         token = app_utils.get_token(args, os.environ)
-        update_dynalist(doc, token, mirror_nodes)
+        update_dynalist(doc, token, plan, args)
     except Exception: # pylint: disable=broad-except
         logging.exception("An error occured.")
         sys.exit(1)
@@ -56,106 +67,115 @@ def get_arguments():
     """ Parse command line arguments """
     parser = argparse.ArgumentParser(description="Mirror nodes in a Dynalist document")
     app_utils.add_standard_arguments(parser)
+    parser.add_argument("--dry-run",
+                        action="store_true",
+                        help="Print the changes instead of making them")
+    parser.add_argument("--chunk-size",
+                        type=int,
+                        default=edits.MAX_CHANGES_PER_EDIT,
+                        help="Most changes to send in one request (default: %(default)s)")
+    parser.add_argument("--rate",
+                        type=float,
+                        default=edits.DEFAULT_EDIT_RATE,
+                        help="Most edit requests per second, on average "
+                        "(default: %(default)s)")
+    parser.add_argument("--no-verify",
+                        action="store_true",
+                        help="Don't read the document back to check the changes")
+    parser.add_argument("--state",
+                        help="File to keep mirror fingerprints in between runs, so "
+                        "unchanged mirrors are skipped")
+    parser.add_argument("--watch",
+                        action="store_true",
+                        help="Keep running, updating the mirrors whenever the document "
+                        "changes")
+    parser.add_argument("--poll-interval",
+                        type=float,
+                        default=mirror_watch.DEFAULT_POLL_INTERVAL,
+                        help="Seconds between version checks with --watch "
+                        "(default: %(default)s)")
+    parser.add_argument("--status-file",
+                        help="JSON file to keep up to date with --watch metrics")
     return parser.parse_args()
 
-def find_mirror_nodes(doc):
-    """ Return a list of nodes that contain mirror links. """
-    mirror_nodes: List[MirrorNode] = []
-    for node in doc.get_nodes():
-        links = markdown.find_links(node["content"])
-        if "note" in node:
-            links.extend(markdown.find_links(node["note"]))
-        for link in links:
-            try:
-                url = dynalist.parse_url(link["url"])
-            except dynalist.ParseException:
-                continue
-            if not url:
-                continue
-            if url["doc_id"] != doc.get_metadata()["file_id"]:
-                continue
-            if "zoom_node_id" not in url:
-                continue
-            if not doc.has_node(url["zoom_node_id"]):
-                continue
-            if not link["title"] == MIRROR_LINK_TEXT:
-                continue
-            source_node = doc.get_node(url["zoom_node_id"])
-            target_node = node
-            mirror_nodes.append(MirrorNode(source_node, target_node, link))
-            break # for link in links
-    if len(mirror_nodes) > 0:
-        logging.info("Found %d mirror nodes.", len(mirror_nodes))
-    return mirror_nodes
-
-def update_dynalist(doc, token, mirror_nodes):
-    # pylint: disable=too-many-branches
-    """ Check mirror nodes for needed changes, upload to Dynalist """
-    changes = []
-    data = {"file_id": doc.get_metadata()["file_id"],
-            "token": token,
-            "changes": changes}
-    for mirror_node in mirror_nodes:
-        change_needed = False
-        link_text = f"[{mirror_node.link['title']}]({mirror_node.link['url']})"
-        change = {"action": "edit"}
-        change["node_id"] = mirror_node.target_node["id"]
-
-        # Content
-        if mirror_node.source_node["content"] != mirror_node.target_node["content"]:
-            change_needed = True
-            change["content"] = mirror_node.source_node["content"]
-
-        # Note
-        if "note" not in mirror_node.source_node:
-            change_needed = True
-            change["note"] = link_text
-        elif mirror_node.source_node["note"] == "":
-            target_note = link_text
-            if mirror_node.target_node["note"] != target_note:
-                change_needed = True
-                change["note"] = target_note
-        else:
-            target_note = mirror_node.source_node["note"] + " " + link_text
-            if mirror_node.target_node["note"] != target_note:
-                change_needed = True
-                change["note"] = target_note
-
-        # Color
-        if "color" not in mirror_node.source_node:
-            if "color" in mirror_node.target_node:
-                change_needed = True
-                change["color"] = 0
-        elif "color" not in mirror_node.target_node:
-            change_needed = True
-            change["color"] = mirror_node.source_node["color"]
-        elif mirror_node.source_node["color"] != mirror_node.target_node["color"]:
-            change_needed = True
-            change["color"] = mirror_node.source_node["color"]
-
-        # Heading
-        if "heading" not in mirror_node.source_node:
-            if "heading" in mirror_node.target_node:
-                change_needed = True
-                change["heading"] = 0
-        elif "heading" not in mirror_node.target_node:
-            change_needed = True
-            change["heading"] = mirror_node.source_node["heading"]
-        elif mirror_node.source_node["heading"] != mirror_node.target_node["heading"]:
-            change_needed = True
-            change["heading"] = mirror_node.source_node["heading"]
-
-        # Update if needed
-        if change_needed:
-            changes.append(change)
-
-    # Update if there are any changes
+def read_state(filename):
+    """ Return the state saved by the previous run, or None """
+    if not filename or not os.path.exists(filename):
+        return None
+    try:
+        with open(filename) as infile:
+            return json.load(infile)
+    except ValueError:
+        logging.warning("Ignoring unreadable state file: %s", filename)
+        return None
+
+def write_state(filename, state):
+    """ Save the state for the next run """
+    if filename:
+        cache.write_atomically(filename, cache.text_writer(json.dumps(state)))
+
+def run_watch(args):
+    """ Keep the mirrors in sync until interrupted """
+    url = app_utils.get_url(args, os.environ)
+    if not url:
+        raise Exception("ERROR: Please give --url with --watch.")
+    if args.dry_run:
+        raise Exception("ERROR: --dry-run can't be used with --watch.")
+    token = app_utils.get_token(args, os.environ)
+    watcher = mirror_watch.MirrorWatcher(
+        url, token, chunk_size=args.chunk_size,
+        limiter=batch.RateLimiter(args.rate, edits.DEFAULT_EDIT_BURST),
+        state=read_state(args.state), poll_interval=args.poll_interval,
+        on_sync=lambda state: write_state(args.state, state))
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    logging.info("Watching %s every %.1fs.", url, args.poll_interval)
+    def write_status():
+        status = json.dumps(watcher.get_status()._asdict())
+        cache.write_atomically(args.status_file, cache.text_writer(status))
+    try:
+        watcher.run_forever(stop, write_status if args.status_file else None)
+    except KeyboardInterrupt:
+        logging.warning("Interrupted, stopping.")
+
+def update_dynalist(doc, token, plan, args):
+    """ Upload the planned changes to Dynalist """
+    changes = plan.changes
+    file_id = doc.get_metadata()["file_id"]
     if len(changes) == 0:
         logging.info("No changes required.")
-    else:
-        logging.info("Updating %d nodes.", len(changes))
-        response = requests.post("https://dynalist.io/api/v1/doc/edit", json=data)
-        logging.info(response.json())
+        if not args.dry_run:
+            write_state(args.state, plan.state)
+        return
+    if args.dry_run:
+        print("\n".join(edits.format_diff(doc, changes)))
+        logging.warning("--dry-run given, not making %d changes.", len(changes))
+        return
+
+    # Upload in chunks
+    logging.info("Updating %d nodes.", len(changes))
+    api = client.get_client(token)
+    report = edits.apply_edits(api, file_id, changes, args.chunk_size,
+                               batch.RateLimiter(args.rate, edits.DEFAULT_EDIT_BURST))
+    logging.info(edits.format_report(report))
+    for failed in report.failed:
+        logging.error("Could not update %s: %s", failed.change["node_id"], failed.error)
+
+    # Read back and check
+    unverified = []
+    if not args.no_verify:
+        failed_ids = {id(failed.change) for failed in report.failed}
+        unverified = edits.verify_edits(dynalist.Document(api.read_doc(file_id)),
+                                        [change for change in changes
+                                         if id(change) not in failed_ids])
+        for change in unverified:
+            logging.error("Change to %s is missing after update.", change["node_id"])
+    retry = [failed.change for failed in report.failed] + unverified
+    write_state(args.state, mirror.forget_mirrors(
+        plan.state, [change["node_id"] for change in retry]))
+    if report.failed or unverified:
+        raise Exception("ERROR: {} of {} changes failed, {} could not be verified.".format(
+            len(report.failed), len(changes), len(unverified)))
 
 if __name__ == "__main__":
     main()
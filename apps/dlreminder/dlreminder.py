@@ -6,30 +6,26 @@ Emails a reminder of due tasks.
 
 # Python
 from datetime import datetime
-from datetime import timedelta
 from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from operator import attrgetter
-from typing import Any, Dict, List
+from typing import Dict, List, Tuple
 import argparse
+import contextlib
+import json
 import logging
 import os
-import re
-import smtplib
+import signal
 import sys
+import threading
 
 # Project
 from dynalist_utils import app_utils
-
-DATE_REGEX = re.compile(r"!\((\d\d\d\d-\d\d\-\d\d).*\)")
-
-class DatedNode: # pylint: disable=too-few-public-methods
-    """ Composite of a node and the first date found in it. """
-    def __init__(self):
-        self.date: str = ""
-        self.node: Dict[str, Any] = None
-        self.link: str = ""
-        self.checked: bool = False
+from dynalist_utils import batch
+from dynalist_utils import cache
+from dynalist_utils import dates
+from dynalist_utils import mailer
+from dynalist_utils import reminder_daemon
+from dynalist_utils import reminders
+from dynalist_utils import watch
 
 def main():
     """ Check args and download doc """
@@ -43,20 +39,31 @@ def main():
             logging.warning("--trace given, showing debug messages.")
             logging.warning("Logging level: %d", logging.getLogger().getEffectiveLevel())
 
+        if args.daemon:
+            run_daemon(args)
+            return
+
+        if args.routes:
+            run_batch(args)
+            return
+
         # Get doc
         doc = app_utils.read_doc(args)
 
-        # Get dated nodes
-        dated_nodes: List[DatedNode] = get_dated_nodes(doc)
+        # Index dated nodes
+        index: dates.DateIndex = dates.DateIndex.from_documents([doc])
 
         # Create email
-        message: MIMEMultipart = create_message(dated_nodes)
+        message: MIMEMultipart = reminders.create_message(
+            index, datetime.today().date(), get_env("EMAIL_FROM"), get_env("EMAIL_TO"))
+        logging.debug(message.as_string())
 
         # Send email
         if args.dry_run:
             logging.warning("--dry-run given, not sending emails.")
         else:
-            send_email(message, args.trace)
+            with get_mailer(args.trace) as smtp:
+                smtp.send(message)
 
 
     except Exception: # pylint: disable=broad-except
@@ -68,204 +75,122 @@ def get_arguments():
     parser = argparse.ArgumentParser(description="Send a list of email reminders")
     app_utils.add_standard_arguments(parser)
     parser.add_argument("--dry-run", action="store_true", help="Don't send any emails")
+    parser.add_argument("--routes",
+                        type=argparse.FileType("r"),
+                        help="Routing config (JSON) of documents to recipients; "
+                        "sends one email per route")
+    parser.add_argument("--workers",
+                        type=int,
+                        default=batch.DEFAULT_MAX_WORKERS,
+                        help="Number of documents to download at once with --routes "
+                        "(default: %(default)s)")
+    parser.add_argument("--daemon",
+                        action="store_true",
+                        help="Keep running: follow the documents and send the reminders "
+                        "at each --at time")
+    parser.add_argument("--at",
+                        action="append",
+                        type=reminder_daemon.parse_time,
+                        help="Time of day (HH:MM) to send the reminders with --daemon; "
+                        "may be given more than once")
+    parser.add_argument("--poll-interval",
+                        type=float,
+                        default=reminder_daemon.DEFAULT_POLL_INTERVAL,
+                        help="Seconds between document version checks with --daemon "
+                        "(default: %(default)s)")
+    parser.add_argument("--status-file",
+                        help="JSON file the daemon keeps up to date with its status")
     return parser.parse_args()
 
-def get_dated_nodes(doc) -> List[DatedNode]:
-    """ Returns list of all nodes with dates in the doc. """
-
-    dated_nodes: List[DatedNode] = []
-
-    # Find all dated nodes
-    for node in doc.get_nodes():
-        # Look in content
-        match = DATE_REGEX.search(node["content"])
-        # If not in content, look in note
-        if not match:
-            match = DATE_REGEX.search(node["note"])
-        # If found, add to list
-        if match:
-            dated_node: DatedNode = DatedNode()
-            dated_node.date = match[1]
-            dated_node.node = node
-            dated_node.link = ("https://dynalist.io/d/" +
-                               doc.get_metadata()["doc_id"] +
-                               "#z=" +
-                               node["id"])
-            dated_node.checked = "checked" in node and node["checked"]
-            dated_nodes.append(dated_node)
-
-    # Sort nodes by date
-    dated_nodes = sorted(dated_nodes, key=attrgetter("date"))
-
-    return dated_nodes
-
-def create_message(dated_nodes: List[DatedNode]) -> MIMEMultipart:
-    """ Send reminder email """
-
-    email_from = os.getenv("EMAIL_FROM")
-    if not email_from:
-        logging.error("Please provide environment variable EMAIL_FROM.")
-        sys.exit(1)
-
-    email_to = os.getenv("EMAIL_TO")
-    if not email_to:
-        logging.error("Please provide environment variable EMAIL_TO.")
-        sys.exit(1)
-
-    msg: MIMEMultipart = MIMEMultipart("alternative")
-    msg["From"] = email_from
-    msg["To"] = email_to
-
-    msg["Subject"] = "Items due for " +  datetime.today().strftime('%Y-%m-%d')
-
-    html: str = "<html>"
-    html += "<body>"
-    html += render_due_today(dated_nodes)
-    html += render_overdue(dated_nodes)
-    html += render_due_soon(dated_nodes)
-    html += render_due_this_week(dated_nodes)
-    html += "</body>"
-    html += "</html>"
-    logging.debug(html)
-    msg.attach(MIMEText(html, "html"))
-
-    return msg
-
-def render_due_today(dated_nodes: List[DatedNode]) -> str:
-    """ Render tasks due today. """
-
-    logging.debug("DUE TODAY")
-    html: str = ""
-
-    today = datetime.today().strftime('%Y-%m-%d')
-    logging.debug("Today: %s", today)
-    due_today = [dated_node for dated_node in dated_nodes if dated_node.date == today]
-    if not due_today:
-        return ""
-
-    html += "<h1>Due Today</h1>"
-    html += "<ul>"
-    for item in due_today:
-        html += render_list_item(item)
-    html += "</ul>"
-
-    return html
-
-def render_overdue(dated_nodes: List[DatedNode]) -> str:
-    """ Render tasks due today. """
-
-    logging.debug("OVERDUE")
-    html: str = ""
-
-    today = datetime.today().strftime('%Y-%m-%d')
-    logging.debug("Today: %s", today)
-    overdue = [dated_node
-               for dated_node in dated_nodes
-               if dated_node.date < today
-               and not dated_node.checked]
-    if not overdue:
-        return ""
-
-    html += "<h1>Overdue</h1>"
-    html += "<ul>"
-    for item in overdue:
-        html += render_list_item(item)
-    html += "</ul>"
-
-    return html
-
-def render_due_soon(dated_nodes: List[DatedNode]) -> str:
-    """ Render tasks due today. """
-
-    logging.debug("DUE SOON")
-    html: str = ""
-
-    today = datetime.today().strftime('%Y-%m-%d')
-    logging.debug("Today: %s", today)
-    three_days_from_now = (datetime.today() + timedelta(days=3)).strftime('%Y-%m-%d')
-    logging.debug("Three Days from Now: %s", three_days_from_now)
-    due_soon = [dated_node
-                for dated_node in dated_nodes
-                if dated_node.date > today
-                and dated_node.date <= three_days_from_now
-                and not dated_node.checked]
-    if not due_soon:
-        return ""
-
-    html += "<h1>Due Soon</h1>"
-    html += "<ul>"
-    for item in due_soon:
-        html += render_list_item(item)
-    html += "</ul>"
-
-    return html
-
-def render_due_this_week(dated_nodes: List[DatedNode]) -> str:
-    """ Render tasks due today. """
-
-    logging.debug("DUE THIS WEEK")
-    html: str = ""
-
-    today = datetime.today().strftime('%Y-%m-%d')
-    logging.debug("Today: %s", today)
-    three_days_from_now = (datetime.today() + timedelta(days=3)).strftime('%Y-%m-%d')
-    logging.debug("Three Days from Now: %s", three_days_from_now)
-    week_from_now = (datetime.today() + timedelta(days=7)).strftime('%Y-%m-%d')
-    logging.debug("Week from Now: %s", week_from_now)
-    due_this_week = [dated_node
-                for dated_node in dated_nodes
-                if dated_node.date > three_days_from_now
-                and dated_node.date <= week_from_now
-                and not dated_node.checked]
-    if not due_this_week:
-        return ""
-
-    html += "<h1>This Week</h1>"
-    html += "<ul>"
-    for item in due_this_week:
-        html += render_list_item(item)
-    html += "</ul>"
-
-    return html
-
-def render_list_item(item: DatedNode) -> str:
-    """ Renders a single item as an html list item """
-    logging.debug(item.node["content"])
-    html: str = ""
-    html += "<li>"
-    html += item.node["content"]
-    html += " <a href='" + item.link + "'>Link</a>"
-    if item.node["note"]:
-        html += "<br/>"
-        html += "<small>" + item.node["note"] + "</small>"
-    html += "</li>"
-    return html
-
-def send_email(message, trace: bool):
-    """ Send reminder email """
-
-    email_server = os.getenv("EMAIL_SERVER")
-    if not email_server:
-        logging.error("Please provide environment variable EMAIL_SERVER.")
+def run_batch(args):
+    """ Load every routed document, then build and send all the emails over
+        one connection """
+    email_from, routes = reminders.read_routes(args.routes)
+    email_from = email_from or get_env("EMAIL_FROM")
+    token = app_utils.get_token(args, os.environ)
+
+    # Load each document once, concurrently
+    refs = list(dict.fromkeys(ref for route in routes for ref in route.documents))
+    docs: Dict[str, object] = {}
+    for result in batch.load_documents(refs, token, args.workers,
+                                       backend=app_utils.get_backend(args)):
+        if result.error:
+            logging.error("Could not load %s: %s", result.ref, result.error)
+            continue
+        docs[result.ref] = result.doc
+
+    # Build all messages
+    messages: List[Tuple[reminders.Route, MIMEMultipart]] = reminders.create_messages(
+        routes, docs, datetime.today().date(), email_from)
+    if args.dry_run:
+        logging.warning("--dry-run given, not sending %d emails.", len(messages))
+        return
+
+    # Send them over one connection
+    failures = 0
+    with get_mailer(args.trace) as smtp:
+        for route, message in messages:
+            try:
+                smtp.send(message)
+            except mailer.MailerException as exception:
+                logging.error("%s", exception)
+                failures += 1
+                continue
+            logging.info("Sent reminder to %s", ", ".join(route.to))
+    if failures or len(docs) < len(refs):
+        raise Exception("ERROR: {} of {} documents failed to load, {} of {} emails "
+                        "failed to send.".format(len(refs) - len(docs), len(refs),
+                                                 failures, len(messages)))
+
+def run_daemon(args):
+    """ Follow the routed documents, keeping their dates indexed, and send
+        the reminders on schedule until interrupted """
+    if not args.at:
+        raise Exception("ERROR: Please give --at with --daemon.")
+    if args.routes:
+        email_from, routes = reminders.read_routes(args.routes)
+        email_from = email_from or get_env("EMAIL_FROM")
+    else:
+        url = app_utils.get_url(args, os.environ)
+        if not url:
+            raise Exception("ERROR: Please give --url or --routes with --daemon.")
+        email_from = get_env("EMAIL_FROM")
+        routes = [reminders.Route([get_env("EMAIL_TO")], [url], list(reminders.WINDOWS))]
+    watcher = watch.DocumentWatcher(
+        [ref for route in routes for ref in route.documents],
+        app_utils.get_token(args, os.environ), args.workers,
+        backend=app_utils.get_backend(args))
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    def dry_run(message):
+        logging.info("--dry-run given, not sending reminder to %s", message["To"])
+    with contextlib.nullcontext() if args.dry_run else get_mailer(args.trace) as smtp:
+        send = smtp.send if smtp else dry_run
+        daemon = reminder_daemon.ReminderDaemon(routes, watcher, email_from, send, args.at,
+                                                poll_interval=args.poll_interval)
+        def write_status():
+            status = json.dumps(reminder_daemon.format_status(daemon.get_status()))
+            cache.write_atomically(args.status_file, cache.text_writer(status))
+        try:
+            daemon.run_forever(stop, write_status if args.status_file else None)
+        except KeyboardInterrupt:
+            logging.warning("Interrupted, stopping.")
+
+def get_mailer(trace: bool) -> mailer.Mailer:
+    """ Returns a Mailer for the server given in the environment """
+    return mailer.Mailer(get_env("EMAIL_SERVER"),
+                         get_env("EMAIL_USERNAME"),
+                         get_env("EMAIL_PASSWORD"),
+                         security=os.getenv("EMAIL_SECURITY", "ssl"),
+                         debug=trace)
+
+def get_env(name: str) -> str:
+    """ Returns a required environment variable, exiting if it's missing """
+    value = os.getenv(name)
+    if not value:
+        logging.error("Please provide environment variable %s.", name)
         sys.exit(1)
-
-    email_username = os.getenv("EMAIL_USERNAME")
-    if not email_username:
-        logging.error("Please provide environment variable EMAIL_USERNAME.")
-        sys.exit(1)
-
-    email_password = os.getenv("EMAIL_PASSWORD")
-    if not email_password:
-        logging.error("Please provide environment variable EMAIL_PASSWORD.")
-        sys.exit(1)
-
-
-    logging.debug("Connecting to email server...")
-    with smtplib.SMTP_SSL(email_server) as smtp:
-        if trace:
-            smtp.set_debuglevel(2)
-        smtp.login(email_username, email_password)
-        smtp.send_message(message)
+    return value
 
 
 if __name__ == "__main__":
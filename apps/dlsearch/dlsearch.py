@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+"""
+Searches a Dynalist document.
+"""
+
+# Python
+import argparse
+import logging
+import sys
+
+# Project
+from dynalist_utils import app_utils
+from dynalist_utils import dates
+
+def main():
+    """ Check args, download doc and print the matching nodes """
+    try:
+        args = get_arguments()
+        logging.basicConfig(format=app_utils.LOGGING_FORMAT,
+                            level=logging.DEBUG if args.trace else logging.WARNING)
+        doc = app_utils.read_doc(args)
+        metadata = doc.get_metadata()
+        query = args.query if args.query is not None else metadata.get("query", "")
+        node_id = metadata.get("zoom_node_id") or "root"
+        logging.info("Searching %s for: %s", node_id, query)
+        nodes = doc.search(query, node_id)
+        if args.count:
+            print(len(nodes))
+            return
+        doc_url = dates.get_doc_url(doc)
+        for node in nodes:
+            print("- {} ({})".format(node["content"], doc_url + node["id"]))
+    except Exception: # pylint: disable=broad-except
+        logging.exception("An error occured.")
+        sys.exit(1)
+
+
+def get_arguments():
+    """ Parse command line arguments """
+    parser = argparse.ArgumentParser(
+        description="Print the nodes of a Dynalist document that match a search. "
+        "The search is --query, or the #q= of --url, within the zoomed node, if any.")
+    app_utils.add_standard_arguments(parser)
+    parser.add_argument("--query",
+                        help="Dynalist search query, e.g. '#todo -is:completed'")
+    parser.add_argument("--count",
+                        action="store_true",
+                        help="Print only the number of matching nodes")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    main()
+
+# vim: foldmethod=indent
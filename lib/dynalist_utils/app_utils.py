@@ -2,11 +2,11 @@
 
 # Python
 import argparse
-import hashlib
 import logging
 import os
 import sys
 
+from dynalist_utils import cache
 from dynalist_utils import dynalist
 
 LOGGING_FORMAT = "%(asctime)s %(levelname)s %(module)s/%(funcName)s:%(lineno)d\n%(message)s"
@@ -18,6 +18,7 @@ def add_standard_arguments(parser): # pragma: no cover
     add_argument_token(parser)
     add_argument_trace(parser)
     add_argument_cached(parser)
+    add_argument_compact(parser)
 
 
 def add_argument_url(parser): # pragma: no cover
@@ -79,33 +80,93 @@ def add_argument_trace(parser): # pragma: no cover
 
 
 def add_argument_cached(parser): # pragma: no cover
-    """ Add --cached to parser arguments """
+    """ Add --cached and cache options to parser arguments """
     parser.add_argument("--cached",
                         action="store_true",
                         help="Create and reuse cached copy of document")
-
+    parser.add_argument("--cache-dir",
+                        action="store",
+                        help="Cache directory, or set DYNALIST_CACHE_DIR env var "
+                        "(default: {})".format(cache.DEFAULT_DIRECTORY))
+    parser.add_argument("--cache-ttl",
+                        type=float,
+                        default=cache.DEFAULT_TTL,
+                        help="Seconds to trust a cached copy before checking "
+                        "whether the document changed (default: %(default)s)")
+    parser.add_argument("--cache-max-size",
+                        type=int,
+                        default=cache.DEFAULT_MAX_SIZE // 2 ** 20,
+                        help="Maximum cache size in MB (default: %(default)s)")
+
+
+def get_cache_dir(args, env):
+    """ Get cache directory from args or environment """
+    if getattr(args, "cache_dir", None):
+        return args.cache_dir
+    if "DYNALIST_CACHE_DIR" in env:
+        return env["DYNALIST_CACHE_DIR"]
+    return cache.DEFAULT_DIRECTORY
+
+
+def add_argument_compact(parser): # pragma: no cover
+    """ Add --compact to parser arguments """
+    parser.add_argument("--compact",
+                        action="store_true",
+                        help="Hold the document in the compact, low-memory backend")
+
+
+def get_backend(args):
+    """ Get the Document backend selected by args """
+    if getattr(args, "compact", False):
+        return "compact"
+    return "dict"
+
+
+def get_search_tree(args, doc, node_id, sections=False):
+    """ Get the nodes to render below node_id for the search given by
+    args.query or, failing that, the #q= of the document's URL, as a dict
+    for markdown.iter_blocks, or None to render them all.  Exports split
+    into sections (sections=True) can't render a search, so they ignore
+    the URL's and refuse an explicit --query. """
+    query = getattr(args, "query", None)
+    if query is None:
+        query = doc.get_metadata().get("query")
+        if query and sections:
+            logging.info("Ignoring the search in the URL, which can't be exported "
+                         "in sections: %s", query)
+            return None
+    if not query:
+        return None
+    if sections:
+        raise Exception("ERROR: Searches can't be exported in sections.")
+    tree = doc.get_search_index().get_tree(query, node_id)
+    logging.info("Rendering %d nodes for search: %s", len(tree) - 1, query)
+    return tree
 
 def read_doc(args): #pragma: no cover
     """ Convenience method to read the doc based on the given args """
     token = get_token(args, os.environ)
     url = get_url(args, os.environ)
-    if args.cached:
-        hasher = hashlib.md5()
-        hasher.update(str.encode(url))
-        cache_filename = hasher.hexdigest() + ".json"
-        if os.path.exists(cache_filename):
-            logging.info("Reusing cached document at: %s", cache_filename)
-            return dynalist.Document.from_json_file(cache_filename)
-    if url:
-        logging.info("Loading doc from url: %s", url)
-        doc = dynalist.Document.from_url(url, token)
-    else:
+    backend = get_backend(args)
+    if not url:
         logging.info("Loading doc from file stream: %s", args.infile)
-        doc = dynalist.Document.from_json_stream(args.infile)
-    if args.cached:
-        with open(cache_filename, "w") as cache_file:
-            logging.info("Created cached document at: %s", cache_filename)
-            cache_file.write(doc.to_json())
+        return dynalist.Document.from_json_stream(args.infile, backend)
+    if not args.cached:
+        logging.info("Loading doc from url: %s", url)
+        return dynalist.Document.from_url(url, token, backend)
+    parsed_url = dynalist.parse_url(url)
+    doc_id = parsed_url["doc_id"]
+    doc_cache = cache.DocumentCache(get_cache_dir(args, os.environ),
+                                    ttl=args.cache_ttl,
+                                    max_size=args.cache_max_size * 2 ** 20)
+    def get_version(doc_id):
+        return dynalist.get_versions_from_api([doc_id], token).get(doc_id)
+    doc = doc_cache.get(doc_id, get_version, backend)
+    if doc is None:
+        logging.info("Loading doc from url: %s", url)
+        doc = dynalist.Document.from_api(doc_id, token, backend)
+        doc_cache.put(doc_id, doc)
+    doc.get_metadata().update(parsed_url)
     return doc
 
 # vim: foldmethod=indent
@@ -0,0 +1,94 @@
+"""
+Concurrent loading of many Dynalist documents.
+"""
+
+# Python
+import collections
+import concurrent.futures
+import threading
+import time
+
+# Project
+from dynalist_utils import client
+from dynalist_utils import dynalist
+
+DEFAULT_MAX_WORKERS = 4
+
+LoadResult = collections.namedtuple("LoadResult", ["ref", "doc", "error"])
+
+
+class RateLimiter:
+    """ Token bucket allowing rate acquisitions per second on average, with
+        bursts of up to burst.  Safe to share between threads. """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.__rate = float(rate)
+        self.__burst = float(burst)
+        self.__clock = clock
+        self.__sleep = sleep
+        self.__tokens = float(burst)
+        self.__updated = clock()
+        self.__lock = threading.Lock()
+
+
+    def acquire(self):
+        """ Blocks until a token is available, then takes it. """
+        while True:
+            with self.__lock:
+                now = self.__clock()
+                self.__tokens = min(self.__burst,
+                                    self.__tokens + (now - self.__updated) * self.__rate)
+                self.__updated = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens) / self.__rate
+            self.__sleep(wait)
+
+
+def load_document(ref, token, backend="dict"):
+    """ Loads one document given either its URL or its doc id. """
+    try:
+        dynalist.parse_url(ref)
+    except dynalist.ParseException:
+        return dynalist.Document.from_api(ref, token, backend)
+    return dynalist.Document.from_url(ref, token, backend)
+
+
+def get_doc_id(ref):
+    """ Returns the doc id of a Dynalist URL, or ref itself if it isn't one """
+    try:
+        return dynalist.parse_url(ref)["doc_id"]
+    except dynalist.ParseException:
+        return ref
+
+
+def load_documents(refs, token, max_workers=DEFAULT_MAX_WORKERS, rate=None, # pylint: disable=too-many-arguments,too-many-positional-arguments
+                   backend="dict", load=load_document):
+    """ Fetches the given documents (URLs or doc ids) concurrently on at most
+        max_workers threads, starting at most rate fetches per second if
+        rate is given.  Yields a LoadResult for each document as it
+        completes, with either doc or error set. """
+    limiter = RateLimiter(rate) if rate else None
+
+    def fetch(ref):
+        if limiter:
+            limiter.acquire()
+        return load(ref, token, backend)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, ref): ref for ref in refs}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                yield LoadResult(futures[future], future.result(), None)
+            except Exception as error: # pylint: disable=broad-except
+                yield LoadResult(futures[future], None, error)
+
+
+def list_document_ids(token):  # pragma: no cover
+    """ Returns the ids of all documents visible to the token. """
+    files = client.get_client(token).list_files()["files"]
+    return [file["id"] for file in files if file["type"] == "document"]
+
+
+# vim: foldmethod=indent
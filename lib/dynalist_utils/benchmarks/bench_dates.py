@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""
+Compare finding the reminder sections by rescanning a sorted list of dated
+nodes for each section with looking them up in a DateIndex.
+"""
+
+# Python
+import argparse
+import datetime
+import random
+import re
+import time
+
+# Project
+from dynalist_utils import dates
+from dynalist_utils import dynalist
+import synthetic
+
+OLD_DATE_REGEX = re.compile(r"!\((\d\d\d\d-\d\d\-\d\d).*\)")
+
+
+def find_sections_by_scanning(doc, today):
+    """ The previous approach: extract with one regex, sort, then filter
+        the whole list once per section. """
+    dated = []
+    for node in doc.iter_nodes():
+        match = OLD_DATE_REGEX.search(node["content"])
+        if not match:
+            match = OLD_DATE_REGEX.search(node["note"])
+        if match:
+            dated.append((match[1], node, bool(node.get("checked"))))
+    dated.sort(key=lambda item: item[0])
+    day = today.isoformat()
+    soon = (today + datetime.timedelta(days=3)).isoformat()
+    week = (today + datetime.timedelta(days=7)).isoformat()
+    return [[item for item in dated if item[0] == day],
+            [item for item in dated if item[0] < day and not item[2]],
+            [item for item in dated if day < item[0] <= soon and not item[2]],
+            [item for item in dated if soon < item[0] <= week and not item[2]]]
+
+
+def find_sections_by_index(index, today):
+    """ Look the sections up in the index. """
+    def days(count):
+        return today + datetime.timedelta(days=count)
+    return [index.get_day(today),
+            index.get_range(None, today, include_checked=False),
+            index.get_range(days(1), days(4), include_checked=False),
+            index.get_range(days(4), days(8), include_checked=False)]
+
+
+def make_dated_document(num_nodes, seed=0):
+    """ Returns a synthetic document where every node has a date within two
+        years of 2020-01-01, some with times or recurrences. """
+    rng = random.Random(seed)
+    data = synthetic.make_document(num_nodes, seed=seed)
+    start = datetime.date(2019, 1, 1)
+    for node in data["nodes"][1:]:
+        day = (start + datetime.timedelta(days=rng.randrange(730))).isoformat()
+        suffix = rng.choice(["", "", " 09:30", " 14:00 - 15:00", " | 1w"])
+        node["content"] += " !({}{})".format(day, suffix)
+    return data
+
+
+def main():
+    """ Run the benchmark and print a table of results. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=300000,
+                        help="Number of dated nodes in the synthetic document")
+    parser.add_argument("--runs", type=int, default=100,
+                        help="Number of days to find the sections for")
+    args = parser.parse_args()
+    doc = dynalist.Document.from_dict(make_dated_document(args.nodes))
+    days = [datetime.date(2019, 6, 1) + datetime.timedelta(days=i) for i in range(args.runs)]
+    print("{} dated nodes, sections for {} days".format(args.nodes, args.runs))
+    print("{:<26} {:>12} {:>14}".format("approach", "extract s", "per day ms"))
+
+    start = time.perf_counter()
+    find_sections_by_scanning(doc, days[0])
+    extract = time.perf_counter() - start
+    print("{:<26} {:>12.2f} {:>14.1f}".format("rescan per section", extract, extract * 1000))
+
+    start = time.perf_counter()
+    index = dates.DateIndex.from_documents([doc])
+    extract = time.perf_counter() - start
+    start = time.perf_counter()
+    for day in days:
+        find_sections_by_index(index, day)
+    per_day = (time.perf_counter() - start) / len(days)
+    print("{:<26} {:>12.2f} {:>14.1f}".format("DateIndex", extract, per_day * 1000))
+
+
+if __name__ == "__main__":
+    main()
+
+# vim: foldmethod=indent
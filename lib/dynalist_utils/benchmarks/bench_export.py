@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""
+Compare exporting many subtrees of one document one after another with
+exporting them on a process pool, and a full export of one file with an
+incremental export after a single change.
+"""
+
+# Python
+import argparse
+import os
+import tempfile
+import time
+
+# Project
+from dynalist_utils import dynalist
+from dynalist_utils import export
+import synthetic
+
+
+def main():
+    """ Run the benchmark and print a table of results. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=200000,
+                        help="Number of nodes in the synthetic document")
+    parser.add_argument("--sections", type=int, default=50,
+                        help="Number of subtrees to export")
+    args = parser.parse_args()
+    doc = dynalist.Document.from_dict(
+        synthetic.make_document(args.nodes, max_children=args.sections))
+    sections = [child["id"] for child in doc.get_children("root")][:args.sections]
+    print("{} nodes, {} sections, {} CPUs".format(args.nodes, len(sections), os.cpu_count()))
+    print("{:<22} {:>10}".format("exporter", "time s"))
+    with tempfile.TemporaryDirectory() as outdir:
+        start = time.perf_counter()
+        filenames = export.make_filenames(doc, sections, ".md")
+        for node_id, filename in filenames.items():
+            export.export_subtree(node_id, os.path.join(outdir, filename), "markdown", doc=doc)
+        print("{:<22} {:>10.2f}".format("sequential", time.perf_counter() - start))
+        for start_method in ("fork", "spawn"):
+            start = time.perf_counter()
+            for result in export.export_subtrees(doc, sections, outdir,
+                                                 start_method=start_method):
+                if result.error:
+                    raise result.error
+            print("{:<22} {:>10.2f}".format("pool (" + start_method + ")",
+                                           time.perf_counter() - start))
+        filename = os.path.join(outdir, "all.md")
+        start = time.perf_counter()
+        export.export_incremental(doc, "root", filename)
+        print("{:<22} {:>10.2f}".format("full export", time.perf_counter() - start))
+        node = doc.get_node(sections[0])
+        node["content"] = node["content"] + " changed"
+        doc.get_metadata()["version"] += 1
+        start = time.perf_counter()
+        result = export.export_incremental(doc, "root", filename)
+        print("{:<22} {:>10.2f}   ({} of {} sections rendered)".format(
+            "incremental export", time.perf_counter() - start,
+            result.rendered, result.rendered + result.reused))
+
+
+if __name__ == "__main__":
+    main()
+
+# vim: foldmethod=indent
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+Compare rendering a document to Markdown by string concatenation with
+streaming it to a file.
+"""
+
+# Python
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+
+# Project
+from dynalist_utils import dynalist
+from dynalist_utils import markdown
+import synthetic
+
+
+def convert_recursive(doc, node_id, is_root=True, header_level=1, collapsed_level=0):
+    """ The previous renderer, which recursed per node and concatenated each
+        child's output into its parent's, kept here as the baseline. """
+    text = ""
+    node = doc.get_node(node_id)
+    block, levels = markdown.layout_node(node, is_root, header_level, collapsed_level)
+    for fragment in markdown.render_block(block):
+        text += fragment
+    for child in doc.get_children(node_id):
+        text += convert_recursive(doc, child["id"], False, levels[0], levels[1])
+    if levels[2]:
+        text += "\n"
+    return text
+
+
+def measure(render):
+    """ Runs render() and returns its peak memory in bytes and its time in
+        seconds. """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    render()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main():
+    """ Run the benchmark and print a table of results. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=100000,
+                        help="Number of nodes in the synthetic document")
+    args = parser.parse_args()
+    doc = dynalist.Document.from_dict(synthetic.make_document(args.nodes))
+    print("{} nodes, {:.1f} MB of Markdown".format(
+        args.nodes, len(markdown.convert(doc, "root")) / 2 ** 20))
+    print("{:<26} {:>10} {:>10}".format("renderer", "peak MB", "time s"))
+    with open(os.devnull, "w") as devnull:
+        for name, render in (
+                ("recursive concatenation", lambda: convert_recursive(doc, "root")),
+                ("convert (join)", lambda: markdown.convert(doc, "root")),
+                ("write to file", lambda: markdown.write(doc, "root", devnull))):
+            peak, elapsed = measure(render)
+            print("{:<26} {:>10.1f} {:>10.2f}".format(name, peak / 2 ** 20, elapsed))
+
+
+if __name__ == "__main__":
+    main()
+
+# vim: foldmethod=indent
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""
+Compare the memory retained by the dict and compact Document backends.
+"""
+
+# Python
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+# Project
+from dynalist_utils import dynalist
+import synthetic
+
+
+def measure(text, backend):
+    """ Loads the JSON text with the given backend and returns the retained
+        and peak memory in bytes, plus the load time in seconds. """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    doc = dynalist.Document.from_dict(json.loads(text), backend)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del doc
+    return current, peak, elapsed
+
+
+def main():
+    """ Run the benchmark and print a table of results. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=100000,
+                        help="Number of nodes in the synthetic document")
+    args = parser.parse_args()
+    text = json.dumps(synthetic.make_document(args.nodes))
+    print("{} nodes, {:.1f} MB of JSON".format(args.nodes, len(text) / 2 ** 20))
+    print("{:<10} {:>14} {:>14} {:>10}".format("backend", "retained MB", "peak MB", "load s"))
+    for backend in dynalist.BACKENDS:
+        current, peak, elapsed = measure(text, backend)
+        print("{:<10} {:>14.1f} {:>14.1f} {:>10.2f}".format(
+            backend, current / 2 ** 20, peak / 2 ** 20, elapsed))
+
+
+if __name__ == "__main__":
+    main()
+
+# vim: foldmethod=indent
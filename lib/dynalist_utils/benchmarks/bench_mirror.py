@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Compare planning mirror updates for a large document with few edits from
+scratch, as every dlmirror run used to, with using the previous run's
+fingerprints.
+"""
+
+# Python
+import argparse
+import time
+
+# Project
+from dynalist_utils import dynalist
+from dynalist_utils import mirror
+
+URL = "https://dynalist.io/d/bench#z={}"
+
+
+def make_mirror_document(num_sources, mirrors_per_source):
+    """ Returns a document of sources, each with up-to-date mirrors, some
+        of them mirrors of mirrors. """
+    nodes = [{"id": "root", "content": "root", "note": "", "children": []}]
+    for i in range(num_sources):
+        source_id = "s{}".format(i)
+        nodes.append({"id": source_id, "content": "Source {}".format(i),
+                      "note": "Note {}".format(i), "color": i % 4})
+        previous = source_id
+        for j in range(mirrors_per_source):
+            nodes.append({"id": "{}m{}".format(source_id, j), "content": "Source {}".format(i),
+                          "note": "Note {} [mirror]({})".format(i, URL.format(previous)),
+                          "color": i % 4})
+            previous = source_id if j % 2 else nodes[-1]["id"]
+    nodes[0]["children"] = [node["id"] for node in nodes[1:]]
+    return dynalist.Document.from_dict({"file_id": "bench", "nodes": nodes})
+
+
+def main():
+    """ Run the benchmark and print a table of results. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sources", type=int, default=20000, help="Number of source nodes")
+    parser.add_argument("--mirrors", type=int, default=4, help="Mirrors per source")
+    parser.add_argument("--edits", type=int, default=10, help="Sources edited between runs")
+    args = parser.parse_args()
+    doc = make_mirror_document(args.sources, args.mirrors)
+    state = mirror.plan_changes(doc).state
+    for i in range(args.edits):
+        doc.get_node("s{}".format(i))["content"] += " (edited)"
+    print("{} sources x {} mirrors, {} sources edited".format(args.sources, args.mirrors,
+                                                              args.edits))
+    print("{:<16} {:>10} {:>10} {:>10}".format("approach", "examined", "changes", "s"))
+    for name, previous in (("from scratch", None), ("fingerprints", state)):
+        start = time.perf_counter()
+        plan = mirror.plan_changes(doc, previous)
+        elapsed = time.perf_counter() - start
+        print("{:<16} {:>10} {:>10} {:>10.2f}".format(name, plan.examined, len(plan.changes),
+                                                      elapsed))
+
+
+if __name__ == "__main__":
+    main()
+
+# vim: foldmethod=indent
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+"""
+Measure dynalist.parse_url throughput over a corpus of synthetic links.
+"""
+
+# Python
+import argparse
+import random
+import re
+import time
+
+# Project
+from dynalist_utils import dynalist
+import synthetic
+
+
+def parse_url_four_regexes(url):
+    """ The previous parse_url, which compiled and tried four regexes on
+        every call, kept here as the baseline. """
+    fields = {"doc_id": "", "zoom_node_id": "", "query": ""}
+    match = re.compile(r"^https://dynalist.io/d/([a-zA-Z0-9_-]+)$").match(url)
+    if match:
+        fields["doc_id"] = match.group(1)
+        return fields
+    match = re.compile(
+        r"^https://dynalist.io/d/([a-zA-Z0-9_-]+)#z=([a-zA-Z0-9_-]+)?$").match(url)
+    if match:
+        fields["doc_id"] = match.group(1)
+        fields["zoom_node_id"] = match.group(2)
+        return fields
+    match = re.compile(r"^https://dynalist.io/d/([a-zA-Z0-9_-]+)#q=(.*)$").match(url)
+    if match:
+        fields["doc_id"] = match.group(1)
+        fields["query"] = match.group(2)
+        return fields
+    match = re.compile(
+        r"^https://dynalist.io/d/([a-zA-Z0-9_-]+)#z=([a-zA-Z0-9_-]+)&q=(.*)$").match(url)
+    if match:
+        fields["doc_id"] = match.group(1)
+        fields["zoom_node_id"] = match.group(2)
+        fields["query"] = match.group(3)
+        return fields
+    raise dynalist.ParseException("ERROR: Not a Dynalist URL: " + str(url))
+
+
+def parse_url_uncached(url):
+    """ The single-regex parser with the memo bypassed. """
+    if dynalist.parse_url_cached.__wrapped__(url) is None:
+        raise dynalist.ParseException("ERROR: Not a Dynalist URL: " + str(url))
+
+
+def make_links(count, distinct, seed=0):
+    """ Returns count links drawn from distinct synthetic URLs, mostly
+        zoom links into a few documents, as found in real outlines. """
+    rng = random.Random(seed)
+    doc_ids = [synthetic.make_node_id(rng) for _ in range(20)]
+    urls = []
+    for _ in range(distinct):
+        doc_id = rng.choice(doc_ids)
+        kind = rng.random()
+        if kind < 0.7:
+            urls.append("https://dynalist.io/d/{}#z={}".format(
+                doc_id, synthetic.make_node_id(rng)))
+        elif kind < 0.8:
+            urls.append("https://dynalist.io/d/" + doc_id)
+        elif kind < 0.9:
+            urls.append("https://dynalist.io/d/{}#q={}".format(doc_id, rng.choice(synthetic.WORDS)))
+        else:
+            urls.append("https://www.example.com/" + rng.choice(synthetic.WORDS))
+    return [rng.choice(urls) for _ in range(count)]
+
+
+def run(parse, links):
+    """ Parses every link and returns links per second. """
+    start = time.perf_counter()
+    for link in links:
+        try:
+            parse(link)
+        except dynalist.ParseException:
+            pass
+    return len(links) / (time.perf_counter() - start)
+
+
+def main():
+    """ Run the benchmark and print a table of results. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--links", type=int, default=1000000,
+                        help="Number of links to parse")
+    parser.add_argument("--distinct", type=int, default=50000,
+                        help="Number of distinct URLs among them")
+    args = parser.parse_args()
+    links = make_links(args.links, args.distinct)
+    print("{} links, {} distinct".format(args.links, args.distinct))
+    baseline = run(parse_url_four_regexes, links)
+    print("{:<28} {:>12} {:>8}".format("parser", "links/s", "speedup"))
+    for name, parse in (("four regexes (old)", parse_url_four_regexes),
+                        ("single regex, no memo", parse_url_uncached),
+                        ("single regex + memo", dynalist.parse_url)):
+        rate = baseline if parse is parse_url_four_regexes else run(parse, links)
+        print("{:<28} {:>12,.0f} {:>7.1f}x".format(name, rate, rate / baseline))
+
+
+if __name__ == "__main__":
+    main()
+
+# vim: foldmethod=indent
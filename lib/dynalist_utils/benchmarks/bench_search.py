@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+"""
+Compare answering Dynalist search queries by scanning every node with
+regular expressions with looking them up in a SearchIndex, and exporting
+the matches as Markdown, as dl2md does for #q= URLs, with exporting the
+whole document.
+"""
+
+# Python
+import argparse
+import random
+import re
+import time
+
+# Project
+from dynalist_utils import dynalist
+from dynalist_utils import markdown
+from dynalist_utils import search
+import synthetic
+
+QUERIES = ["#t42", "w123 -is:completed", "alpha bravo charlie", '"alpha bravo"',
+           "has:note color:2 #t7", "w4"]
+
+
+def compile_matcher(query):
+    """ The scanning approach: one regex, or filter test, per term. """
+    tests = []
+    for term in search.parse_query(query):
+        if term.kind == "filter":
+            def test(node, name=term.value):
+                return name in search.get_filters(node)
+        else:
+            if term.kind == "word":
+                pattern = r"\b" + re.escape(term.value)
+            elif term.kind == "tag":
+                pattern = "(?<![\\w#@])" + re.escape(term.value) + r"(?![\w-]*\w)"
+            else:
+                pattern = r"\b" + r"\W+".join(map(re.escape, term.value)) + r"\b"
+            regex = re.compile(pattern, re.IGNORECASE)
+            def test(node, regex=regex):
+                return bool(regex.search(node["content"]) or regex.search(node["note"]))
+        tests.append((term.negated, test))
+    return lambda node: all(test(node) != negated for negated, test in tests)
+
+
+def make_search_document(num_nodes, seed=0):
+    """ Returns a synthetic document whose nodes also have some rarer words
+        and tags. """
+    rng = random.Random(seed)
+    data = synthetic.make_document(num_nodes, seed=seed)
+    for node in data["nodes"][1:]:
+        node["content"] += " w{} #t{}".format(rng.randrange(50000), rng.randrange(1000))
+    return data
+
+
+def main():
+    """ Run the benchmark and print a table of results. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=200000,
+                        help="Number of nodes in the synthetic document")
+    args = parser.parse_args()
+    doc = dynalist.Document.from_dict(make_search_document(args.nodes))
+    start = time.perf_counter()
+    doc.get_search_index()
+    print("{} nodes, index built in {:.2f}s".format(args.nodes, time.perf_counter() - start))
+    start = time.perf_counter()
+    markdown.convert(doc, "root")
+    print("whole document exported in {:.2f}s".format(time.perf_counter() - start))
+    print("{:<24} {:>8} {:>12} {:>12} {:>12}".format("query", "matches", "scan ms", "index ms",
+                                                     "export ms"))
+    for query in QUERIES:
+        start = time.perf_counter()
+        matcher = compile_matcher(query)
+        scanned = [node for node in doc.iter_nodes() if node["id"] != "root" and matcher(node)]
+        scan = time.perf_counter() - start
+        start = time.perf_counter()
+        found = doc.search(query)
+        indexed = time.perf_counter() - start
+        start = time.perf_counter()
+        markdown.convert(doc, "root", doc.get_search_index().get_tree(query))
+        exported = time.perf_counter() - start
+        if [node["id"] for node in scanned] != [node["id"] for node in found]:
+            print("MISMATCH for {}: {} vs {}".format(query, len(scanned), len(found)))
+        print("{:<24} {:>8} {:>12.1f} {:>12.1f} {:>12.1f}".format(
+            query, len(found), scan * 1000, indexed * 1000, exported * 1000))
+
+
+if __name__ == "__main__":
+    main()
+
+# vim: foldmethod=indent
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""
+Compare loading a document from JSON against loading it from a snapshot.
+"""
+
+# Python
+import argparse
+import json
+import os
+import tempfile
+import time
+
+# Project
+from dynalist_utils import dynalist
+import synthetic
+
+
+def time_load(load, repeat):
+    """ Returns the best time in seconds of repeat calls to load(). """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    """ Run the benchmark and print a table of results. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=100000,
+                        help="Number of nodes in the synthetic document")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of timed loads per case")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        json_filename = os.path.join(directory, "doc.json")
+        with open(json_filename, "w") as outfile:
+            json.dump(synthetic.make_document(args.nodes), outfile)
+        print("{} nodes, {:.1f} MB of JSON".format(
+            args.nodes, os.path.getsize(json_filename) / 2 ** 20))
+        print("{:<10} {:>10} {:>12} {:>12} {:>8}".format(
+            "backend", "json s", "snapshot s", "snapshot MB", "speedup"))
+        for backend in dynalist.BACKENDS:
+            snapshot_filename = os.path.join(directory, backend + ".snapshot")
+            dynalist.Document.from_json_file(json_filename, backend).save_snapshot(
+                snapshot_filename)
+            json_time = time_load(
+                lambda: dynalist.Document.from_json_file(json_filename, backend), # pylint: disable=cell-var-from-loop
+                args.repeat)
+            snapshot_time = time_load(
+                lambda: dynalist.Document.from_snapshot(snapshot_filename), # pylint: disable=cell-var-from-loop
+                args.repeat)
+            print("{:<10} {:>10.3f} {:>12.3f} {:>12.1f} {:>7.1f}x".format(
+                backend, json_time, snapshot_time,
+                os.path.getsize(snapshot_filename) / 2 ** 20,
+                json_time / snapshot_time))
+
+
+if __name__ == "__main__":
+    main()
+
+# vim: foldmethod=indent
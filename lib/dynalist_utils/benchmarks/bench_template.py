@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""
+Compare generating texts by rescanning the template for each one, as
+dltemplate used to, with compiling it once and generating from the tokens,
+on one process and on many.
+"""
+
+# Python
+import argparse
+import random
+import time
+
+# Project
+from dynalist_utils import dynalist
+from dynalist_utils import template
+
+
+def process_by_rescanning(doc, node_id, rng):
+    """ The previous approach: index the keys, then search for and splice
+        in one field at a time, for every text. """
+    keys = {child["content"]: child for child in doc.get_children(node_id)}
+    text = doc.get_node(node_id)["content"]
+    while True:
+        match = template.FIELD_REGEX.search(text)
+        if not match:
+            break
+        key = match.group(1)
+        if key in keys:
+            value = rng.choice(doc.get_children(keys[key]["id"]))["content"]
+        else:
+            value = "MISS({})".format(key)
+        text = text[:match.start()] + value + text[match.end():]
+    return template.WHITESPACE_REGEX.sub(" ", text)
+
+
+def make_template_document(num_keys, num_values, nested):
+    """ Returns a document whose root is a template with num_keys fields,
+        each with num_values values.  If nested, every other value refers
+        to the next key. """
+    nodes = [{"id": "root", "note": "", "children": [],
+              "content": " ".join("word {{key%d}}" % i for i in range(num_keys))}]
+    for i in range(num_keys):
+        key = {"id": "k%d" % i, "content": "key%d" % i, "note": "", "children": []}
+        nodes[0]["children"].append(key["id"])
+        nodes.append(key)
+        for j in range(num_values):
+            content = "value%d_%d" % (i, j)
+            if nested and j % 2 and i + 1 < num_keys:
+                content += " of {{key%d}}" % (i + 1)
+            key["children"].append("v%d_%d" % (i, j))
+            nodes.append({"id": "v%d_%d" % (i, j), "content": content, "note": ""})
+    return dynalist.Document.from_dict({"nodes": nodes})
+
+
+def main():
+    """ Run the benchmark and print a table of results. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num", type=int, default=1000000,
+                        help="Number of texts to generate from the compiled template")
+    parser.add_argument("--rescan-num", type=int, default=20000,
+                        help="Number of texts to generate by rescanning")
+    parser.add_argument("--keys", type=int, default=10, help="Fields in the template")
+    parser.add_argument("--values", type=int, default=20, help="Values per field")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Processes for the parallel run")
+    args = parser.parse_args()
+    print("{} fields of {} values".format(args.keys, args.values))
+    print("{:<10} {:<12} {:>10} {:>14}".format("template", "approach", "texts", "texts/s"))
+    for nested in (False, True):
+        doc = make_template_document(args.keys, args.values, nested)
+        kind = "nested" if nested else "flat"
+
+        rng = random.Random(0)
+        start = time.perf_counter()
+        for _ in range(args.rescan_num):
+            process_by_rescanning(doc, "root", rng)
+        elapsed = time.perf_counter() - start
+        print("{:<10} {:<12} {:>10} {:>14,.0f}".format(kind, "rescan", args.rescan_num,
+                                                       args.rescan_num / elapsed))
+
+        rng = random.Random(0)
+        start = time.perf_counter()
+        compiled = template.compile_template(doc, "root")
+        for _ in compiled.iter_generate(args.num, rng):
+            pass
+        elapsed = time.perf_counter() - start
+        print("{:<10} {:<12} {:>10} {:>14,.0f}".format(kind, "compiled", args.num,
+                                                       args.num / elapsed))
+
+        start = time.perf_counter()
+        for _ in template.generate_seeded(compiled, args.num, 0, max_workers=args.workers):
+            pass
+        elapsed = time.perf_counter() - start
+        print("{:<10} {:<12} {:>10} {:>14,.0f}".format(
+            kind, "{} workers".format(args.workers), args.num, args.num / elapsed))
+
+
+if __name__ == "__main__":
+    main()
+
+# vim: foldmethod=indent
@@ -0,0 +1,52 @@
+"""
+Synthetic Dynalist documents for benchmarks.
+"""
+
+# Python
+import random
+import string
+
+COLORS = [0, 0, 0, 1, 2, 3]
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf",
+         "hotel", "india", "juliet", "kilo", "lima", "mike", "november"]
+
+
+def make_node_id(rng):
+    """ Returns a random, Dynalist-style node id. """
+    return "".join(rng.choice(string.ascii_letters + string.digits + "_-")
+                   for _ in range(24))
+
+
+def make_document(num_nodes, max_children=8, seed=0):
+    """ Returns a document dict with the given number of nodes, shaped
+        like a /doc/read response. """
+    rng = random.Random(seed)
+    root = {"id": "root", "content": "root", "note": "", "children": [],
+            "created": 1554216514019, "modified": 1554216524784}
+    nodes = [root]
+    parents = [root]
+    while len(nodes) < num_nodes:
+        parent = parents.pop(0)
+        for _ in range(rng.randint(1, max_children)):
+            if len(nodes) >= num_nodes:
+                break
+            node = {"id": make_node_id(rng),
+                    "content": " ".join(rng.choice(WORDS) for _ in range(6)),
+                    "note": rng.choice(["", "", "", " ".join(WORDS[:5])]),
+                    "created": 1554216514019 + len(nodes),
+                    "modified": 1554216524784 + len(nodes)}
+            color = rng.choice(COLORS)
+            if color:
+                node["color"] = color
+            if rng.random() < 0.1:
+                node["collapsed"] = True
+            if rng.random() < 0.2:
+                node["checked"] = rng.random() < 0.5
+            parent.setdefault("children", []).append(node["id"])
+            nodes.append(node)
+            parents.append(node)
+    return {"_code": "Ok", "file_id": "synthetic", "title": "synthetic",
+            "version": 1, "nodes": nodes}
+
+
+# vim: foldmethod=indent
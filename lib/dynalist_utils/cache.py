@@ -0,0 +1,149 @@
+"""
+On-disk cache of Dynalist documents.
+
+Entries are keyed by a hash of the document id, so every URL into the same
+document shares one entry.  Each entry is a binary snapshot of the document
+and its indexes (see Document.save_snapshot) plus a small metadata file
+recording the document's version and when it was fetched.  Entries
+younger than the TTL are used as-is; older entries are revalidated against
+the document's current version and only refetched if it changed.  The
+least recently used entries are evicted once the cache grows past its
+size limit.
+"""
+
+# Python
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+# Project
+from dynalist_utils import dynalist
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "dynalist_utils")
+DEFAULT_TTL = 0
+DEFAULT_MAX_SIZE = 512 * 2 ** 20
+DATA_SUFFIX = ".snapshot"
+META_SUFFIX = ".meta"
+
+
+class DocumentCache:
+    """ Persistent cache of Documents with TTL, version revalidation and
+        LRU eviction. """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, ttl=DEFAULT_TTL,
+                 max_size=DEFAULT_MAX_SIZE, clock=time.time):
+        self.__directory = directory
+        self.__ttl = ttl
+        self.__max_size = max_size
+        self.__clock = clock
+        os.makedirs(directory, exist_ok=True)
+
+
+    def get(self, doc_id, get_version=None, backend="dict"):
+        """ Returns the cached Document for doc_id, or None if there isn't
+            a usable entry.  Entries older than the TTL are only used if
+            get_version is given and get_version(doc_id) still returns the
+            version that was cached. """
+        data_filename, meta_filename = self.__get_filenames(doc_id)
+        try:
+            with open(meta_filename) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(data_filename):
+            return None
+        age = self.__clock() - meta["fetched"]
+        if age > self.__ttl:
+            if get_version is None or meta["version"] is None:
+                logging.info("Cached document expired: %s", doc_id)
+                return None
+            version = get_version(doc_id)
+            if version != meta["version"]:
+                logging.info("Cached document is out of date: %s (version %s, now %s)",
+                             doc_id, meta["version"], version)
+                return None
+            logging.info("Cached document is still current: %s", doc_id)
+            meta["fetched"] = self.__clock()
+            write_atomically(meta_filename, text_writer(json.dumps(meta)))
+        logging.info("Reusing cached document: %s", doc_id)
+        os.utime(data_filename)
+        return dynalist.Document.from_snapshot(data_filename, backend)
+
+
+    def put(self, doc_id, doc):
+        """ Stores a Document in the cache, then evicts old entries if the
+            cache is over its size limit. """
+        data_filename, meta_filename = self.__get_filenames(doc_id)
+        meta = {"doc_id": doc_id,
+                "version": doc.get_metadata().get("version"),
+                "fetched": self.__clock()}
+        write_atomically(data_filename, doc.save_snapshot)
+        write_atomically(meta_filename, text_writer(json.dumps(meta)))
+        logging.info("Cached document %s at: %s", doc_id, data_filename)
+        self.evict(keep=data_filename)
+
+
+    def evict(self, keep=None):
+        """ Removes least recently used entries until the cache is within
+            its size limit.  The entry whose data file is keep is spared. """
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.__directory):
+            if not entry.name.endswith(DATA_SUFFIX):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.__max_size:
+                break
+            if path == keep:
+                continue
+            logging.info("Evicting cached document: %s", path)
+            remove_if_exists(path[:-len(DATA_SUFFIX)] + META_SUFFIX)
+            remove_if_exists(path)
+            total_size -= size
+
+
+    def __get_filenames(self, doc_id):
+        """ Returns the data and metadata filenames for the given doc. """
+        key = hashlib.sha256(doc_id.encode("utf-8")).hexdigest()
+        base = os.path.join(self.__directory, key)
+        return base + DATA_SUFFIX, base + META_SUFFIX
+
+
+def write_atomically(filename, write):
+    """ Calls write(temp_filename) and then moves the temporary file over
+        filename, so readers never see a partial file. """
+    directory = os.path.dirname(filename) or "."
+    handle, temp_filename = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(handle)
+    try:
+        write(temp_filename)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        remove_if_exists(temp_filename)
+        raise
+
+
+def text_writer(text):
+    """ Returns a write function for write_atomically that writes text. """
+    def write(filename):
+        with open(filename, "w") as outfile:
+            outfile.write(text)
+    return write
+
+
+def remove_if_exists(filename):
+    """ Removes a file, ignoring it if it's already gone. """
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,185 @@
+"""
+Pooled, retrying client for the Dynalist API.
+"""
+
+# Python
+import logging
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+# Libraries
+import requests
+import requests.adapters
+
+# Project
+from dynalist_utils import errors
+from dynalist_utils import jsonstream
+
+API_URL = "https://dynalist.io/api/v1/"
+DEFAULT_TIMEOUT = (10, 60)
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+POOL_SIZE = 16
+RETRY_CODES = ("TooManyRequests",)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_CLIENTS: Dict[Tuple[str, str], "DynalistClient"] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+class DynalistClient:
+    """ Talks to the Dynalist API over one pooled, keep-alive session,
+        retrying with exponential backoff on rate limits and transient
+        failures.  If given, on_request(endpoint, seconds, outcome) is
+        called after every HTTP attempt, where outcome is the API code,
+        the HTTP status or the exception name. """
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, token, api_url=None, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF,
+                 on_request=None, sleep=time.sleep):
+        self.__token = token
+        self.__api_url = get_api_url(api_url, os.environ)
+        self.__timeout = timeout
+        self.__max_retries = max_retries
+        self.__backoff = backoff
+        self.__on_request = on_request
+        self.__sleep = sleep
+        self.__session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE,
+                                                pool_maxsize=POOL_SIZE)
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+
+
+    def call(self, endpoint, args=None, stream=False):
+        """ POSTs args plus the token to the given endpoint, e.g. 'doc/read',
+            and returns the decoded response.  With stream=True the response
+            is decoded with jsonstream.load, so any "nodes" array arrives as
+            an iterator.  Raises errors.ApiException if the API reports an
+            error or retries run out. """
+        body = dict(args or {})
+        body["token"] = self.__token
+        url = self.__api_url + endpoint
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.__session.post(url, json=body, timeout=self.__timeout,
+                                               stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as exception:
+                self.__record(endpoint, start, type(exception).__name__)
+                if attempt >= self.__max_retries:
+                    raise errors.ApiException(
+                        "ERROR: API request failed: " + str(exception)) from exception
+                attempt = self.__wait(attempt, endpoint, type(exception).__name__)
+                continue
+            if response.status_code in RETRY_STATUSES:
+                response.close()
+                self.__record(endpoint, start, response.status_code)
+                if attempt >= self.__max_retries:
+                    raise errors.ApiException("ERROR: API request failed. Status was " +
+                                              str(response.status_code))
+                attempt = self.__wait(attempt, endpoint, response.status_code,
+                                      response.headers.get("Retry-After"))
+                continue
+            try:
+                data = decode_response(response, stream)
+            except ValueError as exception:
+                response.close()
+                self.__record(endpoint, start, response.status_code)
+                raise errors.ApiException("ERROR: API response was not JSON. Status was " +
+                                          str(response.status_code)) from exception
+            code = data.get("_code", "Ok")
+            self.__record(endpoint, start, code)
+            if code != "Ok":
+                # A streamed body is left open only for a successful read
+                response.close()
+            if code in RETRY_CODES and attempt < self.__max_retries:
+                attempt = self.__wait(attempt, endpoint, code)
+                continue
+            if code != "Ok":
+                raise errors.ApiException("ERROR: API request failed. Code was '" +
+                                          str(code) + "'", code)
+            return data
+
+
+    def read_doc(self, file_id, stream=False):
+        """ Returns the /doc/read response for the given document. """
+        return self.call("doc/read", {"file_id": file_id}, stream)
+
+
+    def list_files(self):
+        """ Returns the /file/list response describing the user's files. """
+        return self.call("file/list")
+
+
+    def check_for_updates(self, file_ids):
+        """ Returns a dict of document id to current version. """
+        return self.call("doc/check_for_updates", {"file_ids": list(file_ids)})["versions"]
+
+
+    def edit_doc(self, file_id, changes):
+        """ Applies a list of /doc/edit changes to the given document. """
+        return self.call("doc/edit", {"file_id": file_id, "changes": changes})
+
+
+    def close(self):
+        """ Closes the pooled connections. """
+        self.__session.close()
+
+
+    def __record(self, endpoint, start, outcome):
+        """ Logs one HTTP attempt and passes it to the on_request hook. """
+        elapsed = time.perf_counter() - start
+        logging.debug("%s: %s in %.3fs", endpoint, outcome, elapsed)
+        if self.__on_request:
+            self.__on_request(endpoint, elapsed, outcome)
+
+
+    def __wait(self, attempt, endpoint, outcome, retry_after=None):
+        """ Sleeps before the next retry and returns the next attempt
+            number.  Honors a numeric Retry-After header. """
+        delay = min(self.__backoff * 2 ** attempt, MAX_BACKOFF)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        logging.warning("%s: got %s, retrying in %.1fs", endpoint, outcome, delay)
+        self.__sleep(delay)
+        return attempt + 1
+
+
+def decode_response(response, stream):
+    """ Decodes a JSON response body, incrementally if streaming. """
+    if not stream:
+        return response.json()
+    response.raw.decode_content = True
+    return jsonstream.load(response.raw)
+
+
+def get_api_url(api_url, env):
+    """ Get API URL from the argument or environment, with a trailing
+        slash. """
+    if not api_url:
+        api_url = env.get("DYNALIST_API_URL", API_URL)
+    if not api_url.endswith("/"):
+        api_url += "/"
+    return api_url
+
+
+def get_client(token, api_url=None):
+    """ Returns a DynalistClient shared by everything in this process that
+        uses the same token and API URL. """
+    key = (token, get_api_url(api_url, os.environ))
+    with _CLIENTS_LOCK:
+        if key not in _CLIENTS:
+            _CLIENTS[key] = DynalistClient(token, api_url)
+        return _CLIENTS[key]
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,293 @@
+"""
+Compact, array-backed storage for Dynalist nodes.
+
+The default Document backend keeps every node as the dict that json.load
+produced.  CompactStore instead interns node ids to integers, keeps the
+well-known fields in typed arrays and all content and notes in one string
+table, and hands out lightweight, dict-compatible NodeView objects.
+"""
+
+# Python
+import array
+from collections.abc import Mapping
+
+ABSENT = -1
+BOOLEAN_FIELDS = ("checked", "checkbox", "collapsed")
+SMALL_INT_FIELDS = ("color", "heading")
+TIMESTAMP_FIELDS = ("created", "modified")
+FIELD_ORDER = (("id", "content", "note") + BOOLEAN_FIELDS +
+               SMALL_INT_FIELDS + TIMESTAMP_FIELDS + ("children",))
+
+
+class CompactStore(Mapping):
+    """ Maps node id to NodeView, storing node fields in flat arrays. """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, nodes=()):
+        self.__ids = []
+        self.__numbers = {}
+        self.__order = array.array("i")
+        self.__present = array.array("b")
+        self.__strings = [""]
+        self.__content = array.array("i")
+        self.__note = array.array("i")
+        self.__booleans = {field: array.array("b") for field in BOOLEAN_FIELDS}
+        self.__small_ints = {field: array.array("b") for field in SMALL_INT_FIELDS}
+        self.__timestamps = {field: array.array("q") for field in TIMESTAMP_FIELDS}
+        self.__child_offset = array.array("i")
+        self.__child_count = array.array("i")
+        self.__child_numbers = array.array("i")
+        self.__extras = {}
+        for node in nodes:
+            self.add(node)
+
+
+    def add(self, node):
+        """ Adds a node dict to the store.  The dict is not retained. """
+        number = self.__intern(node["id"])
+        if not self.__present[number]:
+            self.__present[number] = 1
+            self.__order.append(number)
+        extras = {}
+        for key, value in node.items():
+            if not self.__set_field(number, key, value):
+                extras[key] = value
+        if extras:
+            self.__extras[number] = extras
+        else:
+            self.__extras.pop(number, None)
+
+
+    def __intern(self, node_id):
+        """ Returns the integer for the given node id, allocating a new
+            slot in every per-node array if it hasn't been seen before. """
+        number = self.__numbers.get(node_id)
+        if number is not None:
+            return number
+        number = len(self.__ids)
+        self.__ids.append(node_id)
+        self.__numbers[node_id] = number
+        self.__present.append(0)
+        self.__content.append(ABSENT)
+        self.__note.append(ABSENT)
+        for values in self.__booleans.values():
+            values.append(ABSENT)
+        for values in self.__small_ints.values():
+            values.append(ABSENT)
+        for values in self.__timestamps.values():
+            values.append(ABSENT)
+        self.__child_offset.append(0)
+        self.__child_count.append(ABSENT)
+        return number
+
+
+    def __intern_string(self, value):
+        """ Adds a string to the string table and returns its index. """
+        if not value:
+            return 0
+        self.__strings.append(value)
+        return len(self.__strings) - 1
+
+
+    def __set_field(self, number, key, value):
+        """ Stores a well-known field in its array.  Returns False if the
+            field must be kept as an extra instead. """
+        # pylint: disable=too-many-return-statements
+        if key == "id":
+            return True
+        if key in ("content", "note") and isinstance(value, str):
+            target = self.__content if key == "content" else self.__note
+            target[number] = self.__intern_string(value)
+            return True
+        if key in self.__booleans and isinstance(value, bool):
+            self.__booleans[key][number] = int(value)
+            return True
+        if (key in self.__small_ints and type(value) is int # pylint: disable=unidiomatic-typecheck
+                and 0 <= value < 128):
+            self.__small_ints[key][number] = value
+            return True
+        if (key in self.__timestamps and type(value) is int # pylint: disable=unidiomatic-typecheck
+                and 0 <= value < 2 ** 63):
+            self.__timestamps[key][number] = value
+            return True
+        if key == "children" and isinstance(value, list):
+            self.__child_offset[number] = len(self.__child_numbers)
+            self.__child_count[number] = len(value)
+            self.__child_numbers.extend(self.__intern(child_id) for child_id in value)
+            return True
+        return False
+
+
+    def get_field(self, number, key):
+        """ Returns a field of the node with the given number.  Raises
+            KeyError if the node doesn't have that field. """
+        # pylint: disable=too-many-return-statements
+        if key == "id":
+            return self.__ids[number]
+        extras = self.__extras.get(number)
+        if extras and key in extras:
+            return extras[key]
+        if key == "content" and self.__content[number] != ABSENT:
+            return self.__strings[self.__content[number]]
+        if key == "note" and self.__note[number] != ABSENT:
+            return self.__strings[self.__note[number]]
+        if key in self.__booleans and self.__booleans[key][number] != ABSENT:
+            return bool(self.__booleans[key][number])
+        if key in self.__small_ints and self.__small_ints[key][number] != ABSENT:
+            return self.__small_ints[key][number]
+        if key in self.__timestamps and self.__timestamps[key][number] != ABSENT:
+            return self.__timestamps[key][number]
+        if key == "children" and self.__child_count[number] != ABSENT:
+            return self.get_child_ids(number)
+        raise KeyError(key)
+
+
+    def has_field(self, number, key):
+        """ Returns whether the node with the given number has a field. """
+        try:
+            self.get_field(number, key)
+        except KeyError:
+            return False
+        return True
+
+
+    def iter_fields(self, number):
+        """ Yields the field names the node with the given number has. """
+        extras = self.__extras.get(number, {})
+        for key in FIELD_ORDER:
+            if self.has_field(number, key):
+                yield key
+        for key in extras:
+            if key not in FIELD_ORDER:
+                yield key
+
+
+    def get_number(self, node_id):
+        """ Returns the integer the given node id was interned to. """
+        return self.__numbers[node_id]
+
+
+    def get_id(self, number):
+        """ Returns the node id interned to the given integer. """
+        return self.__ids[number]
+
+
+    def get_capacity(self):
+        """ Returns how many node ids have been interned so far, which
+            includes ids only seen as children. """
+        return len(self.__ids)
+
+
+    def get_child_ids(self, number):
+        """ Returns the list of child ids of the node with the given
+            number. """
+        count = self.__child_count[number]
+        if count == ABSENT:
+            return []
+        offset = self.__child_offset[number]
+        ids = self.__ids
+        return [ids[child] for child in self.__child_numbers[offset:offset + count]]
+
+
+    def __getitem__(self, node_id):
+        number = self.__numbers.get(node_id)
+        if number is None or not self.__present[number]:
+            raise KeyError(node_id)
+        return NodeView(self, number)
+
+
+    def __contains__(self, node_id):
+        number = self.__numbers.get(node_id)
+        return number is not None and self.__present[number] == 1
+
+
+    def __iter__(self):
+        ids = self.__ids
+        return (ids[number] for number in self.__order)
+
+
+    def __len__(self):
+        return len(self.__order)
+
+
+class NodeView(Mapping):
+    """ Read-only, dict-compatible view of one node in a CompactStore. """
+
+    __slots__ = ("__store", "__number")
+
+    def __init__(self, store, number):
+        self.__store = store
+        self.__number = number
+
+
+    def __getitem__(self, key):
+        return self.__store.get_field(self.__number, key)
+
+
+    def __contains__(self, key):
+        return self.__store.has_field(self.__number, key)
+
+
+    def __iter__(self):
+        return self.__store.iter_fields(self.__number)
+
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+    def __repr__(self):
+        return "NodeView({!r})".format(dict(self))
+
+
+class CompactTreeIndex(Mapping):
+    """ Maps node id to tree position, storing positions in flat arrays
+        indexed by the node's number in a CompactStore. """
+
+    def __init__(self, store, positions, position_type):
+        self.__store = store
+        self.__position_type = position_type
+        capacity = store.get_capacity()
+        self.__parents = array.array("i", [ABSENT]) * capacity
+        self.__depths = array.array("i", [ABSENT]) * capacity
+        self.__siblings = array.array("i", [ABSENT]) * capacity
+        self.__pre = array.array("i", [ABSENT]) * capacity
+        self.__post = array.array("i", [ABSENT]) * capacity
+        self.__size = 0
+        for node_id, position in positions:
+            number = store.get_number(node_id)
+            if position.parent_id is not None:
+                self.__parents[number] = store.get_number(position.parent_id)
+            self.__depths[number] = position.depth
+            self.__siblings[number] = position.position
+            self.__pre[number] = position.pre
+            self.__post[number] = position.post
+            self.__size += 1
+
+
+    def __getitem__(self, node_id):
+        if node_id not in self:
+            raise KeyError(node_id)
+        number = self.__store.get_number(node_id)
+        parent = self.__parents[number]
+        return self.__position_type(
+            None if parent == ABSENT else self.__store.get_id(parent),
+            self.__depths[number], self.__siblings[number],
+            self.__pre[number], self.__post[number])
+
+
+    def __contains__(self, node_id):
+        if node_id not in self.__store:
+            return False
+        return self.__depths[self.__store.get_number(node_id)] != ABSENT
+
+
+    def __iter__(self):
+        return (node_id for node_id in self.__store if node_id in self)
+
+
+    def __len__(self):
+        return self.__size
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,238 @@
+"""
+Dates in Dynalist nodes, and a sorted index for finding them by day.
+
+Dynalist dates look like !(2019-04-10), optionally with a time, an end
+date and time, and a recurrence rule, e.g. !(2019-04-10 09:30 - 10:00 | 1w).
+The first date in a node's content, or failing that its note, is the
+node's date.
+"""
+
+# Python
+import array
+import bisect
+import collections
+import datetime
+import functools
+import heapq
+import operator
+import re
+
+DATE_REGEX = re.compile(
+    r"!\((?P<date>\d\d\d\d-\d\d-\d\d)"
+    r"(?:[ T](?P<time>\d\d?:\d\d))?"
+    r"(?:\s*-\s*(?P<end_date>\d\d\d\d-\d\d-\d\d)?[ T]?(?P<end_time>\d\d?:\d\d)?)?"
+    r"(?:\s*\|\s*(?P<recurrence>[^)]*))?"
+    r"[^)]*\)")
+
+DatedNode = collections.namedtuple(
+    "DatedNode", ["date", "time", "end_date", "end_time", "recurrence", "node_id",
+                  "content", "note", "link", "checked"])
+DatedNode.__doc__ = """ A node and the first date found in it.  Dates are
+    ISO strings; time, end_date, end_time and recurrence are "" if absent.
+    The node's id, content and note are copied rather than the node kept,
+    so that an index doesn't hold on to the document it came from, such as
+    a compact.CompactStore, once that is replaced. """
+
+
+class DateIndex:
+    """ Dated nodes sorted by date and time, with the dates held as day
+        ordinals in arrays so that the nodes in any range of days are found
+        with two binary searches.  Unchecked nodes are indexed a second time
+        on their own, so ranges of only open items don't have to skip past
+        checked ones.  Nodes can be added and discarded one at a time, to
+        follow a changing document with update(). """
+
+    def __init__(self, dated_nodes=()):
+        self.__nodes = []
+        self.__ordinals = array.array("l")
+        self.__open_nodes = []
+        self.__open_ordinals = array.array("l")
+        # Bucket by day, then sort each day's few nodes by time
+        days = {}
+        for item in dated_nodes:
+            days.setdefault(get_ordinal(item.date), []).append(item)
+        for ordinal in sorted(days):
+            day = sorted(days[ordinal], key=operator.attrgetter("time"))
+            self.__nodes.extend(day)
+            self.__ordinals.extend(array.array("l", [ordinal]) * len(day))
+            open_nodes = [item for item in day if not item.checked]
+            self.__open_nodes.extend(open_nodes)
+            self.__open_ordinals.extend(array.array("l", [ordinal]) * len(open_nodes))
+        self.__by_link = {item.link: item for item in self.__nodes}
+
+
+    @staticmethod
+    def from_documents(docs):
+        """ Creates a DateIndex of the dated nodes in all the given
+            Documents. """
+        return DateIndex(dated_node for doc in docs for dated_node in iter_dated_nodes(doc))
+
+
+    def __len__(self):
+        return len(self.__nodes)
+
+
+    def get_range(self, start=None, end=None, include_checked=True):
+        """ Returns the dated nodes from start, inclusive, to end, exclusive,
+            in date and time order.  start and end are datetime.dates; None
+            leaves that end of the range open.  Checked nodes are left out
+            if include_checked is false. """
+        nodes, ordinals = self.__nodes, self.__ordinals
+        if not include_checked:
+            nodes, ordinals = self.__open_nodes, self.__open_ordinals
+        low = 0 if start is None else bisect.bisect_left(ordinals, start.toordinal())
+        high = len(ordinals) if end is None else bisect.bisect_left(ordinals, end.toordinal())
+        return nodes[low:high]
+
+
+    def get_day(self, day, include_checked=True):
+        """ Returns the dated nodes on the given datetime.date. """
+        return self.get_range(day, day + datetime.timedelta(days=1), include_checked)
+
+
+    def add(self, item):
+        """ Adds a DatedNode in date and time order, after any others at the
+            same date and time. """
+        self.__insert(self.__nodes, self.__ordinals, item)
+        if not item.checked:
+            self.__insert(self.__open_nodes, self.__open_ordinals, item)
+        self.__by_link[item.link] = item
+
+
+    def discard(self, link):
+        """ Removes the DatedNode with the given link, if there is one. """
+        item = self.__by_link.pop(link, None)
+        if item is None:
+            return
+        self.__delete(self.__nodes, self.__ordinals, item)
+        if not item.checked:
+            self.__delete(self.__open_nodes, self.__open_ordinals, item)
+
+
+    def update(self, old_doc, new_doc):
+        """ Brings the nodes of old_doc, which this index holds, up to date
+            with new_doc, extracting dates only from the nodes that were
+            added or changed.  Returns the number of nodes looked at again. """
+        doc_url = get_doc_url(new_doc)
+        changed = 0
+        for node_id, node in iter_changed_nodes(old_doc, new_doc):
+            self.discard(doc_url + node_id)
+            item = get_dated_node(node, doc_url) if node is not None else None
+            if item is not None:
+                self.add(item)
+            changed += 1
+        return changed
+
+
+    @staticmethod
+    def __insert(nodes, ordinals, item):
+        """ Inserts item into one pair of node list and ordinal array. """
+        ordinal = get_ordinal(item.date)
+        position = bisect.bisect_right(ordinals, ordinal)
+        low = bisect.bisect_left(ordinals, ordinal)
+        while position > low and nodes[position - 1].time > item.time:
+            position -= 1
+        nodes.insert(position, item)
+        ordinals.insert(position, ordinal)
+
+
+    @staticmethod
+    def __delete(nodes, ordinals, item):
+        """ Deletes item from one pair of node list and ordinal array. """
+        ordinal = get_ordinal(item.date)
+        for position in range(bisect.bisect_left(ordinals, ordinal),
+                              bisect.bisect_right(ordinals, ordinal)):
+            if nodes[position] is item:
+                del nodes[position]
+                del ordinals[position]
+                return
+
+
+class IndexGroup:
+    """ Several DateIndexes, e.g. one per document, queried as one. """
+
+    def __init__(self, indexes):
+        self.__indexes = list(indexes)
+
+
+    def __len__(self):
+        return sum(len(index) for index in self.__indexes)
+
+
+    def get_range(self, start=None, end=None, include_checked=True):
+        """ Like DateIndex.get_range, merging the ranges of every index. """
+        return list(heapq.merge(
+            *(index.get_range(start, end, include_checked) for index in self.__indexes),
+            key=operator.attrgetter("date", "time")))
+
+
+    def get_day(self, day, include_checked=True):
+        """ Returns the dated nodes on the given datetime.date. """
+        return self.get_range(day, day + datetime.timedelta(days=1), include_checked)
+
+
+def iter_dated_nodes(doc):
+    """ Yields a DatedNode for each node of the Document that has a valid
+        date, scanning each node once. """
+    doc_url = get_doc_url(doc)
+    # Order doesn't matter to a DateIndex, so skip the tree walk
+    for node in doc.iter_nodes("api"):
+        item = get_dated_node(node, doc_url)
+        if item is not None:
+            yield item
+
+
+def get_dated_node(node, doc_url):
+    """ Returns a DatedNode for the first valid date in the node's content
+        or, failing that, its note, or None if it has none.  doc_url is the
+        node's link without the node id, as from get_doc_url. """
+    # Look in content, then note
+    for text in (node["content"], node["note"]):
+        for match in DATE_REGEX.finditer(text):
+            date, time, end_date, end_time, recurrence = match.groups("")
+            if get_ordinal(date) is None:
+                continue
+            # Times sort as strings, so give them all two-digit hours
+            return DatedNode(date, time.zfill(5) if time else "", end_date,
+                             end_time.zfill(5) if end_time else "", recurrence.strip(),
+                             node["id"], node["content"], node["note"],
+                             doc_url + node["id"], bool(node.get("checked")))
+    return None
+
+
+def get_doc_url(doc):
+    """ Returns the URL that node ids of the Document are appended to. """
+    metadata = doc.get_metadata()
+    return "https://dynalist.io/d/{}#z=".format(
+        metadata.get("doc_id") or metadata.get("file_id", ""))
+
+
+def iter_changed_nodes(old_doc, new_doc):
+    """ Yields (node_id, node) for each node of new_doc that is new or whose
+        date-related fields differ from old_doc, and (node_id, None) for
+        each node of old_doc that is gone. """
+    for node in new_doc.iter_nodes("api"):
+        node_id = node["id"]
+        if not old_doc.has_node(node_id):
+            yield node_id, node
+            continue
+        old_node = old_doc.get_node(node_id)
+        if (node["content"] != old_node["content"] or node["note"] != old_node["note"]
+                or bool(node.get("checked")) != bool(old_node.get("checked"))):
+            yield node_id, node
+    for node in old_doc.iter_nodes("api"):
+        if not new_doc.has_node(node["id"]):
+            yield node["id"], None
+
+
+@functools.lru_cache(maxsize=4096)
+def get_ordinal(date):
+    """ Returns the day ordinal of an ISO date string, or None if it isn't a
+        valid date. """
+    try:
+        return datetime.date.fromisoformat(date).toordinal()
+    except ValueError:
+        return None
+
+
+# vim: foldmethod=indent
@@ -3,55 +3,160 @@ Classes and methods for working with the Dynalist API.
 """
 
 # Python
+import collections
+import functools
+import itertools
 import json
+import pickle
 import re
+import urllib.parse
 
-# Libraries
-import requests
+# Project
+from dynalist_utils import client
+from dynalist_utils import compact
+from dynalist_utils import errors
+from dynalist_utils import jsonstream
+from dynalist_utils import markdown
+from dynalist_utils import search
+
+
+BACKENDS = ("dict", "compact")
+SNAPSHOT_FORMAT = 1
+URL_CACHE_SIZE = 65536
+
+# Matches https://dynalist.io/d/<doc id>, with or without the scheme, and
+# an optional fragment of &-separated parameters.  z= gives the zoom node;
+# q= gives the query and, as in Dynalist, runs to the end of the URL, so it
+# is matched once after the other parameters rather than inside their
+# repetition, where it would backtrack exponentially on a line break.
+URL_REGEX = re.compile(
+    r"^(?:https?://)?(?:www\.)?dynalist\.io/d/(?P<doc_id>[a-zA-Z0-9_-]+)/?"
+    r"(?:#(?:(?:z=(?P<zoom_node_id>[a-zA-Z0-9_-]*)|(?![zq]=)[^&=]+=[^&]*)(?:&|$))*"
+    r"(?:q=(?P<query>.*))?)?$")
+
+TreePosition = collections.namedtuple(
+    "TreePosition",
+    ["parent_id", "depth", "position", "pre", "post"])
+
+
+Link = collections.namedtuple("Link", ["source_id", "title", "url", "target"])
+Link.__doc__ = """ A link found in a node.  target is the parsed Dynalist URL
+    (see parse_url), or None if the link isn't to Dynalist. """
+
+LinkIndex = collections.namedtuple("LinkIndex", ["outgoing", "incoming"])
+
+# The exceptions live in errors.py, so that client.py needn't import this
+# module; they keep their names here for existing callers.
+DynalistException = errors.DynalistException
+ApiException = errors.ApiException
+ParseException = errors.ParseException
 
 
 class Document:
     """ Encapsulates a Dynalist document. """
 
     @staticmethod
-    def from_url(url, token): # pragma: no cover
+    def from_url(url, token, backend="dict"): # pragma: no cover
         """ Creates a Document object from a JSON file. """
         parsed_url = parse_url(url)
         doc_id = parsed_url["doc_id"]
-        doc = Document.from_api(doc_id, token)
+        doc = Document.from_api(doc_id, token, backend)
         doc.get_metadata().update(parsed_url)
         return doc
 
 
     @staticmethod
-    def from_api(doc_id, token): # pragma: no cover
+    def from_api(doc_id, token, backend="dict"): # pragma: no cover
         """ Creates a Document object from API. """
-        doc = Document(get_data_from_api(doc_id, token))
+        doc = Document(get_data_from_api(doc_id, token, stream=True), backend)
         doc.get_metadata()["doc_id"] = doc_id
         return doc
 
 
     @staticmethod
-    def from_json_file(filename):
+    def from_json_file(filename, backend="dict"):
         """ Creates a Document object from a JSON file. """
-        return Document(load_json_from_file(filename))
+        with open(filename, "rb") as infile:
+            return Document.from_json_stream(infile, backend)
 
 
     @staticmethod
-    def from_json_stream(stream):
-        """ Creates a Document object from a JSON stream. """
-        return Document(load_json_from_stream(stream))
+    def from_json_stream(stream, backend="dict"):
+        """ Creates a Document object from a JSON stream, which may be text
+            or binary.  Nodes are decoded and indexed one at a time as the
+            stream is read. """
+        return Document(jsonstream.load(stream), backend)
 
 
     @staticmethod
-    def from_dict(data):
+    def from_dict(data, backend="dict"):
         """ Creates a Document object from a dictionary. """
-        return Document(data)
+        return Document(data, backend)
+
+
+    @staticmethod
+    def from_snapshot(filename, backend=None):
+        """ Creates a Document object from a snapshot written by
+            save_snapshot, without re-parsing JSON or rebuilding indexes.
+            If backend is given and differs from the snapshot's, the
+            document is rebuilt in that backend.  Snapshots are pickles, so
+            only load ones you wrote yourself. """
+        with open(filename, "rb") as infile:
+            snapshot = pickle.load(infile)
+        if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT:
+            raise ParseException("ERROR: Not a document snapshot: " + str(filename))
+        doc = Document(snapshot["data"], snapshot["backend"],
+                       (snapshot["index"], snapshot["tree"]))
+        if backend is not None and backend != doc.get_backend():
+            data = dict(doc.get_metadata())
+            data["nodes"] = [dict(node) for node in doc.iter_nodes(order="api")]
+            return Document(data, backend)
+        return doc
 
 
-    def __init__(self, data):
-        self.__data = data
-        self.__index = get_index_by_node_id(data)
+    def __init__(self, data, backend="dict", indexes=None):
+        """ The backend parameter selects how nodes are held in memory:
+            'dict' (default) keeps the node dicts as given, 'compact'
+            copies them into a compact.CompactStore and drops them.
+            data["nodes"] may be any iterable of node dicts.  indexes is
+            the (index, tree) pair saved in a snapshot, as from_snapshot
+            passes it, to use instead of building them from data. """
+        self.__backend = backend
+        if indexes is not None:
+            self.__data = data
+            self.__index, self.__tree = indexes
+        elif backend == "dict":
+            if not isinstance(data["nodes"], list):
+                data["nodes"] = list(data["nodes"])
+            self.__data = data
+            self.__index = get_index_by_node_id(data)
+            self.__tree = get_tree_index(self.__index)
+        elif backend == "compact":
+            self.__index = compact.CompactStore(data["nodes"])
+            self.__data = {key: value for key, value in data.items() if key != "nodes"}
+            self.__tree = compact.CompactTreeIndex(
+                self.__index, iter_tree_positions(self.__index), TreePosition)
+        else:
+            raise Exception("backend must be one of: " + ", ".join(BACKENDS))
+        self.__links = None
+        self.__search = None
+
+
+    def save_snapshot(self, filename):
+        """ Writes the document and its prebuilt indexes to a binary
+            snapshot file for fast reloading with from_snapshot. """
+        snapshot = {"format": SNAPSHOT_FORMAT,
+                    "backend": self.__backend,
+                    "data": self.__data,
+                    "index": self.__index,
+                    "tree": self.__tree}
+        with open(filename, "wb") as outfile:
+            pickle.dump(snapshot, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+    def get_backend(self):
+        """ Returns the name of the backend holding the nodes. """
+        return self.__backend
 
 
     def get_metadata(self):
@@ -82,83 +187,237 @@ class Document:
         return [self.get_node(child_id) for child_id in node["children"]]
 
 
+    def get_parent(self, node_id):
+        """ Returns the parent node of the given node, or None for the
+            root. """
+        parent_id = self.__tree[node_id].parent_id
+        if parent_id is None:
+            return None
+        return self.get_node(parent_id)
+
+
+    def get_depth(self, node_id):
+        """ Returns the depth of the given node; the root is depth 0. """
+        return self.__tree[node_id].depth
+
+
+    def get_position(self, node_id):
+        """ Returns the index of the given node among its siblings. """
+        return self.__tree[node_id].position
+
+
+    def is_ancestor(self, ancestor_id, node_id):
+        """ Returns whether ancestor_id is a proper ancestor of node_id. """
+        ancestor = self.__tree[ancestor_id]
+        node = self.__tree[node_id]
+        return ancestor.pre < node.pre and node.post < ancestor.post
+
+
+    def get_path(self, node_id):
+        """ Returns the list of nodes from the root down to and including
+            the given node. """
+        path = []
+        while node_id is not None:
+            path.append(self.get_node(node_id))
+            node_id = self.__tree[node_id].parent_id
+        path.reverse()
+        return path
+
+
     def get_descendents(self, node_id):
         """ Get all descendents of the given node in tree order. """
-        nodes = []
-        for child in self.get_children(node_id):
-            nodes.append(child)
-            nodes += self.get_descendents(child["id"])
-        return nodes
+        return list(self.iter_descendents(node_id))
+
+
+    def iter_descendents(self, node_id, order="pre"):
+        """ Lazily yield all descendents of the given node.  The order
+            parameter selects pre-order (default, order='pre'), post-order
+            (order='post') or breadth-first (order='breadth') traversal.
+            Uses an explicit stack, so deep outlines don't hit the
+            recursion limit. """
+        if order == "pre":
+            return self.__iter_pre_order(node_id)
+        if order == "post":
+            return self.__iter_post_order(node_id)
+        if order == "breadth":
+            return self.__iter_breadth_first(node_id)
+        raise Exception("order must be 'pre', 'post' or 'breadth'")
+
+
+    def __iter_child_ids(self, node_id):
+        """ Returns an iterator over the child ids of the given node. """
+        return iter(self.get_node(node_id).get("children", ()))
+
+
+    def __iter_pre_order(self, node_id):
+        """ Pre-order traversal, one child iterator per depth level. """
+        stack = [self.__iter_child_ids(node_id)]
+        while stack:
+            child_id = next(stack[-1], None)
+            if child_id is None:
+                stack.pop()
+                continue
+            yield self.get_node(child_id)
+            stack.append(self.__iter_child_ids(child_id))
+
+
+    def __iter_post_order(self, node_id):
+        """ Post-order traversal, one child iterator per depth level. """
+        stack = [(None, self.__iter_child_ids(node_id))]
+        while stack:
+            child_id = next(stack[-1][1], None)
+            if child_id is None:
+                parent_id, _ = stack.pop()
+                if parent_id is not None:
+                    yield self.get_node(parent_id)
+                continue
+            stack.append((child_id, self.__iter_child_ids(child_id)))
+
+
+    def __iter_breadth_first(self, node_id):
+        """ Breadth-first traversal using a FIFO queue. """
+        queue = collections.deque([node_id])
+        while queue:
+            for child_id in self.__iter_child_ids(queue.popleft()):
+                yield self.get_node(child_id)
+                queue.append(child_id)
 
 
     def get_nodes(self, order="tree"):
         """ Get all nodes from the doc in a list.  The order parameter
             controls whether the nodes are returned in tree order (default,
             order='tree') or api order (order='api'). """
+        return list(self.iter_nodes(order))
+
+
+    def iter_nodes(self, order="tree"):
+        """ Lazily yield all nodes from the doc.  The order parameter is
+            'tree' (default, pre-order from the root), 'post' (post-order,
+            root last), 'breadth' (breadth-first from the root) or 'api'
+            (the order the API returned them). """
         if order == "api":
-            return list(self.__data["nodes"])
+            return iter(self.__index.values())
         if order == "tree":
-            return [self.get_node("root")] + self.get_descendents("root")
-        raise Exception("order must be 'api' or 'tree'")
+            return itertools.chain([self.get_root()],
+                                   self.iter_descendents("root", "pre"))
+        if order == "post":
+            return itertools.chain(self.iter_descendents("root", "post"),
+                                   [self.get_root()])
+        if order == "breadth":
+            return itertools.chain([self.get_root()],
+                                   self.iter_descendents("root", "breadth"))
+        raise Exception("order must be 'api', 'tree', 'post' or 'breadth'")
+
+
+    def get_links(self, node_id):
+        """ Returns the Links in the given node's content and note. """
+        return self.__get_link_index().outgoing.get(node_id, [])
+
+
+    def get_backlinks(self, node_id):
+        """ Returns the Links anywhere in this document that point at the
+            given node. """
+        return self.__get_link_index().incoming.get(node_id, [])
+
+
+    def iter_links(self):
+        """ Yields every Link in the document, in tree order. """
+        outgoing = self.__get_link_index().outgoing
+        for node in self.iter_nodes():
+            yield from outgoing.get(node["id"], ())
+
+
+    def __get_link_index(self):
+        """ Builds the link index on first use. """
+        if self.__links is None:
+            self.__links = get_link_index(self.iter_nodes(order="api"),
+                                          self.__data.get("file_id"))
+        return self.__links
+
+
+    def search(self, query, node_id="root"):
+        """ Returns the nodes below node_id that match a Dynalist search
+            query, e.g. the query of a #q= URL, in tree order.  See
+            search.py for the syntax. """
+        return self.get_search_index().search(query, node_id)
+
+
+    def get_search_index(self):
+        """ Returns the search.SearchIndex, building it on first use. """
+        if self.__search is None:
+            self.__search = search.SearchIndex(self)
+        return self.__search
 
 
     def to_json(self):
         """ Returns the document as a JSON-encoded string. """
-        return json.dumps(self.__data)
+        if "nodes" in self.__data:
+            return json.dumps(self.__data)
+        data = dict(self.__data)
+        data["nodes"] = [dict(node) for node in self.__index.values()]
+        return json.dumps(data)
+
+
+def get_link_index(nodes, file_id):
+    """ Scans the content and note of each node for links in one pass and
+        returns a LinkIndex.  Each distinct URL is parsed only once. """
+    outgoing = {}
+    incoming = {}
+    parsed_urls = {}
+    for node in nodes:
+        found = markdown.find_links(node["content"])
+        if node.get("note"):
+            found.extend(markdown.find_links(node["note"]))
+        if not found:
+            continue
+        links = []
+        for link in found:
+            url = link["url"]
+            if url not in parsed_urls:
+                try:
+                    parsed_urls[url] = parse_url(url)
+                except ParseException:
+                    parsed_urls[url] = None
+            target = parsed_urls[url]
+            links.append(Link(node["id"], link["title"], url, target))
+            if target and target["doc_id"] == file_id and target["zoom_node_id"]:
+                incoming.setdefault(target["zoom_node_id"], []).append(links[-1])
+        outgoing[node["id"]] = links
+    return LinkIndex(outgoing, incoming)
 
 
 def parse_url(url):
     """ Parses a Dynalist URL and returns the component fields. """
+    fields = parse_url_cached(url) if isinstance(url, str) else None
+    if fields is None:
+        raise ParseException("ERROR: Not a Dynalist URL: " + str(url))
+    doc_id, zoom_node_id, query = fields
+    return {"doc_id": doc_id, "zoom_node_id": zoom_node_id, "query": query}
+
+
+@functools.lru_cache(maxsize=URL_CACHE_SIZE)
+def parse_url_cached(url):
+    """ Memoized core of parse_url.  Returns a (doc_id, zoom_node_id, query)
+        tuple, or None if url isn't a Dynalist URL.  The query is
+        percent-decoded, as Dynalist encodes it in the URL. """
+    match = URL_REGEX.match(url)
+    if not match:
+        return None
+    return (match.group("doc_id"), match.group("zoom_node_id") or "",
+            urllib.parse.unquote(match.group("query") or ""))
+
+
+def get_data_from_api(doc_id, token, stream=False):  # pragma: no cover
+    """ Retrieves Dynalist data from Dynalist API as a Python dict.  With
+        stream=True the nodes are decoded lazily, see jsonstream.load. """
+    return client.get_client(token).read_doc(doc_id, stream)
 
-    fields = {"doc_id": "", "zoom_node_id": "", "query": ""}
-
-    # Plain URL
-    plain = re.compile(r"^https://dynalist.io/d/([a-zA-Z0-9_-]+)$")
-    match = plain.match(url)
-    if match:
-        fields["doc_id"] = match.group(1)
-        return fields
-
-    # URL with zoom
-    zoom = re.compile(
-        r"^https://dynalist.io/d/([a-zA-Z0-9_-]+)#z=([a-zA-Z0-9_-]+)?$")
-    match = zoom.match(url)
-    if match:
-        fields["doc_id"] = match.group(1)
-        fields["zoom_node_id"] = match.group(2)
-        return fields
-
-    # URL with query
-    query = re.compile(r"^https://dynalist.io/d/([a-zA-Z0-9_-]+)#q=(.*)$")
-    match = query.match(url)
-    if match:
-        fields["doc_id"] = match.group(1)
-        fields["query"] = match.group(2)
-        return fields
-
-    # URL with both zoom and query
-    zoom_and_query = re.compile(
-        r"^https://dynalist.io/d/([a-zA-Z0-9_-]+)#z=([a-zA-Z0-9_-]+)&q=(.*)$")
-    match = zoom_and_query.match(url)
-    if match:
-        fields["doc_id"] = match.group(1)
-        fields["zoom_node_id"] = match.group(2)
-        fields["query"] = match.group(3)
-        return fields
-
-    # Not found
-    raise ParseException("ERROR: Not a Dynalist URL: " + str(url))
-
-
-def get_data_from_api(doc_id, token):  # pragma: no cover
-    """ Retrieves Dynalist data from Dynalist API as a Python dict """
-    args = {"file_id": doc_id, "token": token}
-    response = requests.post("https://dynalist.io/api/v1/doc/read", json=args)
-    data = response.json()
-    if data["_code"] != "Ok":
-        raise ApiException("ERROR: API request failed. Code was '" +
-                           str(data["_code"] + "'"))
-    return response.json()
+
+def get_versions_from_api(doc_ids, token):  # pragma: no cover
+    """ Retrieves the current version of each of the given documents from
+        the Dynalist API in one request.  Returns a dict of doc id to
+        version. """
+    return client.get_client(token).check_for_updates(doc_ids)
 
 
 def load_json_from_file(filename):
@@ -180,16 +439,35 @@ def get_index_by_node_id(data):
     return index
 
 
-class DynalistException(Exception):
-    """ Dynalist library exception. """
-
-
-class ApiException(DynalistException):
-    """ Exception for API errors. """
-
-
-class ParseException(DynalistException):
-    """ Exception for parse errors. """
+def get_tree_index(index, root_id="root"):
+    """ Returns a dict of node id to TreePosition, giving each node's
+        parent, depth, sibling position and pre/post-order numbers.  Nodes
+        not reachable from the root are left out. """
+    return dict(iter_tree_positions(index, root_id))
+
+
+def iter_tree_positions(index, root_id="root"):
+    """ Walks the tree once from the root, yielding (node id, TreePosition)
+        pairs in post-order. """
+    if root_id not in index:
+        return
+    counter = itertools.count()
+    stack = [(root_id, None, 0, 0, next(counter),
+              enumerate(index[root_id].get("children", ())))]
+    while stack:
+        node_id, parent_id, depth, position, pre, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            yield node_id, TreePosition(parent_id, depth, position,
+                                        pre, next(counter))
+            continue
+        child_position, child_id = child
+        if child_id not in index:
+            continue
+        stack.append((child_id, node_id, depth + 1, child_position,
+                      next(counter),
+                      enumerate(index[child_id].get("children", ()))))
 
 
 # vim: foldmethod=indent
@@ -0,0 +1,148 @@
+"""
+Applies many /doc/edit changes to a Dynalist document safely.
+
+apply_edits sends the changes in chunks no larger than the API accepts,
+paced by a rate limiter, and checks the result of every chunk.  Transient
+failures are retried with backoff by the client.  A chunk the API rejects
+because of a bad change is split in half and each half sent again, so
+that one bad change can't hold back the rest; edit changes set fields to
+given values, so sending them again is harmless.  Errors no change could
+cause, such as a bad token or a missing document, are raised right away.
+
+format_diff describes changes compactly for a dry run, and verify_edits
+checks a freshly read copy of the document for the changes.
+"""
+
+# Python
+import collections
+import time
+
+# Project
+from dynalist_utils import errors
+
+MAX_CHANGES_PER_EDIT = 500
+DEFAULT_EDIT_RATE = 1.0
+DEFAULT_EDIT_BURST = 10
+MAX_DIFF_WIDTH = 40
+
+# API codes for a request refused because of the changes in it.
+REJECTED_CODES = ("InvalidRequest", "NodeNotFound")
+
+# API codes for a request no change could succeed with.
+FATAL_CODES = ("InvalidToken", "Unauthorized", "NotFound")
+
+# Values of node fields the API leaves out when they are unset.
+FIELD_DEFAULTS = {"content": "", "note": "", "checked": False, "checkbox": False,
+                  "color": 0, "heading": 0, "collapsed": False}
+
+EditReport = collections.namedtuple("EditReport", [
+    "changes", "applied", "failed", "requests", "seconds"])
+EditReport.__doc__ = """ What apply_edits did: the number of changes given
+    and applied, a list of FailedEdits, the number of /doc/edit requests
+    sent and the time taken. """
+
+FailedEdit = collections.namedtuple("FailedEdit", ["change", "error"])
+
+
+def apply_edits(api, file_id, changes, chunk_size=MAX_CHANGES_PER_EDIT, limiter=None, # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+                timer=time.perf_counter):
+    """ Applies a list of /doc/edit changes to a document, chunk_size at a
+        time, using a DynalistClient.  If given, limiter (a
+        batch.RateLimiter) is acquired before every request.  Returns an
+        EditReport. """
+    if chunk_size < 1:
+        raise Exception("ERROR: chunk_size must be at least 1.")
+    start = timer()
+    pending = collections.deque(changes[i:i + chunk_size]
+                                for i in range(0, len(changes), chunk_size))
+    applied = requests = 0
+    failed = []
+    while pending:
+        chunk = pending.popleft()
+        if limiter:
+            limiter.acquire()
+        requests += 1
+        try:
+            response = api.edit_doc(file_id, chunk)
+        except errors.ApiException as exception:
+            if exception.code in FATAL_CODES:
+                raise
+            if len(chunk) > 1 and is_rejected(exception):
+                half = len(chunk) // 2
+                pending.extendleft([chunk[half:], chunk[:half]])
+                continue
+            failed.extend(FailedEdit(change, str(exception)) for change in chunk)
+            continue
+        results = response.get("results")
+        if isinstance(results, list) and len(results) == len(chunk):
+            for change, result in zip(chunk, results):
+                if result is False:
+                    failed.append(FailedEdit(change, "ERROR: The API did not apply it."))
+                else:
+                    applied += 1
+        else:
+            applied += len(chunk)
+    return EditReport(len(changes), applied, failed, requests, timer() - start)
+
+
+def is_rejected(exception):
+    """ Returns whether an ApiException means the API refused the changes
+        in the request, rather than the request as a whole, or that it
+        couldn't be reached or was busy. """
+    return exception.code in REJECTED_CODES
+
+
+def format_report(report):
+    """ Returns a one-line summary of an EditReport. """
+    rate = report.applied / report.seconds if report.seconds > 0 else 0.0
+    return "Applied {} of {} changes in {} requests, {:.2f}s ({:.0f} changes/s), " \
+        "{} failed.".format(report.applied, report.changes, report.requests,
+                            report.seconds, rate, len(report.failed))
+
+
+def format_diff(doc, changes):
+    """ Returns a list of lines describing edit changes to a Document, one
+        per node, e.g.: ~ abc: content 'Old' -> 'New'; color 0 -> 2 """
+    lines = []
+    for change in changes:
+        node_id = change.get("node_id")
+        node = doc.get_node(node_id) if doc.has_node(node_id) else {}
+        fields = []
+        for key, value in change.items():
+            if key in ("action", "node_id"):
+                continue
+            fields.append("{} {} -> {}".format(
+                key, shorten(node.get(key, FIELD_DEFAULTS.get(key))), shorten(value)))
+        action = "~" if change.get("action") == "edit" else change.get("action")
+        lines.append("{} {}: {}".format(action, node_id, "; ".join(fields)))
+    return lines
+
+
+def shorten(value, width=MAX_DIFF_WIDTH):
+    """ Returns the repr of a value, cut to about width characters. """
+    text = repr(value)
+    if len(text) <= width:
+        return text
+    return text[:width - 3] + "..."
+
+
+def verify_edits(doc, changes):
+    """ Returns the edit changes that a Document, read after applying
+        them, doesn't reflect. """
+    missing = []
+    for change in changes:
+        node_id = change.get("node_id")
+        if not doc.has_node(node_id):
+            missing.append(change)
+            continue
+        node = doc.get_node(node_id)
+        for key, value in change.items():
+            if key in ("action", "node_id"):
+                continue
+            if node.get(key, FIELD_DEFAULTS.get(key)) != value:
+                missing.append(change)
+                break
+    return missing
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,26 @@
+"""
+Exceptions raised by the Dynalist library.
+
+They live in their own module so that the modules raising them, such as
+client and dynalist, don't have to import each other.
+"""
+
+
+class DynalistException(Exception):
+    """ Dynalist library exception. """
+
+
+class ApiException(DynalistException):
+    """ Exception for API errors.  code is the error code the API answered
+        with, e.g. 'InvalidToken', or None if it didn't answer. """
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class ParseException(DynalistException):
+    """ Exception for parse errors. """
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,248 @@
+"""
+Export Dynalist documents to files without redoing unnecessary work.
+
+export_subtrees renders many subtrees of one document to separate files
+in parallel across processes.  The document is parsed once in the parent.
+Worker processes inherit it when they are forked or, where fork isn't
+available, load it from a snapshot written for them, so it is never parsed
+or pickled per subtree.
+
+export_incremental keeps one output file up to date, re-rendering only the
+top-level sections whose nodes changed since the last run and copying the
+rest from the previous output.
+"""
+
+# Python
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+
+# Project
+from dynalist_utils import cache
+from dynalist_utils import dynalist
+from dynalist_utils import html_export
+from dynalist_utils import markdown
+
+FORMATS = ("markdown", "html")
+EXTENSIONS = {"markdown": ".md", "html": ".html"}
+
+MANIFEST_FORMAT = 1
+HEAD = "head"
+TAIL = "tail"
+
+ExportResult = collections.namedtuple("ExportResult", ["node_id", "filename", "error"])
+IncrementalResult = collections.namedtuple("IncrementalResult", ["rendered", "reused"])
+
+# The document being exported, set in each worker process by init_worker.
+WORKER_DOC = None
+
+
+def export_subtrees(doc, node_ids, outdir, fmt="markdown", css=None, max_workers=None, # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+                    start_method=None):
+    """ Renders each of the given nodes and its descendents to its own file
+        in outdir, on at most max_workers processes (default: one per CPU).
+        Files are named by make_filenames.  Yields an ExportResult for each
+        node as it completes, with either filename or error set.
+        start_method is "fork", "spawn" or "forkserver"; by default fork
+        is used where the platform has it. """
+    if fmt not in FORMATS:
+        raise Exception("ERROR: Unknown export format: {}".format(fmt))
+    os.makedirs(outdir, exist_ok=True)
+    filenames = make_filenames(doc, node_ids, EXTENSIONS[fmt])
+    if start_method is None:
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    snapshot_dir = None
+    if start_method == "fork":
+        initargs = (doc, None)
+    else:
+        snapshot_dir = tempfile.mkdtemp(prefix="dl_export_")
+        snapshot_filename = os.path.join(snapshot_dir, "doc.snapshot")
+        doc.save_snapshot(snapshot_filename)
+        initargs = (None, snapshot_filename)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context(start_method),
+                initializer=init_worker, initargs=initargs) as executor:
+            futures = {}
+            for node_id, filename in filenames.items():
+                filename = os.path.join(outdir, filename)
+                futures[executor.submit(export_subtree, node_id, filename, fmt, css)] = node_id
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    yield ExportResult(futures[future], future.result(), None)
+                except Exception as error: # pylint: disable=broad-except
+                    yield ExportResult(futures[future], None, error)
+    finally:
+        if snapshot_dir:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+def init_worker(doc, snapshot_filename):
+    """ Sets the document for this worker process, either as inherited
+        through fork or by loading the snapshot. """
+    global WORKER_DOC # pylint: disable=global-statement
+    if doc is None:
+        doc = dynalist.Document.from_snapshot(snapshot_filename)
+    WORKER_DOC = doc
+
+
+def export_subtree(node_id, filename, fmt, css=None, doc=None):
+    """ Renders one node and its descendents to filename and returns the
+        filename.  Uses the worker's document unless doc is given. """
+    doc = doc if doc is not None else WORKER_DOC
+    if not doc.has_node(node_id):
+        raise Exception("ERROR: No such node: {}".format(node_id))
+
+    def write(temp_filename):
+        with open(temp_filename, "w") as outfile:
+            if fmt == "html":
+                html_export.write(doc, node_id, outfile, css)
+            else:
+                markdown.write(doc, node_id, outfile)
+
+    cache.write_atomically(filename, write)
+    return filename
+
+
+def make_filenames(doc, node_ids, extension):
+    """ Returns an ordered dict of node id to a file name for it, made of
+        its position in node_ids and a slug of its content, e.g.
+        "03-release-notes.md", so the files sort in document order. """
+    node_ids = list(node_ids)
+    width = len(str(len(node_ids)))
+    filenames = collections.OrderedDict()
+    for number, node_id in enumerate(node_ids, 1):
+        content = doc.get_node(node_id)["content"] if doc.has_node(node_id) else ""
+        slug = re.sub(r"[^a-z0-9]+", "-", content.lower()).strip("-")[:60].strip("-")
+        filenames[node_id] = "{:0{}d}-{}{}".format(number, width, slug or node_id, extension)
+    return filenames
+
+
+def export_incremental(doc, node_id, filename, fmt="markdown", css=None, # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+                       manifest_filename=None):
+    """ Renders a node and its descendents to filename, like dl2md, but
+        only re-renders the sections that changed since the last call for
+        the same file and splices them into the previous output.  The head
+        (the node itself) and each child subtree are sections, identified
+        by a hash of everything that affects their output.  The manifest
+        of sections is kept in manifest_filename, by default filename plus
+        ".manifest.json".  The file is left untouched when its content
+        wouldn't change.  Returns an IncrementalResult of section counts. """
+    if fmt not in FORMATS:
+        raise Exception("ERROR: Unknown export format: {}".format(fmt))
+    if manifest_filename is None:
+        manifest_filename = filename + ".manifest.json"
+    settings = [node_id, fmt, hash_text(css or "")]
+    version = doc.get_metadata().get("version")
+    manifest, previous = read_previous(manifest_filename, filename)
+    if (manifest and version is not None and manifest["version"] == version
+            and manifest["settings"] == settings):
+        return IncrementalResult(0, len(manifest["sections"]))
+
+    # Index the previous output by section
+    reusable = {}
+    if manifest and manifest["settings"] == settings:
+        offset = 0
+        for key, digest, length in manifest["sections"]:
+            reusable[key, digest] = previous[offset:offset + length]
+            offset += length
+
+    # Lay out the sections and render the ones that changed
+    sections = list(iter_sections(doc, node_id, fmt, css))
+    texts = []
+    rendered = 0
+    for key, digest, render in sections:
+        text = reusable.get((key, digest))
+        if text is None:
+            text = "".join(render())
+            rendered += 1
+        texts.append(text)
+
+    # Write the output, unless it would come out the same
+    new_sections = [[key, digest, len(text)]
+                    for (key, digest, _), text in zip(sections, texts)]
+    if rendered or new_sections != manifest["sections"]:
+        def write(temp_filename):
+            with open(temp_filename, "w") as outfile:
+                outfile.writelines(texts)
+        cache.write_atomically(filename, write)
+    manifest = {"format": MANIFEST_FORMAT,
+                "version": version,
+                "settings": settings,
+                "digest": hash_text("".join(texts)),
+                "sections": new_sections}
+    cache.write_atomically(manifest_filename, cache.text_writer(json.dumps(manifest)))
+    return IncrementalResult(rendered, len(sections) - rendered)
+
+
+def read_previous(manifest_filename, filename):
+    """ Returns the manifest and text of the previous output, or (None, "")
+        if either is missing or the output no longer matches the manifest,
+        e.g. because it was edited. """
+    try:
+        with open(manifest_filename) as manifest_file:
+            manifest = json.load(manifest_file)
+        with open(filename) as infile:
+            previous = infile.read()
+    except (OSError, ValueError):
+        return None, ""
+    if manifest.get("format") != MANIFEST_FORMAT or manifest["digest"] != hash_text(previous):
+        return None, ""
+    return manifest, previous
+
+
+def iter_sections(doc, node_id, fmt, css=None):
+    """ Yields (key, digest, render) for each section of the output for a
+        node: the head, each child subtree, then the tail.  render() returns
+        the section's text fragments, and their concatenation is the whole
+        output. """
+    node = doc.get_node(node_id)
+    block, levels = markdown.layout_node(node, True, 1, 0)
+    head_digest = hash_text(json.dumps([node["content"], node["note"]]))
+    if fmt == "html":
+        yield HEAD, head_digest, lambda: [html_export.page_start(node["content"], css),
+                                          *html_export.render_blocks([block])]
+    else:
+        yield HEAD, head_digest, lambda: markdown.render_block(block)
+    digests = hash_subtrees(doc, node_id)
+    for child_id in node.get("children", ()):
+        if fmt == "html":
+            render = functools.partial(html_export.iter_html, doc, child_id, False, *levels[:2])
+        else:
+            render = functools.partial(markdown.iter_markdown, doc, child_id, False, *levels[:2])
+        yield child_id, digests[child_id].hex(), render
+    yield TAIL, "", lambda: [html_export.PAGE_END if fmt == "html" else ""]
+
+
+def hash_subtrees(doc, node_id):
+    """ Returns a dict of node id to a binary digest of everything that
+        affects the rendering of that node's subtree, for each descendent of
+        the given node.  A parent's digest covers its children's, so it
+        changes when any node below it does.  Computed bottom-up in one
+        post-order pass. """
+    digests = {}
+    for node in doc.iter_descendents(node_id, order="post"):
+        content = node["content"].encode("utf-8")
+        note = node["note"].encode("utf-8")
+        digest = hashlib.sha1(b"%d:%s%d:%s%d" % (len(content), content, len(note), note,
+                                                 bool(node.get("collapsed"))))
+        for child_id in node.get("children", ()):
+            digest.update(digests[child_id])
+        digests[node["id"]] = digest.digest()
+    return digests
+
+
+def hash_text(text):
+    """ Returns a short hex digest of the given text. """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# vim: foldmethod=indent
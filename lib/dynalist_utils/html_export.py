@@ -0,0 +1,154 @@
+""" Converts a Dynalist doc to HTML format """
+from typing import List, Optional
+
+import html
+import re
+
+from dynalist_utils import markdown
+
+INLINE_REGEX = re.compile(
+    r"`(?P<code>[^`]+)`"
+    r"|!\[(?P<alt>[^]]*)\]\((?P<src>[^)\s]+)\)"
+    r"|\[(?P<title>[^]]+)\]\((?P<href>[^)\s]+)\)"
+    r"|(?P<url>https?://[^\s<>\"]+)"
+    r"|\*\*(?P<bold>.+?)\*\*"
+    r"|__(?P<italic>.+?)__"
+    r"|~~(?P<strike>.+?)~~")
+
+MAX_HEADER_LEVEL = 6
+
+# Link and image URLs may be relative or use one of these schemes; others,
+# such as javascript:, are rendered as text.
+SAFE_SCHEMES = ("http", "https", "mailto")
+SCHEME_REGEX = re.compile(r"^([a-zA-Z][a-zA-Z0-9+.-]*):")
+
+def convert(doc, node_id, css: Optional[str] = None, title: Optional[str] = None,
+            children=None) -> str:
+    """ Convert a Dynalist doc to a standalone HTML page """
+    return "".join(iter_page(doc, node_id, css, title, children))
+
+def write(doc, node_id, outfile, css: Optional[str] = None, # pylint: disable=too-many-arguments,too-many-positional-arguments
+          title: Optional[str] = None, children=None) -> None:
+    """ Convert a Dynalist doc to a standalone HTML page, writing it to the
+    given file-like object as it is rendered """
+    outfile.writelines(iter_page(doc, node_id, css, title, children))
+
+PAGE_END = "</body>\n</html>\n"
+
+def iter_page(doc, node_id, css=None, title=None, children=None):
+    """ Yield a standalone HTML page for a node and its descendents as a
+    series of string fragments.  The stylesheet text, if given, is inlined
+    in the page and the title defaults to the node's content. """
+    if title is None:
+        title = doc.get_node(node_id)["content"]
+    yield page_start(title, css)
+    yield from iter_html(doc, node_id, children=children)
+    yield PAGE_END
+
+def page_start(title: str, css: Optional[str] = None) -> str:
+    """ Returns the start of a page, up to and including <body> """
+    head = ["<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n",
+            "<title>{}</title>\n".format(html.escape(title))]
+    if css:
+        head.append("<style>\n{}</style>\n".format(css if css.endswith("\n") else css + "\n"))
+    head.append("</head>\n<body>\n")
+    return "".join(head)
+
+def iter_html(doc, node_id, is_root=True, header_level=1, collapsed_level=0, # pylint: disable=too-many-arguments,too-many-positional-arguments
+              children=None):
+    """ Yield the HTML body for a node and its descendents as a series of
+    string fragments, in document order.  Nodes are laid out by the same
+    rules as markdown.convert(). """
+    return render_blocks(
+        markdown.iter_blocks(doc, node_id, is_root, header_level, collapsed_level,
+                             children))
+
+def render_blocks(blocks):
+    """ Yield the HTML for a series of Blocks, closing any lists still open
+    at the end """
+    depth = 0
+    for block in blocks:
+        if block.kind == markdown.ITEM:
+            yield nest_lists(depth, block.level)
+            depth = block.level
+            yield convert_inline(block.node["content"])
+            if block.node["note"]:
+                yield "\n"
+                yield from render_note(block.node["note"])
+            continue
+        yield nest_lists(depth, 0)
+        depth = 0
+        if block.kind == markdown.HEADER:
+            level = min(block.level, MAX_HEADER_LEVEL)
+            yield "<h{0}>{1}</h{0}>\n".format(level, convert_inline(block.node["content"]))
+            if block.node["note"]:
+                yield from render_note(block.node["note"])
+    yield nest_lists(depth, 0)
+
+def nest_lists(depth: int, new_depth: int) -> str:
+    """ Returns the tags that move from inside a list item at the given
+    depth to a new list item at new_depth, or out of all lists if new_depth
+    is 0. """
+    tags: List[str] = []
+    if depth and new_depth <= depth:
+        tags.append("</li>\n")
+    while depth > max(new_depth, 1):
+        tags.append("</ul>\n</li>\n")
+        depth -= 1
+    if depth and not new_depth:
+        tags.append("</ul>\n")
+    while depth < new_depth:
+        tags.append("<ul>\n")
+        depth += 1
+        if depth < new_depth:
+            tags.append("<li>\n")
+    if new_depth:
+        tags.append("<li>")
+    return "".join(tags)
+
+def render_note(note: str) -> List[str]:
+    """ Render a note as paragraphs, one per run of non-blank lines, keeping
+    its line breaks """
+    fragments: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", note.strip("\n")):
+        lines = [convert_inline(line) for line in paragraph.splitlines()]
+        fragments.append("<p>{}</p>\n".format("<br>\n".join(lines)))
+    return fragments
+
+def convert_inline(text: str) -> str:
+    """ Converts Dynalist's inline styling and links to escaped HTML """
+    parts: List[str] = []
+    position = 0
+    for match in INLINE_REGEX.finditer(text):
+        parts.append(html.escape(text[position:match.start()]))
+        position = match.end()
+        if match.group("code") is not None:
+            parts.append("<code>{}</code>".format(html.escape(match.group("code"))))
+        elif not is_safe_url(match.group("src") or match.group("href") or ""):
+            parts.append(html.escape(match.group(0)))
+        elif match.group("src") is not None:
+            parts.append("<img src=\"{}\" alt=\"{}\">".format(
+                html.escape(match.group("src")), html.escape(match.group("alt"))))
+        elif match.group("href") is not None:
+            parts.append("<a href=\"{}\">{}</a>".format(
+                html.escape(match.group("href")), convert_inline(match.group("title"))))
+        elif match.group("url") is not None:
+            url = html.escape(match.group("url"))
+            parts.append("<a href=\"{0}\">{0}</a>".format(url))
+        elif match.group("bold") is not None:
+            parts.append("<strong>{}</strong>".format(convert_inline(match.group("bold"))))
+        elif match.group("italic") is not None:
+            parts.append("<em>{}</em>".format(convert_inline(match.group("italic"))))
+        else:
+            parts.append("<del>{}</del>".format(convert_inline(match.group("strike"))))
+    parts.append(html.escape(text[position:]))
+    return "".join(parts)
+
+def is_safe_url(url: str) -> bool:
+    """ Returns whether a link or image URL is relative or uses one of the
+    SAFE_SCHEMES.  Control characters and spaces are ignored, as browsers
+    ignore them in schemes. """
+    match = SCHEME_REGEX.match(re.sub(r"[\x00-\x20]", "", url))
+    return match is None or match.group(1).lower() in SAFE_SCHEMES
+
+# vim: foldmethod=indent
@@ -0,0 +1,152 @@
+"""
+Incremental loading of Dynalist JSON documents.
+
+json.load needs the whole document text and the whole decoded object graph
+in memory at once.  load() instead reads the stream in chunks and hands
+back the "nodes" array as an iterator, decoding one node at a time, so a
+consumer can index nodes while the rest of the document is still arriving.
+"""
+
+# Python
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+
+
+def load(stream, chunk_size=CHUNK_SIZE):
+    """ Reads a JSON object from a text or binary stream.  Returns a dict of
+        its top-level fields in which "nodes", if present, is an iterator
+        over the node dicts.  Fields after "nodes" in the stream are added
+        to the dict once that iterator has been exhausted. """
+    reader = JsonStreamReader(stream, chunk_size)
+    data = {}
+    reader.expect("{")
+    if read_members(reader, data, first=True):
+        data["nodes"] = iter_array(reader, data)
+    return data
+
+
+def read_members(reader, data, first):
+    """ Reads object members into data until the closing brace, or until the
+        "nodes" key.  Returns True if it stopped at "nodes". """
+    while True:
+        if first:
+            if reader.peek() == "}":
+                reader.expect("}")
+                return False
+        elif reader.expect(",}") == "}":
+            return False
+        first = False
+        key = reader.read_value()
+        if not isinstance(key, str):
+            raise reader.error("Expecting property name")
+        reader.expect(":")
+        if key == "nodes":
+            return True
+        data[key] = reader.read_value()
+
+
+def iter_array(reader, data):
+    """ Yields the values of the array at the reader's position, then reads
+        the remaining object members into data. """
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.expect("]")
+    else:
+        while True:
+            yield reader.read_value()
+            if reader.expect(",]") == "]":
+                break
+    if read_members(reader, data, first=False):
+        raise reader.error("Duplicate 'nodes' key")
+
+
+class JsonStreamReader:
+    """ Decodes JSON values one at a time from a stream, keeping only the
+        unread part of the current chunk in memory. """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.__stream = stream
+        self.__chunk_size = chunk_size
+        # raw_decode only shares key strings within one call, so share
+        # them across nodes here to keep repeated keys from piling up.
+        keys = {}
+        self.__decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: {
+            keys.setdefault(key, key): value for key, value in pairs})
+        self.__text_decoder = None
+        self.__buffer = ""
+        self.__pos = 0
+        self.__eof = False
+
+
+    def __fill(self, size):
+        """ Appends up to size more characters to the buffer, dropping what
+            has already been consumed.  Returns False at end of stream. """
+        while not self.__eof:
+            chunk = self.__stream.read(size)
+            self.__eof = not chunk
+            if isinstance(chunk, bytes):
+                if self.__text_decoder is None:
+                    self.__text_decoder = codecs.getincrementaldecoder("utf-8")()
+                chunk = self.__text_decoder.decode(chunk, final=self.__eof)
+            if chunk:
+                self.__buffer = self.__buffer[self.__pos:] + chunk
+                self.__pos = 0
+                return True
+        return False
+
+
+    def peek(self):
+        """ Skips whitespace and returns the next character, or "" at end of
+            stream. """
+        while True:
+            buffer = self.__buffer
+            pos = self.__pos
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            self.__pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self.__fill(self.__chunk_size):
+                return ""
+
+
+    def expect(self, chars):
+        """ Consumes and returns the next character, which must be one of
+            the given characters. """
+        char = self.peek()
+        if not char or char not in chars:
+            raise self.error("Expecting one of " + repr(chars))
+        self.__pos += 1
+        return char
+
+
+    def read_value(self):
+        """ Decodes and returns the next complete JSON value. """
+        self.peek()
+        while True:
+            unread = len(self.__buffer) - self.__pos
+            try:
+                value, end = self.__decoder.raw_decode(self.__buffer, self.__pos)
+            except json.JSONDecodeError:
+                # Incomplete value: read at least as much again as we have,
+                # so a large value costs amortized linear time.
+                if self.__fill(max(self.__chunk_size, unread)):
+                    continue
+                raise
+            if end == len(self.__buffer) and self.__fill(self.__chunk_size):
+                # A number at the end of the buffer may continue in the
+                # next chunk, so decode it again.
+                continue
+            self.__pos = end
+            return value
+
+
+    def error(self, message):
+        """ Returns a JSONDecodeError for the reader's current position. """
+        return json.JSONDecodeError(message, self.__buffer, self.__pos)
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,131 @@
+"""
+Sends many emails over one reused, authenticated SMTP connection.
+"""
+
+# Python
+import logging
+import smtplib
+import time
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+DEFAULT_TIMEOUT = 60
+SECURITY = ("ssl", "starttls", "none")
+
+
+class MailerException(Exception):
+    """ Raised when a message can't be sent. """
+
+
+class Mailer:
+    """ Holds one SMTP connection open across sends, logging in once.  If
+        the connection drops or the server answers with a transient (4xx)
+        error, the connection is reopened and the message sent again, with
+        exponential backoff, up to max_retries times.  host may include a
+        port, as "host:port". """
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, host, username=None, password=None, security="ssl",
+                 timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff=DEFAULT_BACKOFF, debug=False, sleep=time.sleep):
+        if security not in SECURITY:
+            raise Exception("ERROR: security must be one of: " + ", ".join(SECURITY))
+        self.__host = host
+        self.__username = username
+        self.__password = password
+        self.__security = security
+        self.__timeout = timeout
+        self.__max_retries = max_retries
+        self.__backoff = backoff
+        self.__debug = debug
+        self.__sleep = sleep
+        self.__smtp = None
+        self.__connections = 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def send(self, message):
+        """ Sends an email.message.Message, connecting first if needed.
+            Raises MailerException if it can't be sent. """
+        attempt = 0
+        while True:
+            try:
+                if self.__smtp is None:
+                    self.__connect()
+                self.__smtp.send_message(message)
+                return
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException,
+                    smtplib.SMTPRecipientsRefused, OSError) as exception:
+                self.__disconnect()
+                if not is_transient(exception) or attempt >= self.__max_retries:
+                    raise MailerException("ERROR: Could not send email to {}: {}".format(
+                        message["To"], exception)) from exception
+                delay = self.__backoff * 2 ** attempt
+                logging.warning("Sending email failed (%s), retrying in %.1fs.",
+                                exception, delay)
+                self.__sleep(delay)
+                attempt += 1
+
+
+    def get_connection_count(self):
+        """ Returns the number of connections opened so far. """
+        return self.__connections
+
+
+    def close(self):
+        """ Ends the session politely, if one is open. """
+        if self.__smtp is not None:
+            try:
+                self.__smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.__disconnect()
+
+
+    def __connect(self):
+        """ Opens the connection and logs in. """
+        logging.debug("Connecting to email server %s...", self.__host)
+        if self.__security == "ssl":
+            smtp = smtplib.SMTP_SSL(self.__host, timeout=self.__timeout)
+        else:
+            smtp = smtplib.SMTP(self.__host, timeout=self.__timeout)
+        try:
+            if self.__debug:
+                smtp.set_debuglevel(2)
+            if self.__security == "starttls":
+                smtp.starttls()
+            if self.__username:
+                smtp.login(self.__username, self.__password)
+        except BaseException:
+            smtp.close()
+            raise
+        self.__smtp = smtp
+        self.__connections += 1
+
+
+    def __disconnect(self):
+        """ Drops the connection without ending the session. """
+        if self.__smtp is not None:
+            self.__smtp.close()
+            self.__smtp = None
+
+
+def is_transient(exception):
+    """ Returns whether sending again might succeed after the given error:
+        dropped connections and 4xx replies, but not 5xx replies such as a
+        failed login or a refused recipient. """
+    if isinstance(exception, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in exception.recipients.values())
+    if isinstance(exception, smtplib.SMTPResponseException):
+        return 400 <= exception.smtp_code < 500
+    return True
+
+
+# vim: foldmethod=indent
@@ -1,8 +1,17 @@
 """ Converts a Dynalist doc to Markdown format """
-from typing import Dict, List
+from typing import Any, Dict, Iterator, List, Tuple
 
+import collections
 import re
 
+# A node laid out for rendering: kind is HEADER, with level the header level,
+# or ITEM, with level the list depth starting at 1.  END_LIST blocks, with no
+# node, close the list under a collapsed header.
+Block = collections.namedtuple("Block", ["kind", "node", "level"])
+HEADER = "header"
+ITEM = "item"
+END_LIST = "end_list"
+
 LINK_REGEX = re.compile(r"\[([^]]+)\]\(([^)]+)\)|(http[s]*://[^ ]+)")
 
 def find_links(source: str) -> List[Dict[str, str]]:
@@ -24,17 +33,91 @@ def find_links(source: str) -> List[Dict[str, str]]:
         links.append(result)
     return links
 
-def convert(doc, node_id):
+def convert(doc, node_id, children=None):
     """ Convert a Dynalist doc to Markdown format """
-    return convert_node(doc, node_id, True, 1, 0)
+    return "".join(iter_markdown(doc, node_id, children=children))
+
+def write(doc, node_id, outfile, children=None) -> None:
+    """ Convert a Dynalist doc to Markdown format, writing it to the given
+    file-like object as it is rendered rather than building one string """
+    outfile.writelines(iter_markdown(doc, node_id, children=children))
 
-def convert_node(doc, node_id, is_root, header_level, collapsed_level): # pylint: disable=too-many-locals
+def convert_node(doc, node_id, is_root, header_level, collapsed_level):
     """ Convert a node and its children to Markdown format """
+    return "".join(iter_markdown(doc, node_id, is_root, header_level, collapsed_level))
+
+def iter_markdown(doc, node_id, is_root=True, header_level=1, collapsed_level=0, # pylint: disable=too-many-arguments,too-many-positional-arguments
+                  children=None):
+    """ Yield the Markdown for a node and its descendents as a series of
+    string fragments, in document order. """
+    for block in iter_blocks(doc, node_id, is_root, header_level, collapsed_level,
+                             children):
+        yield from render_block(block)
+
+def render_block(block) -> List[str]:
+    """ Render a single Block as a list of Markdown fragments """
+    if block.kind == END_LIST:
+        return ["\n"]
+    fragments: List[str] = []
+    content = convert_styling(block.node["content"])
+    note = convert_styling(block.node["note"]) if block.node["note"] else None
+    if block.kind == HEADER:
+        # Render content as header
+        fragments.append("{} {}\n\n".format("#" * block.level, content))
+        # Render note as body
+        if note:
+            fragments.append("{}\n\n".format(note))
+    else:
+        # Render content as list
+        indent = "    " * (block.level - 1)
+        fragments.append("{}- {}\n".format(indent, content))
+        if note:
+            indent += "    "
+            fragments.append("{}\n".format(indent))
+            for line in note.splitlines():
+                fragments.append("{}{}\n".format(indent, line))
+            fragments.append("{}\n".format(indent))
+    return fragments
+
+def iter_blocks(doc, node_id, is_root=True, header_level=1, collapsed_level=0, # pylint: disable=too-many-arguments,too-many-positional-arguments
+                children=None):
+    """ Yield the layout of a node and its descendents as Blocks, in
+    document order.  This holds the rules shared by every output format:
+    which nodes become headers and at what level, which become list items
+    and how deeply nested, and where a list ends.
 
-    markdown = ""
-    node = doc.get_node(node_id)
-    content = convert_styling(node["content"])
-    note = convert_styling(node["note"]) if node["note"] else None
+    Walks the tree with an explicit stack holding one frame per level of the
+    current path, so deep outlines don't hit the recursion limit and memory
+    doesn't grow with the size of the output.
+
+    children, if given, is a dict from node id to the list of child nodes
+    to lay out, such as search.SearchIndex.get_tree() returns, so that
+    only part of the tree is walked. """
+    stack: List[Tuple[Iterator[Any], int, int, bool]] = []
+    nodes: Iterator[Any] = iter([doc.get_node(node_id)])
+    while True:
+        node = next(nodes, None)
+        if node is not None:
+            block, levels = layout_node(node, is_root, header_level, collapsed_level)
+            yield block
+            stack.append((nodes, header_level, collapsed_level, levels[2]))
+            nodes = iter(doc.get_children(node["id"]) if children is None
+                         else children[node["id"]])
+            is_root = False
+            header_level, collapsed_level = levels[0], levels[1]
+            continue
+        if not stack:
+            return
+        nodes, header_level, collapsed_level, ends_list = stack.pop()
+        if ends_list:
+            yield Block(END_LIST, None, 0)
+
+def layout_node(node, is_root, header_level, collapsed_level):
+    """ Lay out a single node, without its children.
+
+    Returns the node's Block and a tuple of (header_level, collapsed_level,
+    ends_list) for its children, where ends_list means an END_LIST block
+    follows the last child. """
 
     # Flags
     is_this_node_collapsed = "collapsed" in node and node["collapsed"] and not is_root
@@ -44,38 +127,16 @@ def convert_node(doc, node_id, is_root, header_level, collapsed_level): # pylint
 
     # Is this a header or bullet point?
     if is_header:
-        # Render content as header
-        for _ in range(header_level):
-            markdown += "#"
-        markdown += " {}\n\n".format(content)
-        # Render note as body
-        if note:
-            markdown += "{}\n\n".format(note)
+        block = Block(HEADER, node, header_level)
     else:
-        # Render content as list
-        indent = ""
-        for _ in range(collapsed_level - 1):
-            indent += "    "
-        markdown += "{}- {}\n".format(indent, content)
-        if note:
-            indent += "    "
-            markdown += "{}\n".format(indent)
-            for line in iter(note.splitlines()):
-                markdown += "{}{}\n".format(indent, line)
-            markdown += "{}\n".format(indent)
+        block = Block(ITEM, node, collapsed_level)
 
     # Increment levels
     header_level = header_level + 1 if is_header else header_level
     collapsed_level = collapsed_level + 1 if is_collapsed else collapsed_level
 
-    # Render children
-    for child in doc.get_children(node["id"]):
-        markdown += convert_node(doc, child["id"], False, header_level, collapsed_level)
-    if is_header and is_this_node_collapsed:
-        markdown += "\n"
-
-    # All done
-    return markdown
+    return block, (header_level, collapsed_level,
+                   is_header and bool(is_this_node_collapsed))
 
 def convert_styling(text):
     """ Converts Dynalist's styling to Pandoc-style markdown """
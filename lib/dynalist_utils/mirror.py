@@ -0,0 +1,172 @@
+"""
+Keeps "mirror nodes" in a Dynalist document up to date.
+
+A mirror node has a note with a Markdown link titled "mirror" to another
+node of the same document, its source.  It should have the source's
+content, note, color and heading, with the mirror link at the end of its
+note.  A source may itself be a mirror; then the mirror copies what its
+source copies, with its own mirror link instead of its source's.
+
+plan_changes resolves mirrors in topological order, sources first, and
+skips cycles.  Given the state of the previous run, it only examines the
+mirrors whose source fields changed since then, by comparing a
+fingerprint of each source, and never reads the others at all.  A mirror
+edited by hand is therefore put back only when its source next changes,
+when it is forgotten from the state, or on a run without a state.
+"""
+
+# Python
+import collections
+import hashlib
+import logging
+
+MIRROR_LINK_TEXT = "mirror"
+STATE_FORMAT = 1
+
+# Mirrored fields, and their values when a node leaves them out.
+FIELDS = (("content", ""), ("note", ""), ("color", 0), ("heading", 0))
+
+MirrorNode = collections.namedtuple("MirrorNode", ["source_node", "target_node", "link"])
+
+MirrorPlan = collections.namedtuple("MirrorPlan", [
+    "changes", "state", "examined", "skipped", "cycles"])
+MirrorPlan.__doc__ = """ What plan_changes found: the list of /doc/edit
+    changes, the state to keep for the next run once they are applied, the
+    numbers of mirrors examined and skipped as unchanged, and the ids of
+    mirror nodes left out because they mirror themselves through a
+    cycle. """
+
+
+def find_mirror_nodes(doc):
+    """ Return a list of nodes that contain mirror links. """
+    mirror_nodes = []
+    file_id = doc.get_metadata()["file_id"]
+    for link in doc.iter_links():
+        if mirror_nodes and mirror_nodes[-1].target_node["id"] == link.source_id:
+            continue # Only the first mirror link in a node counts
+        url = link.target
+        if not url:
+            continue
+        if url["doc_id"] != file_id:
+            continue
+        if not doc.has_node(url["zoom_node_id"]):
+            continue
+        if not link.title == MIRROR_LINK_TEXT:
+            continue
+        source_node = doc.get_node(url["zoom_node_id"])
+        target_node = doc.get_node(link.source_id)
+        mirror_nodes.append(MirrorNode(source_node, target_node, link))
+    if len(mirror_nodes) > 0:
+        logging.info("Found %d mirror nodes.", len(mirror_nodes))
+    return mirror_nodes
+
+
+def order_mirror_nodes(mirror_nodes):
+    """ Returns the MirrorNodes sorted so that every mirror comes after the
+        mirror that is its source, if any, and a list of the ids of mirror
+        nodes in or downstream of a cycle, which are left out. """
+    by_target = {mirror_node.target_node["id"]: mirror_node for mirror_node in mirror_nodes}
+    dependents = collections.defaultdict(list)
+    waiting = {}
+    for target_id, mirror_node in by_target.items():
+        source_id = mirror_node.source_node["id"]
+        waiting[target_id] = 1 if source_id in by_target else 0
+        if waiting[target_id]:
+            dependents[source_id].append(target_id)
+    ready = collections.deque(target_id for target_id, count in waiting.items() if not count)
+    ordered = []
+    while ready:
+        target_id = ready.popleft()
+        ordered.append(by_target[target_id])
+        for dependent in dependents[target_id]:
+            waiting[dependent] -= 1
+            if not waiting[dependent]:
+                ready.append(dependent)
+    cycles = [target_id for target_id, count in waiting.items() if count]
+    return ordered, cycles
+
+
+def plan_changes(doc, state=None): # pylint: disable=too-many-locals
+    """ Returns a MirrorPlan for bringing the mirror nodes of a Document up
+        to date.  state is the MirrorPlan.state of the previous run, or None
+        to examine every mirror. """
+    mirror_nodes, cycles = order_mirror_nodes(find_mirror_nodes(doc))
+    for target_id in cycles:
+        logging.error("Mirror node %s mirrors itself through a cycle; skipping it.",
+                      target_id)
+    previous = get_previous_mirrors(state, doc)
+    copied = {}
+    fingerprints = {}
+    new_mirrors = {}
+    changes = []
+    skipped = 0
+    for mirror_node in mirror_nodes:
+        source_id = mirror_node.source_node["id"]
+        target_id = mirror_node.target_node["id"]
+        link_text = f"[{mirror_node.link.title}]({mirror_node.link.url})"
+        fields = copied.get(source_id) or get_fields(mirror_node.source_node)
+        copied[target_id] = fields
+        if source_id not in fingerprints:
+            fingerprints[source_id] = get_fingerprint(fields)
+        entry = {"source": source_id, "link": mirror_node.link.url,
+                 "source_fingerprint": fingerprints[source_id]}
+        new_mirrors[target_id] = entry
+        last = previous.get(target_id)
+        if last and all(last.get(key) == value for key, value in entry.items()):
+            skipped += 1
+            continue
+        expected = fields[:1] + (join_note(fields[1], link_text),) + fields[2:]
+        change = get_change(mirror_node.target_node, expected)
+        if change:
+            changes.append(change)
+    state = {"format": STATE_FORMAT, "file_id": doc.get_metadata().get("file_id"),
+             "mirrors": new_mirrors}
+    return MirrorPlan(changes, state, len(mirror_nodes) - skipped, skipped, cycles)
+
+
+def get_previous_mirrors(state, doc):
+    """ Returns the mirrors of a previous state, if it is for this
+        document and in this format, or an empty dict. """
+    if not state or state.get("format") != STATE_FORMAT:
+        return {}
+    if state.get("file_id") != doc.get_metadata().get("file_id"):
+        return {}
+    return state.get("mirrors", {})
+
+
+def forget_mirrors(state, target_ids):
+    """ Removes mirror nodes, e.g. ones whose changes failed, from a state
+        so that the next run examines them again. """
+    for target_id in target_ids:
+        state["mirrors"].pop(target_id, None)
+    return state
+
+
+def get_fields(node):
+    """ Returns a node's mirrored fields as a tuple. """
+    return tuple(node.get(key, default) or default for key, default in FIELDS)
+
+
+def get_fingerprint(fields):
+    """ Returns a short, stable hash of a tuple of fields. """
+    return hashlib.sha1(repr(fields).encode("utf-8")).hexdigest()[:16]
+
+
+def join_note(note, link_text):
+    """ Returns a mirror's note: its source's note, then its mirror link. """
+    return note + " " + link_text if note else link_text
+
+
+def get_change(target_node, expected):
+    """ Returns the /doc/edit change that gives a node the expected fields,
+        or None if it already has them. """
+    change = {}
+    for (key, _), value, current in zip(FIELDS, expected, get_fields(target_node)):
+        if value != current:
+            change[key] = value
+    if not change:
+        return None
+    return dict({"action": "edit", "node_id": target_node["id"]}, **change)
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,162 @@
+"""
+Keeps the mirror nodes of a Dynalist document in sync continuously.
+
+MirrorWatcher holds the document and the mirror state of the last sync in
+memory.  Each poll costs one version check; the document is read again
+only when its version moved, and then only the mirrors whose source
+changed are examined and updated.  Our own edits move the version too, so
+the read that follows them doubles as their verification: the mirrors of
+changes that didn't land are forgotten from the state, and so examined
+and sent again.  A sync that fails, or leaves some
+changes unapplied, is tried again on the next step from the same copy of
+the document, whether or not its version moves.
+"""
+
+# Python
+import collections
+import logging
+import threading
+import time
+
+# Project
+from dynalist_utils import client
+from dynalist_utils import edits
+from dynalist_utils import mirror
+from dynalist_utils import watch
+
+DEFAULT_POLL_INTERVAL = 5.0
+
+MirrorStatus = collections.namedtuple("MirrorStatus", [
+    "version", "mirrors", "polls", "poll_errors", "last_poll_seconds",
+    "syncs", "sync_errors", "last_diff_seconds", "last_examined", "last_changes",
+    "last_edit_seconds", "applied", "failed"])
+MirrorStatus.__doc__ = """ What the watcher has done: the document version
+    and number of mirrors last seen, the number of polls and how long the
+    last took, and for syncs (polls that found a new version) how long
+    planning and sending the changes took, how many mirrors were examined
+    and changed, and the totals of changes applied and failed.  sync_errors
+    counts syncs that raised and are retried. """
+
+
+class MirrorWatcher:
+    """ Follows one document (URL or doc id) and brings its mirror nodes up
+        to date whenever it changes.  state is the mirror.MirrorPlan.state
+        of a previous run, if any; on_sync(state), if given, is called with
+        the new state after every sync, e.g. to save it. """
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, ref, token, api=None, chunk_size=edits.MAX_CHANGES_PER_EDIT,
+                 limiter=None, state=None, poll_interval=DEFAULT_POLL_INTERVAL,
+                 on_sync=None, watcher=None, timer=time.perf_counter):
+        self.__watcher = watcher or watch.DocumentWatcher([ref], token)
+        self.__api = api or client.get_client(token)
+        self.__chunk_size = chunk_size
+        self.__limiter = limiter
+        self.__state = state
+        self.__poll_interval = poll_interval
+        self.__on_sync = on_sync
+        self.__timer = timer
+        self.__retry_doc = None
+        self.__sent = []
+        self.__lock = threading.Lock()
+        self.__status = MirrorStatus(
+            version=None, mirrors=None, polls=0, poll_errors=0, last_poll_seconds=None,
+            syncs=0, sync_errors=0, last_diff_seconds=None, last_examined=None,
+            last_changes=None, last_edit_seconds=None, applied=0, failed=0)
+
+
+    def step(self):
+        """ Polls once and syncs if the document changed, or if the last
+            sync didn't finish.  Returns the number of seconds to wait
+            before the next step. """
+        start = self.__timer()
+        try:
+            changes = self.__watcher.poll()
+        except Exception: # pylint: disable=broad-except
+            logging.exception("Poll failed; trying again later.")
+            self.__update_status(polls=self.__status.polls + 1,
+                                 poll_errors=self.__status.poll_errors + 1)
+            return self.__poll_interval
+        self.__update_status(polls=self.__status.polls + 1,
+                             last_poll_seconds=self.__timer() - start)
+        docs = [change.new_doc for change in changes]
+        if not docs and self.__retry_doc is not None:
+            docs = [self.__retry_doc]
+        for doc in docs:
+            self.__retry_doc = None
+            try:
+                report = self.sync(doc)
+            except Exception: # pylint: disable=broad-except
+                logging.exception("Sync failed; trying again on the next step.")
+                self.__update_status(sync_errors=self.__status.sync_errors + 1)
+                self.__retry_doc = doc
+                continue
+            if report and report.failed:
+                self.__retry_doc = doc
+        return max(self.__poll_interval - (self.__timer() - start), 0.0)
+
+
+    def sync(self, doc):
+        """ Brings the mirrors of a freshly read copy of the document up to
+            date.  Returns an edits.EditReport, or None if nothing needed
+            changing. """
+        start = self.__timer()
+        missing = edits.verify_edits(doc, self.__sent)
+        for change in missing:
+            logging.warning("Change to %s is missing; sending it again.", change["node_id"])
+        if missing and self.__state:
+            mirror.forget_mirrors(self.__state, [change["node_id"] for change in missing])
+        self.__sent = []
+        plan = mirror.plan_changes(doc, self.__state)
+        diff_seconds = self.__timer() - start
+        report = None
+        if plan.changes:
+            report = edits.apply_edits(self.__api, doc.get_metadata()["file_id"],
+                                       plan.changes, self.__chunk_size, self.__limiter,
+                                       self.__timer)
+            logging.info(edits.format_report(report))
+            for failed in report.failed:
+                logging.error("Could not update %s: %s", failed.change["node_id"],
+                              failed.error)
+            failed_ids = {failed.change["node_id"] for failed in report.failed}
+            mirror.forget_mirrors(plan.state, failed_ids)
+            self.__sent = [change for change in plan.changes
+                           if change["node_id"] not in failed_ids]
+        self.__state = plan.state
+        status = self.__status
+        self.__update_status(
+            version=doc.get_metadata().get("version"), mirrors=len(plan.state["mirrors"]),
+            syncs=status.syncs + 1, last_diff_seconds=diff_seconds,
+            last_examined=plan.examined, last_changes=len(plan.changes),
+            last_edit_seconds=report.seconds if report else 0.0,
+            applied=status.applied + (report.applied if report else 0),
+            failed=status.failed + (len(report.failed) if report else 0))
+        if self.__on_sync:
+            self.__on_sync(plan.state)
+        return report
+
+
+    def run_forever(self, stop=None, on_step=None):
+        """ Steps until the stop threading.Event, if given, is set, as
+            watch.run_forever. """
+        watch.run_forever(self.step, stop, on_step)
+
+
+    def get_status(self):
+        """ Returns a MirrorStatus. """
+        with self.__lock:
+            return self.__status
+
+
+    def get_state(self):
+        """ Returns the mirror state of the last sync, or the state given. """
+        return self.__state
+
+
+    def __update_status(self, **fields):
+        """ Replaces some fields of the status. """
+        with self.__lock:
+            self.__status = self.__status._replace(**fields)
+
+
+# vim: foldmethod=indent
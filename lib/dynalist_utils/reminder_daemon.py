@@ -0,0 +1,203 @@
+"""
+Long-running reminder service.
+
+ReminderDaemon keeps the routed documents and one DateIndex per document
+in memory.  It polls for version changes on an interval, updating each
+index from only the nodes that changed, and sends the routed reminders at
+scheduled times of day from the indexes it already holds.
+"""
+
+# Python
+import argparse
+import collections
+import datetime
+import logging
+import threading
+import time
+
+# Project
+from dynalist_utils import dates
+from dynalist_utils import reminders
+from dynalist_utils import watch
+
+DEFAULT_POLL_INTERVAL = 60.0
+
+DaemonStatus = collections.namedtuple("DaemonStatus", [
+    "documents", "dated_nodes",
+    "last_poll", "last_poll_seconds", "last_poll_changed_nodes",
+    "last_run", "last_run_seconds", "last_run_sent", "last_run_failed",
+    "next_poll", "next_run", "pending_runs", "skipped_runs"])
+DaemonStatus.__doc__ = """ What the daemon is doing: the size of what it
+    holds, how the last poll and reminder run went and how long they took,
+    and what is queued next.  pending_runs counts scheduled runs that are
+    due but haven't been sent; skipped_runs counts runs folded into a later
+    one because the daemon fell behind. """
+
+
+class ReminderDaemon:
+    """ Sends the reminders for routes at each of the given times of day
+        (datetime.times), from documents followed by a
+        watch.DocumentWatcher.  send(message) delivers one email, e.g.
+        mailer.Mailer.send, and raises if it can't. """
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, routes, watcher, email_from, send, times,
+                 poll_interval=DEFAULT_POLL_INTERVAL, clock=datetime.datetime.now,
+                 timer=time.perf_counter):
+        if not times:
+            raise ValueError("ERROR: Please give at least one time to send reminders at.")
+        self.__routes = routes
+        self.__watcher = watcher
+        self.__email_from = email_from
+        self.__send = send
+        self.__times = sorted(times)
+        self.__poll_interval = datetime.timedelta(seconds=poll_interval)
+        self.__clock = clock
+        self.__timer = timer
+        self.__indexes = {}
+        self.__lock = threading.Lock()
+        now = clock()
+        self.__status = DaemonStatus(
+            documents=0, dated_nodes=0,
+            last_poll=None, last_poll_seconds=None, last_poll_changed_nodes=None,
+            last_run=None, last_run_seconds=None, last_run_sent=None, last_run_failed=None,
+            next_poll=now, next_run=get_next_run(self.__times, now),
+            pending_runs=0, skipped_runs=0)
+
+
+    def step(self):
+        """ Polls if the poll interval has passed and sends the reminders if
+            a scheduled time has passed.  Returns the number of seconds until
+            the next thing to do. """
+        now = self.__clock()
+        if now >= self.__status.next_poll:
+            try:
+                self.poll()
+            except Exception: # pylint: disable=broad-except
+                logging.exception("Poll failed; keeping the documents as they were.")
+                self.__update_status(next_poll=self.__clock() + self.__poll_interval)
+        now = self.__clock()
+        due = []
+        next_run = self.__status.next_run
+        while next_run <= now:
+            due.append(next_run)
+            next_run = get_next_run(self.__times, next_run)
+        if due:
+            self.__update_status(next_run=next_run, pending_runs=len(due))
+            self.run()
+            self.__update_status(pending_runs=0,
+                                 skipped_runs=self.__status.skipped_runs + len(due) - 1)
+        status = self.get_status()
+        wait = min(status.next_poll, status.next_run) - self.__clock()
+        return max(wait.total_seconds(), 0.0)
+
+
+    def poll(self):
+        """ Reloads the documents that changed and updates their indexes
+            from the nodes that changed.  Returns the number of nodes whose
+            dates were extracted again. """
+        start = self.__timer()
+        changed_nodes = 0
+        for change in self.__watcher.poll():
+            if change.old_doc is None:
+                index = dates.DateIndex.from_documents([change.new_doc])
+                changed_nodes += len(index)
+                with self.__lock:
+                    self.__indexes[change.ref] = index
+            else:
+                with self.__lock:
+                    changed_nodes += self.__indexes[change.ref].update(
+                        change.old_doc, change.new_doc)
+        with self.__lock:
+            dated_nodes = sum(len(index) for index in self.__indexes.values())
+            documents = len(self.__indexes)
+        now = self.__clock()
+        self.__update_status(documents=documents, dated_nodes=dated_nodes,
+                             last_poll=now, last_poll_seconds=self.__timer() - start,
+                             last_poll_changed_nodes=changed_nodes,
+                             next_poll=now + self.__poll_interval)
+        logging.debug("Poll: %d nodes changed in %.3fs.", changed_nodes,
+                      self.__status.last_poll_seconds)
+        return changed_nodes
+
+
+    def run(self):
+        """ Builds and sends every route's reminder now.  Routes with
+            documents that haven't loaded yet are skipped and counted as
+            failed, rather than sent without their dates.  Returns the
+            number of emails sent. """
+        start = self.__timer()
+        today = self.__clock().date()
+        sent = failed = 0
+        for route in self.__routes:
+            with self.__lock:
+                missing = [ref for ref in route.documents if ref not in self.__indexes]
+                if missing:
+                    logging.error("Not sending reminder to %s: %s not loaded yet.",
+                                  ", ".join(route.to), ", ".join(missing))
+                    failed += 1
+                    continue
+                index = dates.IndexGroup(self.__indexes[ref] for ref in route.documents)
+                message = reminders.create_message(index, today, self.__email_from,
+                                                   route.to, route.windows)
+            try:
+                self.__send(message)
+            except Exception as exception: # pylint: disable=broad-except
+                logging.error("Could not send reminder to %s: %s", ", ".join(route.to),
+                              exception)
+                failed += 1
+                continue
+            sent += 1
+        self.__update_status(last_run=self.__clock(), last_run_seconds=self.__timer() - start,
+                             last_run_sent=sent, last_run_failed=failed)
+        logging.info("Sent %d reminders, %d failed, in %.3fs.", sent, failed,
+                     self.__status.last_run_seconds)
+        return sent
+
+
+    def run_forever(self, stop=None, on_step=None):
+        """ Steps until the stop threading.Event, if given, is set, as
+            watch.run_forever. """
+        watch.run_forever(self.step, stop, on_step)
+
+
+    def get_status(self):
+        """ Returns a DaemonStatus. """
+        with self.__lock:
+            return self.__status
+
+
+    def __update_status(self, **fields):
+        """ Replaces some fields of the status. """
+        with self.__lock:
+            self.__status = self.__status._replace(**fields)
+
+
+def format_status(status):
+    """ Returns a DaemonStatus as a JSON-serializable dict. """
+    return {key: value.isoformat() if isinstance(value, datetime.datetime) else value
+            for key, value in status._asdict().items()}
+
+
+def get_next_run(times, after):
+    """ Returns the first datetime after the given one that falls at one of
+        the sorted times of day. """
+    for days in (0, 1):
+        day = after.date() + datetime.timedelta(days=days)
+        for time_of_day in times:
+            candidate = datetime.datetime.combine(day, time_of_day)
+            if candidate > after:
+                return candidate
+    raise ValueError("ERROR: No times of day to schedule.")
+
+
+def parse_time(text):
+    """ Parses a time of day in HH:MM form.  Raises
+        argparse.ArgumentTypeError, so that it can be an argparse type. """
+    try:
+        return datetime.datetime.strptime(text, "%H:%M").time()
+    except ValueError:
+        raise argparse.ArgumentTypeError("Not a time of day (HH:MM): " + text) from None
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,137 @@
+"""
+Builds reminder emails of dated Dynalist items, and routes them from
+documents to recipients.
+
+A routing config is a JSON file like:
+
+    {"from": "reminders@example.com",
+     "routes": [{"to": ["me@example.com"],
+                 "documents": ["https://dynalist.io/d/abc", "def"],
+                 "windows": ["today", "overdue"]}]}
+
+Each route sends one email to its recipients, covering the dated items of
+its documents (URLs or doc ids) in the given windows, or all WINDOWS if
+none are given.
+"""
+
+# Python
+import collections
+import datetime
+import json
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# Project
+from dynalist_utils import dates
+
+Window = collections.namedtuple("Window", ["title", "start", "end", "include_checked"])
+Window.__doc__ = """ A range of days relative to today, start inclusive and
+    end exclusive, where None leaves that end of the range open. """
+
+WINDOWS = collections.OrderedDict([
+    ("today", Window("Due Today", 0, 1, True)),
+    ("overdue", Window("Overdue", None, 0, False)),
+    ("soon", Window("Due Soon", 1, 4, False)),
+    ("week", Window("This Week", 4, 8, False))])
+
+Route = collections.namedtuple("Route", ["to", "documents", "windows"])
+
+
+def read_routes(stream):
+    """ Reads a routing config from a JSON stream and returns the sender,
+        or None if it doesn't give one, and a list of Routes. """
+    config = json.load(stream)
+    routes = []
+    for number, route in enumerate(config.get("routes", []), 1):
+        to = route.get("to")
+        to = [to] if isinstance(to, str) else to
+        documents = route.get("documents")
+        windows = route.get("windows", list(WINDOWS))
+        if not to or not documents:
+            raise Exception("ERROR: Route {} needs 'to' and 'documents'.".format(number))
+        unknown = [window for window in windows if window not in WINDOWS]
+        if unknown:
+            raise Exception("ERROR: Route {} has unknown windows: {}".format(
+                number, ", ".join(unknown)))
+        routes.append(Route(to, documents, windows))
+    if not routes:
+        raise Exception("ERROR: The routing config has no routes.")
+    return config.get("from"), routes
+
+
+def get_sections(index, today, windows=None):
+    """ Returns the (title, dated nodes) for each of the named windows, by
+        default all of WINDOWS, each found in the DateIndex by a range of
+        days from today. """
+    if windows is None:
+        windows = WINDOWS
+    def day(offset):
+        return None if offset is None else today + datetime.timedelta(days=offset)
+    sections = []
+    for name in windows:
+        window = WINDOWS[name]
+        sections.append((window.title, index.get_range(day(window.start), day(window.end),
+                                                       window.include_checked)))
+    return sections
+
+
+def create_message(index, today, email_from, email_to, windows=None):
+    """ Returns the reminder email for the given DateIndex, with the named
+        windows, by default all of WINDOWS. """
+    msg = MIMEMultipart("alternative")
+    msg["From"] = email_from
+    msg["To"] = email_to if isinstance(email_to, str) else ", ".join(email_to)
+    msg["Subject"] = "Items due for " + today.isoformat()
+    msg.attach(MIMEText(render_html(get_sections(index, today, windows)), "html"))
+    return msg
+
+
+def create_messages(routes, docs, today, email_from):
+    """ Returns a (route, message) for each route, given a dict of document
+        reference to Document.  Documents missing from docs are left out
+        of the messages. """
+    messages = []
+    for route in routes:
+        index = dates.DateIndex.from_documents(
+            docs[ref] for ref in route.documents if ref in docs)
+        messages.append((route, create_message(index, today, email_from, route.to,
+                                               route.windows)))
+    return messages
+
+
+def render_html(sections):
+    """ Renders the sections as an html email body. """
+    html = ["<html>", "<body>"]
+    html.extend(render_section(title, items) for title, items in sections)
+    html.append("</body>")
+    html.append("</html>")
+    return "".join(html)
+
+
+def render_section(title, items):
+    """ Render a titled list of tasks, or nothing if there are none. """
+    if not items:
+        return ""
+    html = ["<h1>", title, "</h1>", "<ul>"]
+    html.extend(render_list_item(item) for item in items)
+    html.append("</ul>")
+    return "".join(html)
+
+
+def render_list_item(item):
+    """ Renders a single DatedNode as an html list item """
+    html = ["<li>"]
+    if item.time:
+        html.append(item.time + " ")
+    html.append(item.content)
+    html.append(" <a href='" + item.link + "'>Link</a>")
+    if item.recurrence:
+        html.append(" <small>(repeats " + item.recurrence + ")</small>")
+    if item.note:
+        html.append("<br/>")
+        html.append("<small>" + item.note + "</small>")
+    html.append("</li>")
+    return "".join(html)
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,266 @@
+"""
+Full-text search over the nodes of a Dynalist document.
+
+SearchIndex tokenizes the content and note of every node once, into an
+inverted index from each word, #tag and @mention to the sorted positions of
+the nodes that have it.  Queries are then answered by intersecting a few
+posting lists rather than scanning every node.  Node positions follow tree
+order, so each subtree is a contiguous range and results come out in
+document order.
+
+get_tree() gives the matches with their ancestors, the way Dynalist shows
+a search, for rendering a filtered view in time proportional to the
+number of matches rather than the size of the document.
+
+Queries follow Dynalist's search box.  Every term must match:
+
+    apple          a word starting with "apple"
+    "red apple"    these exact words, in this order, as is red-apple
+    #fruit @bob    a tag or mention
+    -pear          any term, negated
+    is:completed   also is:incomplete
+    has:note       also has:date, has:link and has:checkbox
+    color:red      or a color number, 1-6
+"""
+
+# Python
+import array
+import bisect
+import collections
+import re
+
+# Project
+from dynalist_utils import dates
+from dynalist_utils import markdown
+
+WORD_REGEX = re.compile(r"\w+")
+TAG_REGEX = re.compile(r"(?<![\w#@])[#@][\w-]*\w")
+TERM_REGEX = re.compile(TAG_REGEX.pattern + r"|\w+")
+QUERY_REGEX = re.compile(r'(-?)(?:"([^"]*)"?|(\S+))')
+
+COLORS = {"red": 1, "orange": 2, "yellow": 3, "green": 4, "blue": 5, "purple": 6}
+FILTERS = ("is:completed", "is:incomplete", "has:date", "has:note", "has:link",
+           "has:checkbox")
+
+Term = collections.namedtuple("Term", ["negated", "kind", "value"])
+Term.__doc__ = """ One term of a parsed query.  kind is "word" (matched as
+    a prefix), "phrase" (a tuple of exact words), "tag" or "filter". """
+
+
+class SearchIndex:
+    """ Inverted index over the content and notes of a Document. """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, doc):
+        self.__doc = doc
+        self.__node_ids = []
+        self.__positions = {}
+        postings = collections.defaultdict(lambda: array.array("l"))
+        filters = collections.defaultdict(lambda: array.array("l"))
+        ends = array.array("l")
+        parents = array.array("l")
+        open_nodes = []
+        for position, node in enumerate(doc.iter_nodes()):
+            node_id = node["id"]
+            depth = doc.get_depth(node_id)
+            while open_nodes and open_nodes[-1][1] >= depth:
+                ends[open_nodes.pop()[0]] = position
+            parents.append(open_nodes[-1][0] if open_nodes else -1)
+            open_nodes.append((position, depth))
+            ends.append(0)
+            self.__node_ids.append(node_id)
+            self.__positions[node_id] = position
+            for term in get_terms(node):
+                postings[term].append(position)
+            for name in get_filters(node):
+                filters[name].append(position)
+        for position, _ in open_nodes:
+            ends[position] = len(self.__node_ids)
+        self.__postings = dict(postings)
+        self.__filters = dict(filters)
+        self.__ends = ends
+        self.__parents = parents
+        self.__words = sorted(term for term in self.__postings if term[0] not in "#@")
+
+
+    def __len__(self):
+        return len(self.__node_ids)
+
+
+    def search(self, query, node_id="root"):
+        """ Returns the nodes below node_id that match the query, in tree
+            order. """
+        return [self.__doc.get_node(self.__node_ids[position])
+                for position in self.find(parse_query(query), node_id)]
+
+
+    def get_tree(self, query, node_id="root"):
+        """ Returns the nodes below node_id that match the query and their
+            ancestors, as a dict from the id of each of them, and of
+            node_id, to the list of its children among them in tree order.
+            Builds only that part of the tree, climbing from each match to
+            the first ancestor already in it. """
+        node_ids = self.__node_ids
+        parents = self.__parents
+        tree = {node_id: []}
+        for position in self.find(parse_query(query), node_id):
+            chain = []
+            while node_ids[position] not in tree:
+                chain.append(position)
+                position = parents[position]
+            for position in reversed(chain):
+                tree[node_ids[parents[position]]].append(self.__doc.get_node(node_ids[position]))
+                tree[node_ids[position]] = []
+        return tree
+
+
+    def find(self, terms, node_id="root"):
+        """ Returns the sorted positions of the nodes below node_id that
+            match all of the Terms. """
+        if not self.__doc.has_node(node_id):
+            raise Exception("ERROR: No such node: {}".format(node_id))
+        start = self.__positions[node_id] + 1
+        end = self.__ends[start - 1]
+        included = [term for term in terms if not term.negated]
+        excluded = [term for term in terms if term.negated]
+
+        # Start from the shortest posting list, or the whole subtree
+        postings = sorted((self.get_postings(term) for term in included), key=len)
+        if postings:
+            first = postings.pop(0)
+            candidates = first[bisect.bisect_left(first, start):bisect.bisect_left(first, end)]
+        else:
+            candidates = range(start, end)
+        for other in postings:
+            candidates = [position for position in candidates if contains(other, position)]
+        for term in excluded:
+            other = self.get_postings(term)
+            candidates = [position for position in candidates if not contains(other, position)]
+        return list(candidates)
+
+
+    def get_postings(self, term):
+        """ Returns the sorted positions of the nodes a Term matches, as if
+            it weren't negated. """
+        if term.kind == "word":
+            return self.__get_prefix_postings(term.value)
+        if term.kind == "tag":
+            return self.__postings.get(term.value, ())
+        if term.kind == "filter":
+            return self.__filters.get(term.value, ())
+        return self.__get_phrase_postings(term.value)
+
+
+    def __get_prefix_postings(self, prefix):
+        """ Returns the positions of the nodes with a word starting with
+            prefix. """
+        first = bisect.bisect_left(self.__words, prefix)
+        last = bisect.bisect_left(self.__words, prefix + "\U0010ffff", first)
+        if last - first == 1:
+            return self.__postings[self.__words[first]]
+        found = set()
+        for word in self.__words[first:last]:
+            found.update(self.__postings[word])
+        return sorted(found)
+
+
+    def __get_phrase_postings(self, words):
+        """ Returns the positions of the nodes whose content or note has
+            the words in order, checking only the nodes that have them
+            all. """
+        if not words:
+            return range(len(self.__node_ids))
+        postings = sorted((self.__postings.get(word, ()) for word in set(words)), key=len)
+        candidates = postings.pop(0)
+        for other in postings:
+            candidates = [position for position in candidates if contains(other, position)]
+        if len(words) == 1:
+            return candidates
+        found = []
+        for position in candidates:
+            node = self.__doc.get_node(self.__node_ids[position])
+            if any(has_phrase(get_words(node.get(key) or ""), words)
+                   for key in ("content", "note")):
+                found.append(position)
+        return found
+
+
+def get_words(text):
+    """ Returns the lowercase words of a text. """
+    return WORD_REGEX.findall(text.lower())
+
+
+def get_terms(node):
+    """ Returns the set of words, tags and mentions in a node.  The words
+        of tags and mentions count as words too. """
+    text = "{}\n{}".format(node.get("content") or "", node.get("note") or "").lower()
+    terms = set(TERM_REGEX.findall(text))
+    for term in [term for term in terms if term[0] in "#@"]:
+        terms.update(WORD_REGEX.findall(term))
+    return terms
+
+
+def get_filters(node):
+    """ Returns the names of the filters a node matches, with color:N for
+        its color. """
+    content = node.get("content") or ""
+    note = node.get("note") or ""
+    found = ["is:completed" if node.get("checked") else "is:incomplete"]
+    if dates.DATE_REGEX.search(content) or dates.DATE_REGEX.search(note):
+        found.append("has:date")
+    if note:
+        found.append("has:note")
+    if markdown.LINK_REGEX.search(content) or markdown.LINK_REGEX.search(note):
+        found.append("has:link")
+    if node.get("checkbox"):
+        found.append("has:checkbox")
+    if node.get("color"):
+        found.append("color:{}".format(node["color"]))
+    return found
+
+
+def has_phrase(words, phrase):
+    """ Returns whether the list of words contains the phrase's words in
+        order. """
+    length = len(phrase)
+    first = phrase[0]
+    for start, word in enumerate(words):
+        if word == first and tuple(words[start:start + length]) == phrase:
+            return True
+    return False
+
+
+def contains(positions, position):
+    """ Returns whether a sorted sequence of positions contains one. """
+    index = bisect.bisect_left(positions, position)
+    return index < len(positions) and positions[index] == position
+
+
+def parse_query(query):
+    """ Parses a Dynalist search query into a list of Terms. """
+    terms = []
+    for match in QUERY_REGEX.finditer(query or ""):
+        negated = bool(match.group(1))
+        if match.group(2) is not None:
+            terms.append(Term(negated, "phrase", tuple(get_words(match.group(2)))))
+            continue
+        text = match.group(3).lower()
+        if text.startswith("color:"):
+            color = COLORS.get(text[len("color:"):], text[len("color:"):])
+            terms.append(Term(negated, "filter", "color:{}".format(color)))
+        elif ":" in text and text.split(":")[0] in ("is", "has"):
+            if text not in FILTERS:
+                raise Exception("ERROR: Unknown search filter: " + text)
+            terms.append(Term(negated, "filter", text))
+        elif TAG_REGEX.fullmatch(text):
+            terms.append(Term(negated, "tag", text))
+        else:
+            words = tuple(get_words(text))
+            if len(words) == 1:
+                terms.append(Term(negated, "word", words[0]))
+            elif words:
+                terms.append(Term(negated, "phrase", words))
+    return terms
+
+
+# vim: foldmethod=indent
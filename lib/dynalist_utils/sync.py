@@ -0,0 +1,107 @@
+"""
+Keeps a local directory of Dynalist documents up to date.
+
+The directory holds one <doc id>.json per document plus a manifest of the
+version each file was downloaded at.  A sync asks the API for the current
+versions of all documents in one request and then only downloads the
+documents whose version moved.
+"""
+
+# Python
+import collections
+import json
+import logging
+import os
+
+# Project
+from dynalist_utils import batch
+from dynalist_utils import cache
+from dynalist_utils import client
+
+MANIFEST_FILENAME = "versions.json"
+CHECK_BATCH_SIZE = 100
+
+SyncResult = collections.namedtuple("SyncResult", ["updated", "unchanged", "failed"])
+
+
+class SyncDirectory:
+    """ Local directory of document JSON files and their versions. """
+
+    def __init__(self, directory):
+        self.__directory = directory
+        self.__manifest_filename = os.path.join(directory, MANIFEST_FILENAME)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.__manifest_filename) as manifest_file:
+                self.__versions = json.load(manifest_file)
+        except FileNotFoundError:
+            self.__versions = {}
+
+
+    def get_filename(self, doc_id):
+        """ Returns the path of the JSON file for the given document. """
+        return os.path.join(self.__directory, doc_id + ".json")
+
+
+    def get_versions(self):
+        """ Returns a dict of doc id to the version held locally. """
+        return dict(self.__versions)
+
+
+    def find_stale(self, versions):
+        """ Returns the doc ids whose current version, per the given dict,
+            differs from the local copy, or that have no local copy. """
+        return [doc_id for doc_id, version in versions.items()
+                if version is None
+                or self.__versions.get(doc_id) != version
+                or not os.path.exists(self.get_filename(doc_id))]
+
+
+    def sync(self, doc_ids, token, max_workers=batch.DEFAULT_MAX_WORKERS, rate=None,
+             load=batch.load_document):
+        """ Brings the local copies of the given documents up to date and
+            returns a SyncResult of doc id lists. """
+        doc_ids = list(doc_ids)
+        versions = get_versions(doc_ids, token)
+        stale = self.find_stale({doc_id: versions.get(doc_id) for doc_id in doc_ids})
+        logging.info("%d of %d documents changed.", len(stale), len(doc_ids))
+        updated = []
+        failed = []
+        try:
+            for result in batch.load_documents(stale, token, max_workers, rate, load=load):
+                if result.error:
+                    logging.error("Could not download %s: %s", result.ref, result.error)
+                    failed.append(result.ref)
+                    continue
+                self.store(result.ref, result.doc)
+                updated.append(result.ref)
+        finally:
+            self.save()
+        unchanged = [doc_id for doc_id in doc_ids if doc_id not in stale]
+        return SyncResult(updated, unchanged, failed)
+
+
+    def store(self, doc_id, doc):
+        """ Writes a document to the directory and records its version.
+            Call save() to persist the versions. """
+        cache.write_atomically(self.get_filename(doc_id), cache.text_writer(doc.to_json()))
+        self.__versions[doc_id] = doc.get_metadata().get("version")
+
+
+    def save(self):
+        """ Writes the manifest of versions. """
+        cache.write_atomically(self.__manifest_filename,
+                               cache.text_writer(json.dumps(self.__versions)))
+
+
+def get_versions(doc_ids, token):
+    """ Returns a dict of doc id to current version, asking the API in
+        batches of CHECK_BATCH_SIZE documents. """
+    api = client.get_client(token)
+    versions = {}
+    for start in range(0, len(doc_ids), CHECK_BATCH_SIZE):
+        versions.update(api.check_for_updates(doc_ids[start:start + CHECK_BATCH_SIZE]))
+    return versions
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,307 @@
+"""
+Text templates kept in Dynalist.
+
+A template is a node whose content has {{key}} fields.  Each child of the
+template node is a key, and its children are the values to pick from at
+random.  Values may have fields of their own, filled in from the same
+keys.  Fields with no key are replaced by MISS(key).  A value is picked
+in proportion to the weight given by a "weight: N" line in its note, or 1
+if it has none.
+
+compile_template() parses all of this once, so that generating each text
+is only a walk over prebuilt tokens, and weighted picks are made in
+constant time from alias tables.
+
+generate_seeded() splits a run into fixed-size chunks, each with its own
+random stream derived from the seed, and can generate the chunks on many
+processes.  The texts depend only on the seed, not on the number of
+processes.
+"""
+
+# Python
+import collections
+import concurrent.futures
+import logging
+import math
+import multiprocessing
+import random
+import re
+
+FIELD_REGEX = re.compile(r"{{([^}]+)}}")
+WHITESPACE_REGEX = re.compile(r"\s\s+")
+WEIGHT_REGEX = re.compile(r"^\s*weight:\s*(\S+)\s*$", re.MULTILINE | re.IGNORECASE)
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# The template being generated from, set in each worker process by init_worker.
+WORKER_TEMPLATE = None
+
+
+class Choice(list):
+    """ A field of a compiled template: the list of its key's values, each
+        either a string or, if the value has fields of its own, a tuple of
+        tokens.  Values are filled in as the template is compiled, so keys
+        that refer to themselves share one Choice.  table holds the alias
+        table for weighted picks, or None if all values are equally
+        likely. """
+    __slots__ = ["key", "table"]
+
+    def __init__(self, key):
+        super().__init__()
+        self.key = key
+        self.table = None
+
+
+    def set_weights(self, weights):
+        """ Makes values be picked in proportion to the given weights. """
+        if len(weights) != len(self):
+            raise Exception("ERROR: Expected {} weights for key '{}'".format(
+                len(self), self.key))
+        if weights and sum(weights) <= 0:
+            raise Exception("ERROR: All values of key '{}' have zero weight.".format(
+                self.key))
+        self.table = make_alias_table(weights) if len(set(weights)) > 1 else None
+
+
+    def pick(self, rng):
+        """ Returns a value, picked with rng. """
+        if self.table is None:
+            return rng.choice(self)
+        probabilities, aliases = self.table
+        position = rng.random() * len(self)
+        index = int(position)
+        if position - index < probabilities[index]:
+            return self[index]
+        return self[aliases[index]]
+
+
+class Template:
+    """ A compiled template: a tuple of tokens, each a literal string or a
+        Choice. """
+
+    def __init__(self, tokens, missing=()):
+        self.__tokens = tuple(tokens)
+        self.__missing = tuple(missing)
+        self.__flat = all(isinstance(token, str) or all(isinstance(value, str)
+                                                        for value in token)
+                          for token in self.__tokens)
+        self.__clean = not self.__flat or needs_cleanup(self.__tokens)
+
+
+    def get_tokens(self):
+        """ Returns the tuple of tokens. """
+        return self.__tokens
+
+
+    def get_missing_keys(self):
+        """ Returns the keys the template uses that have no values. """
+        return self.__missing
+
+
+    def generate(self, rng=random):
+        """ Returns one text, picking values with rng.  Fields are filled
+            in the order they appear, nested fields first, and unweighted
+            values are picked with rng.choice(), so a seeded rng gives the
+            same text as process_template() did. """
+        if self.__flat:
+            parts = [token if token.__class__ is str else token.pick(rng)
+                     for token in self.__tokens]
+        else:
+            parts = []
+            stack = [iter(self.__tokens)]
+            while stack:
+                for token in stack[-1]:
+                    if token.__class__ is str:
+                        parts.append(token)
+                        continue
+                    value = token.pick(rng)
+                    if value.__class__ is str:
+                        parts.append(value)
+                        continue
+                    stack.append(iter(value))
+                    break
+                else:
+                    stack.pop()
+        if self.__clean:
+            return WHITESPACE_REGEX.sub(" ", "".join(parts))
+        return "".join(parts)
+
+
+    def iter_generate(self, num, rng=random):
+        """ Yields num texts. """
+        generate = self.generate
+        for _ in range(num):
+            yield generate(rng)
+
+
+def compile_template(doc, node_id):
+    """ Compiles the template at the given node of a Document. """
+    template = doc.get_node(node_id)["content"]
+    logging.debug("Template: %s", template)
+    keys = {}
+    for child in doc.get_children(node_id):
+        keys[child["content"]] = child
+    logging.debug("Found keys: %s", keys.keys())
+
+    choices = {}
+    missing = []
+
+    def get_choice(key):
+        """ Returns the Choice for a key, compiling its values the first
+            time, or None if there is no such key. """
+        if key in choices:
+            return choices[key]
+        if key not in keys:
+            logging.warning("No child found for key '%s'", key)
+            choices[key] = None
+            return None
+        choice = choices[key] = Choice(key)
+        pending.append((choice, keys[key]["id"]))
+        return choice
+
+    pending = []
+    tokens = parse(template, get_choice)
+    while pending:
+        choice, key_id = pending.pop()
+        weights = []
+        for value in doc.get_children(key_id):
+            value_tokens = parse(value["content"], get_choice)
+            if len(value_tokens) == 1 and isinstance(value_tokens[0], str):
+                choice.append(value_tokens[0])
+            else:
+                choice.append(tuple(value_tokens))
+            weights.append(get_weight(value))
+        if not choice:
+            missing.append(choice.key)
+        choice.set_weights(weights)
+    return Template(tokens, missing)
+
+
+def get_weight(node):
+    """ Returns the weight given in a node's note, or 1. """
+    match = WEIGHT_REGEX.search(node.get("note") or "")
+    if not match:
+        return 1.0
+    try:
+        weight = float(match.group(1))
+    except ValueError:
+        weight = -1.0
+    if not weight >= 0 or math.isinf(weight):
+        raise Exception("ERROR: Invalid weight for '{}': {}".format(node["content"],
+                                                                    match.group(1)))
+    return weight
+
+
+def make_alias_table(weights):
+    """ Returns Vose's alias table (probabilities, aliases) for picking
+        index i with probability weights[i] / sum(weights), or None if the
+        weights sum to zero. """
+    total = sum(weights)
+    if total <= 0:
+        return None
+    count = len(weights)
+    scaled = [weight * count / total for weight in weights]
+    probabilities = [1.0] * count
+    aliases = list(range(count))
+    small = [i for i, weight in enumerate(scaled) if weight < 1.0]
+    large = [i for i, weight in enumerate(scaled) if weight >= 1.0]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        probabilities[less] = scaled[less]
+        aliases[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+        (small if scaled[more] < 1.0 else large).append(more)
+    return probabilities, aliases
+
+
+def needs_cleanup(tokens):
+    """ Returns whether texts from flat tokens can have runs of whitespace
+        across tokens, which must be collapsed as each text is generated.
+        Runs within a token were collapsed by parse(). """
+    def edges(token):
+        return [token] if isinstance(token, str) else token
+    for first, second in zip(tokens, tokens[1:]):
+        if any(not text or text[-1].isspace() for text in edges(first)) and \
+                any(not text or text[0].isspace() for text in edges(second)):
+            return True
+    return any(not text for token in tokens[1:-1] for text in edges(token))
+
+
+def parse(text, get_choice):
+    """ Splits text into literal strings and the Choices that get_choice()
+        returns for its fields, merging adjacent literals and collapsing
+        runs of whitespace in them.  Fields for which get_choice() returns
+        None become MISS(key). """
+    tokens = []
+    literal = []
+    position = 0
+    for match in FIELD_REGEX.finditer(text):
+        literal.append(text[position:match.start()])
+        position = match.end()
+        choice = get_choice(match.group(1))
+        if choice is None:
+            literal.append("MISS({})".format(match.group(1)))
+            continue
+        if "".join(literal):
+            tokens.append(WHITESPACE_REGEX.sub(" ", "".join(literal)))
+        literal = []
+        tokens.append(choice)
+    literal.append(text[position:])
+    if "".join(literal) or not tokens:
+        tokens.append(WHITESPACE_REGEX.sub(" ", "".join(literal)))
+    return tokens
+
+
+def generate_seeded(template, num, seed, max_workers=1, chunk_size=DEFAULT_CHUNK_SIZE, # pylint: disable=too-many-arguments,too-many-positional-arguments
+                    start_method=None):
+    """ Yields num texts from a Template, in order, generated in chunks of
+        chunk_size on at most max_workers processes (None for one per CPU).
+        Chunk n uses get_chunk_rng(seed, n), so the texts are the same for
+        any max_workers.  start_method is as for export.export_subtrees. """
+    chunks = [(start, min(chunk_size, num - start)) for start in range(0, num, chunk_size)]
+    if max_workers == 1 or len(chunks) <= 1:
+        for start, count in chunks:
+            yield from generate_chunk(start // chunk_size, count, seed, template)
+        return
+    if start_method is None:
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=init_worker, initargs=(template,)) as executor:
+        # Keep a few chunks per worker in flight, and hand them out in order
+        window = 2 * (max_workers or multiprocessing.cpu_count())
+        futures = collections.deque()
+        for start, count in chunks:
+            futures.append(executor.submit(generate_chunk, start // chunk_size, count, seed))
+            if len(futures) >= window:
+                yield from futures.popleft().result()
+        while futures:
+            yield from futures.popleft().result()
+
+
+def init_worker(template):
+    """ Sets the template for this worker process. """
+    global WORKER_TEMPLATE # pylint: disable=global-statement
+    WORKER_TEMPLATE = template
+
+
+def generate_chunk(chunk, count, seed, template=None):
+    """ Returns a list of count texts for the given chunk number.  Uses the
+        worker's template unless template is given. """
+    template = template if template is not None else WORKER_TEMPLATE
+    return list(template.iter_generate(count, get_chunk_rng(seed, chunk)))
+
+
+def get_chunk_rng(seed, chunk):
+    """ Returns the independent random stream for one chunk of a seeded
+        run. """
+    return random.Random("{}/{}".format(seed, chunk))
+
+
+def process_template(doc, node_id, rng=random):
+    """ Returns one text generated from the template at the given node. """
+    return compile_template(doc, node_id).generate(rng)
+
+
+# vim: foldmethod=indent
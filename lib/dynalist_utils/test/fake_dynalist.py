@@ -0,0 +1,121 @@
+""" Local stand-in for the Dynalist API, for tests """
+
+# Python
+import copy
+import http.server
+import json
+import threading
+
+TOKEN = "test-token"
+
+
+class FakeDynalist:
+    """ Serves a small subset of the Dynalist API from memory on a local
+        port.  Responses queued in self.scripted are sent, in order, before
+        falling back to the normal behavior; a body given as bytes is sent
+        as is, rather than as JSON. """
+
+    def __init__(self):
+        self.documents = {}
+        self.scripted = []
+        self.requests = []
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            """ Request handler bound to this FakeDynalist. """
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self): # pylint: disable=invalid-name
+                """ Handle an API call. """
+                length = int(self.headers["Content-Length"])
+                body = json.loads(self.rfile.read(length))
+                status, headers, response = fake.handle(
+                    self.path, body, self.client_address[1])
+                if isinstance(response, bytes):
+                    data = response
+                else:
+                    data = json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args): # pylint: disable=redefined-builtin
+                """ Keep test output quiet. """
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={"poll_interval": 0.05}, daemon=True)
+        self.url = "http://127.0.0.1:{}/api/v1/".format(self.server.server_address[1])
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_document(self, file_id, nodes, title="", version=1):
+        """ Adds a document to be served. """
+        self.documents[file_id] = {"title": title, "version": version,
+                                   "nodes": copy.deepcopy(nodes)}
+
+    def handle(self, path, body, client_port):
+        """ Returns (status, headers, body) for one API call. """
+        endpoint = path.split("/api/v1/", 1)[-1]
+        with self.lock:
+            self.requests.append((endpoint, body, client_port))
+            if self.scripted:
+                return self.scripted.pop(0)
+            if body.get("token") != TOKEN:
+                return 200, {}, {"_code": "InvalidToken", "_msg": "Invalid token"}
+            handler = getattr(self, "handle_" + endpoint.replace("/", "_"), None)
+            if handler is None:
+                return 404, {}, {"_code": "NotFound"}
+            return 200, {}, handler(body)
+
+    def handle_doc_read(self, body):
+        """ /doc/read """
+        doc = self.documents.get(body["file_id"])
+        if doc is None:
+            return {"_code": "NotFound", "_msg": "Document not found"}
+        return {"_code": "Ok", "file_id": body["file_id"], "title": doc["title"],
+                "version": doc["version"], "nodes": doc["nodes"]}
+
+    def handle_file_list(self, _):
+        """ /file/list """
+        files = [{"id": file_id, "title": doc["title"], "type": "document",
+                  "permission": 4}
+                 for file_id, doc in self.documents.items()]
+        return {"_code": "Ok", "root_file_id": "root_folder", "files": files}
+
+    def handle_doc_check_for_updates(self, body):
+        """ /doc/check_for_updates """
+        return {"_code": "Ok",
+                "versions": {file_id: self.documents[file_id]["version"]
+                             for file_id in body["file_ids"]
+                             if file_id in self.documents}}
+
+    def handle_doc_edit(self, body):
+        """ /doc/edit, supporting the 'edit' action only """
+        doc = self.documents[body["file_id"]]
+        nodes = {node["id"]: node for node in doc["nodes"]}
+        results = []
+        for change in body["changes"]:
+            node = nodes.get(change.get("node_id"))
+            if change.get("action") != "edit" or node is None:
+                return {"_code": "InvalidRequest", "_msg": "Bad change"}
+            for key, value in change.items():
+                if key not in ("action", "node_id"):
+                    node[key] = value
+            results.append(True)
+        doc["version"] += 1
+        return {"_code": "Ok", "results": results}
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,114 @@
+""" Local stand-in for an SMTP server, for tests """
+
+# Python
+import base64
+import email
+import socketserver
+import threading
+
+USERNAME = "user"
+PASSWORD = "secret"
+
+
+class FakeSmtp:
+    """ Accepts mail on a local port and keeps it in self.messages as
+        (mail_from, recipients, email.message.Message).  Replies queued in
+        self.scripted answer the next MAIL commands instead of accepting
+        them; a 421 reply also closes the connection, as servers do.  If
+        drop_after is set, each connection is closed after that many
+        messages. """
+
+    def __init__(self):
+        self.messages = []
+        self.scripted = []
+        self.connections = 0
+        self.logins = 0
+        self.drop_after = None
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            """ Handles one SMTP session. """
+
+            def handle(self):
+                """ Run the session. """
+                with fake.lock:
+                    fake.connections += 1
+                fake.session(self.rfile, self.wfile)
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={"poll_interval": 0.05}, daemon=True)
+        self.host = "127.0.0.1:{}".format(self.server.server_address[1])
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def session(self, rfile, wfile):
+        """ Speaks just enough SMTP for smtplib. """
+        def reply(line):
+            wfile.write(line.encode("ascii") + b"\r\n")
+            wfile.flush()
+
+        reply("220 localhost fake ESMTP")
+        mail_from, recipients, sent = None, [], 0
+        while True:
+            line = rfile.readline().decode("ascii").rstrip("\r\n")
+            if not line:
+                return
+            command, _, argument = line.partition(" ")
+            command = command.upper()
+            if command == "EHLO":
+                reply("250-localhost\r\n250 AUTH PLAIN")
+            elif command == "HELO":
+                reply("250 localhost")
+            elif command == "AUTH":
+                _, credentials = argument.split(" ", 1)
+                _, username, password = base64.b64decode(credentials).split(b"\0")
+                if (username.decode(), password.decode()) != (USERNAME, PASSWORD):
+                    reply("535 Authentication failed")
+                    continue
+                with self.lock:
+                    self.logins += 1
+                reply("235 Authentication successful")
+            elif command == "MAIL":
+                with self.lock:
+                    scripted = self.scripted.pop(0) if self.scripted else None
+                if scripted:
+                    reply(scripted)
+                    if scripted.startswith("421"):
+                        return
+                    continue
+                mail_from, recipients = argument[len("FROM:"):].split(" ")[0], []
+                reply("250 OK")
+            elif command == "RCPT":
+                recipients.append(argument[len("TO:"):])
+                reply("250 OK")
+            elif command == "DATA":
+                reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in iter(rfile.readline, b".\r\n"):
+                    data.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                with self.lock:
+                    self.messages.append((mail_from, recipients,
+                                          email.message_from_bytes(b"".join(data))))
+                reply("250 OK")
+                sent += 1
+                if self.drop_after is not None and sent >= self.drop_after:
+                    return
+            elif command in ("RSET", "NOOP"):
+                reply("250 OK")
+            elif command == "QUIT":
+                reply("221 Bye")
+                return
+            else:
+                reply("502 Command not implemented")
+
+
+# vim: foldmethod=indent
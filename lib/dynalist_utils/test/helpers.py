@@ -0,0 +1,21 @@
+""" Small document builders shared by the tests """
+
+# Project
+from dynalist_utils import dynalist
+
+
+def make_nodes(content):
+    """ Returns the nodes of a one-node document. """
+    return [{"id": "root", "content": content, "note": ""}]
+
+
+def make_doc(doc_id, *contents, version=1):
+    """ Returns a Document with one child of root per content """
+    nodes = [{"id": "root", "content": "root", "note": "",
+              "children": ["n{}".format(i) for i in range(len(contents))]}]
+    nodes.extend({"id": "n{}".format(i), "content": content, "note": ""}
+                 for i, content in enumerate(contents))
+    return dynalist.Document.from_dict({"doc_id": doc_id, "version": version, "nodes": nodes})
+
+
+# vim: foldmethod=indent
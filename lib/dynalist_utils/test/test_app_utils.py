@@ -1,6 +1,9 @@
 """ Tests for app_utils """
 
 # Python
+import json
+import os
+import tempfile
 import unittest
 
 # Libraries
@@ -8,6 +11,8 @@ import mock
 
 # Project
 from dynalist_utils import app_utils
+from dynalist_utils import dynalist
+from dynalist_utils import export
 
 
 class TestGetUrl(unittest.TestCase):
@@ -65,4 +70,60 @@ class TestGetToken(unittest.TestCase):
                          app_utils.get_token(args, env))
 
 
+class TestGetBackend(unittest.TestCase):
+    """ Tests for app_utils.get_backend() """
+
+    def test_default_backend(self):
+        """ No --compact -- use dict backend """
+        args = mock.Mock(spec=[])
+        self.assertEqual("dict", app_utils.get_backend(args))
+
+    def test_compact_backend(self):
+        """ --compact given """
+        args = mock.Mock()
+        args.compact = True
+        self.assertEqual("compact", app_utils.get_backend(args))
+
+
+
+class TestGetSearchTree(unittest.TestCase):
+    """ Tests for app_utils.get_search_tree() """
+
+    def setUp(self):
+        self.data = {"file_id": "doc1", "query": "apple", "nodes": [
+            {"id": "root", "content": "Fruit", "note": "", "children": ["a", "b"]},
+            {"id": "a", "content": "Apple", "note": ""},
+            {"id": "b", "content": "Pear", "note": ""}]}
+
+    def test_query(self):
+        """ --query, then the URL's query """
+        doc = dynalist.Document.from_dict(self.data)
+        args = mock.Mock(query=None)
+        self.assertEqual(["a"], [node["id"] for node in
+                                 app_utils.get_search_tree(args, doc, "root")["root"]])
+        args.query = "pear"
+        self.assertEqual(["b"], [node["id"] for node in
+                                 app_utils.get_search_tree(args, doc, "root")["root"]])
+        args.query = ""
+        self.assertIsNone(app_utils.get_search_tree(args, doc, "root"))
+        with self.assertRaises(Exception):
+            app_utils.get_search_tree(mock.Mock(query="pear"), doc, "root", sections=True)
+
+    def test_infile_incremental(self):
+        """ An --incremental export of a downloaded search URL exports the
+            whole document """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            infile = os.path.join(temp_dir, "doc.json")
+            with open(infile, "w") as outfile:
+                json.dump(self.data, outfile)
+            with open(infile) as stream:
+                doc = dynalist.Document.from_json_stream(stream)
+            args = mock.Mock(query=None, outdir=None, incremental=os.path.join(temp_dir, "doc.md"))
+            with self.assertLogs(level="INFO"):
+                self.assertIsNone(app_utils.get_search_tree(args, doc, "root", sections=True))
+            export.export_incremental(doc, "root", args.incremental)
+            with open(args.incremental) as result:
+                self.assertEqual("# Fruit\n\n## Apple\n\n## Pear\n\n", result.read())
+
+
 # vim: foldmethod=indent
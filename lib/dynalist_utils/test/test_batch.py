@@ -0,0 +1,87 @@
+""" Tests for batch """
+
+# Python
+import os
+import threading
+import unittest
+
+# Libraries
+import mock
+
+# Project
+from dynalist_utils import batch
+from dynalist_utils.test import fake_dynalist
+from dynalist_utils.test import helpers
+
+
+class FakeClock:
+    """ Clock whose sleep just advances time. """
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        """ Pretend to sleep. """
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+    """ Tests for batch.RateLimiter """
+
+    def test_rate(self):
+        """ Acquisitions beyond the burst are spaced out by 1/rate """
+        clock = FakeClock()
+        limiter = batch.RateLimiter(4, burst=2, clock=clock, sleep=clock.sleep)
+        for _ in range(6):
+            limiter.acquire()
+        self.assertAlmostEqual(1.0, clock.now)
+
+
+class TestLoadDocuments(unittest.TestCase):
+    """ Tests for batch.load_documents() """
+
+    def test_concurrent_load(self):
+        """ Load documents by id and URL from a local stand-in server """
+        with fake_dynalist.FakeDynalist() as server, \
+             mock.patch.dict(os.environ, {"DYNALIST_API_URL": server.url}):
+            refs = []
+            for i in range(10):
+                server.add_document("doc{}".format(i), helpers.make_nodes(str(i)))
+                refs.append("doc{}".format(i) if i % 2 else
+                            "https://dynalist.io/d/doc{}".format(i))
+            refs.append("missing")
+            results = list(batch.load_documents(refs, fake_dynalist.TOKEN,
+                                                max_workers=3, rate=1000))
+        self.assertEqual(sorted(refs), sorted(result.ref for result in results))
+        for result in results:
+            if result.ref == "missing":
+                self.assertIsNotNone(result.error)
+                continue
+            self.assertIsNone(result.error)
+            self.assertEqual(result.ref[-1], result.doc.get_root()["content"])
+
+    def test_bounded_parallelism(self):
+        """ Never more than max_workers loads at once """
+        lock = threading.Lock()
+        active = [0, 0]
+        barrier = threading.Barrier(2)
+
+        def load(ref, token, backend):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            barrier.wait(timeout=5)
+            with lock:
+                active[0] -= 1
+            return (ref, token, backend)
+
+        results = list(batch.load_documents(range(8), "token", max_workers=2, load=load))
+        self.assertEqual(8, len(results))
+        self.assertEqual(2, active[1])
+
+
+# vim: foldmethod=indent
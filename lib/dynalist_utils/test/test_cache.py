@@ -0,0 +1,106 @@
+""" Tests for cache """
+
+# Python
+import os
+import tempfile
+import unittest
+
+# Project
+from dynalist_utils import cache
+from dynalist_utils import dynalist
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+class FakeClock: # pylint: disable=too-few-public-methods
+    """ Clock that only moves when told to. """
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_doc(version, file_id="doc1"):
+    """ Returns a small document with the given version. """
+    return dynalist.Document.from_dict({
+        "file_id": file_id, "version": version,
+        "nodes": [{"id": "root", "content": "v{}".format(version), "note": ""}]})
+
+
+class TestDocumentCache(unittest.TestCase):
+    """ Tests for cache.DocumentCache """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = FakeClock()
+        self.cache = cache.DocumentCache(self.directory.name, ttl=60, clock=self.clock)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_miss(self):
+        """ Nothing cached -- return None """
+        self.assertIsNone(self.cache.get("doc1"))
+
+    def test_hit_within_ttl(self):
+        """ Fresh entries are used without checking the version """
+        self.cache.put("doc1", make_doc(1))
+        self.clock.now += 30
+        doc = self.cache.get("doc1", get_version=self.fail)
+        self.assertEqual("v1", doc.get_root()["content"])
+
+    def test_expired_without_revalidation(self):
+        """ Old entries are dropped if they can't be revalidated """
+        self.cache.put("doc1", make_doc(1))
+        self.clock.now += 61
+        self.assertIsNone(self.cache.get("doc1"))
+
+    def test_revalidated(self):
+        """ Old entries are reused while the version is unchanged """
+        self.cache.put("doc1", make_doc(1))
+        self.clock.now += 61
+        calls = []
+        def get_version(doc_id):
+            calls.append(doc_id)
+            return 1
+        self.assertIsNotNone(self.cache.get("doc1", get_version))
+        self.assertEqual(["doc1"], calls)
+        # Revalidation restarts the TTL
+        self.clock.now += 30
+        self.assertIsNotNone(self.cache.get("doc1", self.fail))
+
+    def test_changed(self):
+        """ Old entries are dropped once the version moves on """
+        self.cache.put("doc1", make_doc(1))
+        self.clock.now += 61
+        self.assertIsNone(self.cache.get("doc1", lambda doc_id: 2))
+
+    def test_compact_backend(self):
+        """ Cached documents can be loaded into either backend """
+        self.cache.put("doc1", make_doc(1))
+        doc = self.cache.get("doc1", backend="compact")
+        self.assertEqual("v1", doc.get_root()["content"])
+
+    def test_eviction(self):
+        """ Least recently used entries go first when over the limit """
+        self.cache.put("doc1", make_doc(1, "doc1"))
+        entry_size = sum(entry.stat().st_size
+                         for entry in os.scandir(self.directory.name)
+                         if entry.name.endswith(cache.DATA_SUFFIX))
+        small_cache = cache.DocumentCache(self.directory.name, ttl=60,
+                                          max_size=entry_size * 2, clock=self.clock)
+        small_cache.put("doc2", make_doc(1, "doc2"))
+        # Age both entries, then touch doc1 by reading it
+        for name in os.listdir(self.directory.name):
+            os.utime(os.path.join(self.directory.name, name), (0, 0))
+        self.assertIsNotNone(small_cache.get("doc1"))
+        small_cache.put("doc3", make_doc(1, "doc3"))
+        self.assertIsNotNone(small_cache.get("doc1"))
+        self.assertIsNone(small_cache.get("doc2"))
+        self.assertIsNotNone(small_cache.get("doc3"))
+        self.assertFalse([name for name in os.listdir(self.directory.name)
+                          if name.endswith(".tmp")])
+
+
+# vim: foldmethod=indent
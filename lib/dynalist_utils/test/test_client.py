@@ -0,0 +1,146 @@
+""" Tests for client """
+
+# Python
+import os
+import unittest
+
+# Libraries
+import mock
+import requests
+
+# Project
+from dynalist_utils import client
+from dynalist_utils import dynalist
+from dynalist_utils.test import fake_dynalist
+
+NODES = [{"id": "root", "content": "root", "note": "", "children": ["a"]},
+         {"id": "a", "content": "a", "note": ""}]
+
+
+class TestDynalistClient(unittest.TestCase):
+    """ Tests for client.DynalistClient against a local stand-in server """
+
+    def setUp(self):
+        self.server = fake_dynalist.FakeDynalist().__enter__()
+        self.server.add_document("doc1", NODES, version=7)
+        self.sleeps = []
+        self.attempts = []
+        self.client = client.DynalistClient(
+            fake_dynalist.TOKEN, api_url=self.server.url, sleep=self.sleeps.append,
+            on_request=lambda endpoint, seconds, outcome: self.attempts.append(
+                (endpoint, outcome)))
+
+    def tearDown(self):
+        self.client.close()
+        self.server.__exit__()
+
+    def test_read_doc(self):
+        """ Read a document, plain and streamed """
+        self.assertEqual(NODES, self.client.read_doc("doc1")["nodes"])
+        data = self.client.read_doc("doc1", stream=True)
+        self.assertEqual(NODES, list(data["nodes"]))
+        self.assertEqual([("doc/read", "Ok")] * 2, self.attempts)
+
+    def test_keep_alive(self):
+        """ Successive calls reuse one connection """
+        for _ in range(5):
+            self.client.check_for_updates(["doc1"])
+        ports = {port for _, _, port in self.server.requests}
+        self.assertEqual(1, len(ports))
+
+    def test_rate_limit_retry(self):
+        """ TooManyRequests and 503s are retried with growing delays """
+        self.server.scripted = [
+            (200, {}, {"_code": "TooManyRequests"}),
+            (503, {}, {}),
+            (429, {"Retry-After": "30"}, {})]
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual({"doc1": 7}, self.client.check_for_updates(["doc1"]))
+        self.assertEqual([1.0, 2.0, 30.0], self.sleeps)
+        self.assertEqual(["TooManyRequests", 503, 429, "Ok"],
+                         [outcome for _, outcome in self.attempts])
+
+    def test_retries_exhausted(self):
+        """ Give up after max_retries """
+        self.server.scripted = [(200, {}, {"_code": "TooManyRequests"})] * 10
+        limited = client.DynalistClient(fake_dynalist.TOKEN, api_url=self.server.url,
+                                        max_retries=2, sleep=self.sleeps.append)
+        with self.assertRaises(dynalist.ApiException), self.assertLogs(level="WARNING"):
+            limited.list_files()
+        self.assertEqual(3, len(self.server.requests))
+        limited.close()
+
+    def test_api_error(self):
+        """ API errors raise ApiException without retrying """
+        bad_client = client.DynalistClient("bad-token", api_url=self.server.url,
+                                           sleep=self.fail)
+        with self.assertRaises(dynalist.ApiException) as context:
+            bad_client.read_doc("doc1")
+        self.assertEqual("InvalidToken", context.exception.code)
+        bad_client.close()
+
+    def test_not_json(self):
+        """ A body that isn't JSON raises ApiException """
+        self.server.scripted = [(404, {}, b"<html>Not found</html>")]
+        with self.assertRaises(dynalist.ApiException) as context:
+            self.client.list_files()
+        self.assertIsNone(context.exception.code)
+        self.assertIn("404", str(context.exception))
+
+    def test_streamed_error_closed(self):
+        """ A streamed response with an error code is closed """
+        self.server.scripted = [(200, {}, {"_code": "NotFound"})]
+        with mock.patch.object(requests.Response, "close", autospec=True) as close:
+            with self.assertRaises(dynalist.ApiException):
+                self.client.read_doc("doc1", stream=True)
+        self.assertTrue(close.called)
+
+    def test_connection_error(self):
+        """ Connection failures are retried, then raise ApiException """
+        url = self.server.url
+        self.server.__exit__()
+        unreachable = client.DynalistClient(fake_dynalist.TOKEN, api_url=url,
+                                            max_retries=1, timeout=1,
+                                            sleep=self.sleeps.append)
+        with self.assertRaises(dynalist.ApiException), self.assertLogs(level="WARNING"):
+            unreachable.list_files()
+        self.assertEqual([1.0], self.sleeps)
+        unreachable.close()
+        self.server = fake_dynalist.FakeDynalist().__enter__()
+
+    def test_edit_doc(self):
+        """ Edits are applied and bump the version """
+        self.client.edit_doc("doc1", [{"action": "edit", "node_id": "a", "content": "b"}])
+        self.assertEqual("b", self.client.read_doc("doc1")["nodes"][1]["content"])
+        self.assertEqual({"doc1": 8}, self.client.check_for_updates(["doc1"]))
+
+    def test_document_from_url(self):
+        """ Document.from_url streams the document through the shared client """
+        with mock.patch.dict(os.environ, {"DYNALIST_API_URL": self.server.url}):
+            for backend in dynalist.BACKENDS:
+                doc = dynalist.Document.from_url(
+                    "https://dynalist.io/d/doc1#z=a", fake_dynalist.TOKEN, backend)
+                self.assertEqual(NODES, doc.get_nodes())
+                self.assertEqual("a", doc.get_metadata()["zoom_node_id"])
+                self.assertEqual(7, doc.get_metadata()["version"])
+
+
+class TestGetApiUrl(unittest.TestCase):
+    """ Tests for client.get_api_url() """
+
+    def test_default(self):
+        """ No URL given -- use Dynalist's """
+        self.assertEqual(client.API_URL, client.get_api_url(None, {}))
+
+    def test_env(self):
+        """ URL from environment, slash added """
+        env = {"DYNALIST_API_URL": "http://localhost:1234/api"}
+        self.assertEqual("http://localhost:1234/api/", client.get_api_url(None, env))
+
+    def test_arg(self):
+        """ URL from argument wins """
+        self.assertEqual("http://a/", client.get_api_url(
+            "http://a/", {"DYNALIST_API_URL": "http://b/"}))
+
+
+# vim: foldmethod=indent
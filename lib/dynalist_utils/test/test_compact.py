@@ -0,0 +1,92 @@
+""" Tests for compact """
+
+# Python
+import json
+import os
+import unittest
+
+# Project
+from dynalist_utils import compact
+from dynalist_utils import dynalist
+from dynalist_utils import markdown
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestCompactStore(unittest.TestCase):
+    """ Tests for compact.CompactStore """
+
+    def setUp(self):
+        self.data = dynalist.load_json_from_file(
+            os.path.join(TEST_DIR, "test_dynalist_collapsed.json"))
+        self.store = compact.CompactStore(self.data["nodes"])
+
+    def test_views_match_nodes(self):
+        """ Every view compares equal to the node dict it came from. """
+        self.assertEqual(len(self.data["nodes"]), len(self.store))
+        for node in self.data["nodes"]:
+            self.assertIn(node["id"], self.store)
+            self.assertEqual(node, self.store[node["id"]])
+            self.assertEqual(node, dict(self.store[node["id"]]))
+
+    def test_api_order(self):
+        """ Iterating the store follows the order nodes were added in. """
+        self.assertEqual([node["id"] for node in self.data["nodes"]],
+                         list(self.store))
+
+    def test_missing(self):
+        """ Missing nodes and fields raise KeyError. """
+        self.assertNotIn("no-such-node", self.store)
+        with self.assertRaises(KeyError):
+            self.store["no-such-node"] # pylint: disable=pointless-statement
+        root = self.store["root"]
+        self.assertNotIn("color", root)
+        self.assertIsNone(root.get("color"))
+        with self.assertRaises(KeyError):
+            root["color"] # pylint: disable=pointless-statement
+
+    def test_extras(self):
+        """ Unknown or out-of-range fields round-trip unchanged. """
+        node = {"id": "a", "content": "x", "color": 1000,
+                "checked": "yes", "custom": [1, 2]}
+        store = compact.CompactStore([node])
+        self.assertEqual(node, store["a"])
+
+
+class TestCompactDocument(unittest.TestCase):
+    """ Tests for Document with the compact backend """
+
+    def test_same_as_dict_backend(self):
+        """ Both backends agree on nodes, tree structure and JSON. """
+        filename = os.path.join(TEST_DIR, "test_dynalist_collapsed.json")
+        expected = dynalist.Document.from_json_file(filename)
+        actual = dynalist.Document.from_json_file(filename, backend="compact")
+        self.assertEqual(expected.get_nodes(), actual.get_nodes())
+        self.assertEqual(expected.get_nodes(order="api"),
+                         actual.get_nodes(order="api"))
+        for node in expected.iter_nodes():
+            node_id = node["id"]
+            self.assertEqual(expected.get_parent(node_id), actual.get_parent(node_id))
+            self.assertEqual(expected.get_depth(node_id), actual.get_depth(node_id))
+            self.assertEqual(expected.get_position(node_id),
+                             actual.get_position(node_id))
+            self.assertTrue(actual.is_ancestor("root", node_id) or node_id == "root")
+        self.assertEqual(json.loads(expected.to_json()), json.loads(actual.to_json()))
+        self.assertEqual(expected.get_metadata()["file_id"],
+                         actual.get_metadata()["file_id"])
+
+    def test_markdown(self):
+        """ Markdown conversion is unchanged by the backend. """
+        filename = os.path.join(TEST_DIR, "test_markdown_collapsed.json")
+        expected = markdown.convert(dynalist.Document.from_json_file(filename), "root")
+        actual = markdown.convert(
+            dynalist.Document.from_json_file(filename, backend="compact"), "root")
+        self.assertEqual(expected, actual)
+
+    def test_invalid_backend(self):
+        """ Unknown backends are rejected. """
+        with self.assertRaises(Exception):
+            dynalist.Document.from_dict({"nodes": []}, backend="invalid")
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,138 @@
+""" Tests for dates """
+
+# Python
+import datetime
+import unittest
+
+# Project
+from dynalist_utils import dates
+from dynalist_utils import dynalist
+
+NODES = [
+    {"id": "root", "content": "root", "note": "", "children": ["a", "b", "c", "d", "e", "f", "g"]},
+    {"id": "a", "content": "Dentist !(2019-04-10 09:30 - 10:00)", "note": ""},
+    {"id": "b", "content": "Rent", "note": "Due !(2019-04-01 | 1m)"},
+    {"id": "c", "content": "Early !(2019-04-10 08:00) and !(2019-05-01)", "note": "",
+     "checked": True},
+    {"id": "d", "content": "Trip !(2019-04-12 - 2019-04-14)", "note": "!(2000-01-01)"},
+    {"id": "e", "content": "Not a date !(2019-02-30)", "note": ""},
+    {"id": "f", "content": "No date", "note": "2019-04-10"},
+    {"id": "g", "content": "Old !(2019-03-01)", "note": ""}]
+
+
+def make_doc(nodes=None, doc_id="doc1"):
+    """ Returns a Document of the given nodes """
+    return dynalist.Document.from_dict({"doc_id": doc_id, "nodes": nodes or NODES})
+
+
+class TestIterDatedNodes(unittest.TestCase):
+    """ Tests for dates.iter_dated_nodes() """
+
+    def test_fields(self):
+        """ Dates, times, ranges and recurrences """
+        found = {item.node_id: item for item in dates.iter_dated_nodes(make_doc())}
+        self.assertEqual(["a", "b", "c", "d", "g"], sorted(found))
+        self.assertEqual(("2019-04-10", "09:30", "", "10:00", ""), found["a"][:5])
+        self.assertEqual(("2019-04-01", "", "", "", "1m"), found["b"][:5])
+        self.assertEqual(("2019-04-10", "08:00", "", "", ""), found["c"][:5])
+        self.assertEqual(("2019-04-12", "", "2019-04-14", "", ""), found["d"][:5])
+        self.assertTrue(found["c"].checked)
+        self.assertFalse(found["a"].checked)
+        self.assertEqual("https://dynalist.io/d/doc1#z=a", found["a"].link)
+
+    def test_first_valid_date(self):
+        """ Invalid dates are passed over for later ones, in the content
+            and then the note; times get two-digit hours """
+        nodes = [{"id": "root", "content": "root", "note": "", "children": ["a", "b"]},
+                 {"id": "a", "content": "Bad !(2019-02-30)", "note": "Good !(2019-04-10 9:30)"},
+                 {"id": "b", "content": "!(2019-13-01) !(2019-04-10 10:00 - 9:45)",
+                  "note": ""}]
+        found = {item.node_id: item for item in dates.iter_dated_nodes(make_doc(nodes))}
+        self.assertEqual(("2019-04-10", "09:30", "", ""), found["a"][:4])
+        self.assertEqual(("2019-04-10", "10:00", "", "09:45"), found["b"][:4])
+        index = dates.DateIndex(found.values())
+        self.assertEqual(["a", "b"], [item.node_id for item in index.get_range()])
+
+    def test_compact(self):
+        """ Dated nodes copy their text out of a compact document """
+        doc = dynalist.Document.from_dict({"doc_id": "doc1", "nodes": NODES}, "compact")
+        items = list(dates.iter_dated_nodes(doc))
+        self.assertEqual(5, len(items))
+        for item in items:
+            self.assertTrue(all(isinstance(value, (str, bool)) for value in item), item)
+        self.assertIn("Rent", [item.content for item in items])
+
+
+class TestDateIndex(unittest.TestCase):
+    """ Tests for dates.DateIndex """
+
+    def setUp(self):
+        other = [{"id": "root", "content": "root", "note": "", "children": ["x"]},
+                 {"id": "x", "content": "Other !(2019-04-11)", "note": ""}]
+        self.index = dates.DateIndex.from_documents([make_doc(), make_doc(other, "doc2")])
+
+    def ids(self, items):
+        """ Returns the node ids of the items """
+        return [item.node_id for item in items]
+
+    def test_ranges(self):
+        """ Ranges are half-open and sorted by date, then time """
+        day = datetime.date(2019, 4, 10)
+        self.assertEqual(6, len(self.index))
+        self.assertEqual(["c", "a"], self.ids(self.index.get_day(day)))
+        self.assertEqual(["a"], self.ids(self.index.get_day(day, include_checked=False)))
+        self.assertEqual(["g", "b"], self.ids(self.index.get_range(None, day)))
+        self.assertEqual(["x", "d"], self.ids(self.index.get_range(
+            day + datetime.timedelta(days=1), None)))
+        self.assertEqual(["g", "b", "c", "a", "x", "d"], self.ids(self.index.get_range()))
+        self.assertEqual([], self.index.get_range(datetime.date(2020, 1, 1)))
+
+    def test_links(self):
+        """ Each node links to its own document """
+        links = [item.link for item in self.index.get_range()]
+        self.assertIn("https://dynalist.io/d/doc2#z=x", links)
+        self.assertIn("https://dynalist.io/d/doc1#z=g", links)
+
+    def test_add_discard(self):
+        """ Nodes added and discarded keep the order """
+        node = {"id": "y", "content": "New !(2019-04-10 09:00)", "note": ""}
+        item = dates.get_dated_node(node, "https://dynalist.io/d/doc2#z=")
+        self.index.add(item)
+        day = datetime.date(2019, 4, 10)
+        self.assertEqual(["c", "y", "a"], self.ids(self.index.get_day(day)))
+        self.assertEqual(["y", "a"], self.ids(self.index.get_day(day, include_checked=False)))
+        self.index.discard("https://dynalist.io/d/doc1#z=c")
+        self.index.discard("https://dynalist.io/d/doc1#z=missing")
+        self.assertEqual(["y", "a"], self.ids(self.index.get_day(day)))
+        self.assertEqual(6, len(self.index))
+
+    def test_update(self):
+        """ Only new, changed and removed nodes are looked at again """
+        old_doc = make_doc()
+        index = dates.DateIndex.from_documents([old_doc])
+        nodes = [dict(node) for node in NODES]
+        nodes[1]["content"] = "Dentist !(2019-04-11)"
+        nodes[3]["checked"] = False
+        nodes[0]["children"] = ["a", "b", "c", "d", "e", "f", "z"]
+        nodes[7] = {"id": "z", "content": "New !(2019-04-01)", "note": ""}
+        new_doc = make_doc(nodes)
+        self.assertEqual(4, index.update(old_doc, new_doc))
+        expected = dates.DateIndex.from_documents([new_doc])
+        for include_checked in (True, False):
+            self.assertEqual(
+                [(item.link, item.date) for item in expected.get_range(None, None,
+                                                                       include_checked)],
+                [(item.link, item.date) for item in index.get_range(None, None,
+                                                                    include_checked)])
+
+    def test_group(self):
+        """ Ranges from several indexes are merged in order """
+        first = dates.DateIndex.from_documents([make_doc()])
+        other = [{"id": "root", "content": "root", "note": "", "children": ["x"]},
+                 {"id": "x", "content": "Other !(2019-04-10 09:00)", "note": ""}]
+        group = dates.IndexGroup([first, dates.DateIndex.from_documents([make_doc(other)])])
+        self.assertEqual(6, len(group))
+        self.assertEqual(["c", "x", "a"], self.ids(group.get_day(datetime.date(2019, 4, 10))))
+
+
+# vim: foldmethod=indent
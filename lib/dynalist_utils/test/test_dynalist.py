@@ -3,6 +3,9 @@
 # Python
 import json
 import os
+import pickle
+import tempfile
+import time
 import unittest
 
 # Project
@@ -70,6 +73,48 @@ class TestParseURL(unittest.TestCase):
         }
         self.assertEqual(expected, result)
 
+    def test_dynalist_encoded_query_url(self):
+        """ The query is percent-decoded, so it searches as typed """
+        result = dynalist.parse_url("https://dynalist.io/d/abc#q=%23todo%20-is%3Acompleted")
+        self.assertEqual("#todo -is:completed", result["query"])
+        doc = dynalist.Document.from_dict({"nodes": [
+            {"id": "root", "content": "root", "note": "", "children": ["a", "b", "c"]},
+            {"id": "a", "content": "Open #todo", "note": ""},
+            {"id": "b", "content": "Done #todo", "note": "", "checked": True},
+            {"id": "c", "content": "Other", "note": ""}]})
+        self.assertEqual(["a"], [node["id"] for node in doc.search(result["query"])])
+
+    def test_dynalist_url_variants(self):
+        """ URLs without a scheme, with extra fragment parameters, etc. """
+        cases = [
+            ("dynalist.io/d/abc#z=n1", ("abc", "n1", "")),
+            ("http://www.dynalist.io/d/abc/", ("abc", "", "")),
+            ("https://dynalist.io/d/abc#theme=dark&z=n1", ("abc", "n1", "")),
+            ("https://dynalist.io/d/abc#z=n1&theme=dark", ("abc", "n1", "")),
+            ("https://dynalist.io/d/abc#z=n1&q=a&b", ("abc", "n1", "a&b")),
+            ("https://dynalist.io/d/abc#z=", ("abc", "", ""))]
+        for url, (doc_id, zoom_node_id, query) in cases:
+            expected = {"doc_id": doc_id, "zoom_node_id": zoom_node_id, "query": query}
+            self.assertEqual(expected, dynalist.parse_url(url), url)
+        for url in ("https://dynalist.io/d/abc#z=bad!", "https://dynalist.io/d/",
+                    "https://dynalist.io/d/abc extra", 42):
+            with self.assertRaises(dynalist.ParseException, msg=url):
+                dynalist.parse_url(url)
+
+    def test_url_with_line_break(self):
+        """ Repeated q= parameters before a line break fail fast """
+        url = "https://dynalist.io/d/abc#" + "q=&" * 40 + "\nnext line"
+        start = time.perf_counter()
+        with self.assertRaises(dynalist.ParseException):
+            dynalist.parse_url(url)
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_memoized_results_are_copies(self):
+        """ Changing a result doesn't change later results """
+        url = "https://dynalist.io/d/abc#z=n1"
+        dynalist.parse_url(url)["zoom_node_id"] = "changed"
+        self.assertEqual("n1", dynalist.parse_url(url)["zoom_node_id"])
+
 
 class TestGetIndexByNodeId(unittest.TestCase):
     """ Tests for dynalist.get_index_by_node_id() """
@@ -166,6 +211,50 @@ class TestDocument(unittest.TestCase):
         with self.assertRaises(Exception):
             doc.get_nodes(order="invalid_order")
 
+    def test_iter_nodes_orders(self):
+        """ Test lazily iterating nodes in each traversal order. """
+        doc = dynalist.Document.from_json_file(
+            os.path.join(TEST_DIR, "test_dynalist_collapsed.json"))
+        tree = [node["id"] for node in doc.iter_nodes()]
+        self.assertEqual([node["id"] for node in doc.get_nodes()], tree)
+        post = [node["id"] for node in doc.iter_nodes(order="post")]
+        breadth = [node["id"] for node in doc.iter_nodes(order="breadth")]
+        self.assertEqual(sorted(tree), sorted(post))
+        self.assertEqual(sorted(tree), sorted(breadth))
+        self.assertEqual("root", tree[0])
+        self.assertEqual("root", post[-1])
+        self.assertEqual("root", breadth[0])
+        with self.assertRaises(Exception):
+            doc.iter_nodes(order="invalid_order")
+
+    def test_iter_descendents_post_order(self):
+        """ Test that children come before their parents in post-order. """
+        doc = dynalist.Document.from_json_file(
+            os.path.join(TEST_DIR, "test_dynalist_collapsed.json"))
+        seen = set()
+        for node in doc.iter_descendents("root", order="post"):
+            for child_id in node.get("children", []):
+                self.assertIn(child_id, seen)
+            seen.add(node["id"])
+        with self.assertRaises(Exception):
+            doc.iter_descendents("root", order="invalid_order")
+
+    def test_iter_descendents_deep(self):
+        """ Test that deep outlines don't hit the recursion limit. """
+        depth = 5000
+        nodes = [{"id": "root", "content": "", "note": "", "children": ["n0"]}]
+        for i in range(depth):
+            node = {"id": "n{}".format(i), "content": str(i), "note": ""}
+            if i + 1 < depth:
+                node["children"] = ["n{}".format(i + 1)]
+            nodes.append(node)
+        doc = dynalist.Document.from_dict({"nodes": nodes})
+        self.assertEqual(depth, len(doc.get_descendents("root")))
+        post = list(doc.iter_descendents("root", order="post"))
+        self.assertEqual("n{}".format(depth - 1), post[0]["id"])
+        breadth = list(doc.iter_descendents("root", order="breadth"))
+        self.assertEqual("n0", breadth[0]["id"])
+
     def test_get_metadata(self):
         """ Test getting metadata of the document. """
         doc = dynalist.Document.from_json_file(
@@ -188,4 +277,111 @@ class TestDocument(unittest.TestCase):
         attendees = doc.get_node("1zsUGsZAwJUQE90HFBpYmKpS")
         self.assertTrue(attendees["collapsed"])
 
+
+class TestTreeIndex(unittest.TestCase):
+    """ Tests for the parent/depth/ancestor index on Document """
+
+    def setUp(self):
+        self.doc = dynalist.Document.from_json_file(
+            os.path.join(TEST_DIR, "test_dynalist_collapsed.json"))
+
+    def test_get_parent(self):
+        """ Every child's parent is the node that lists it. """
+        self.assertIsNone(self.doc.get_parent("root"))
+        for node in self.doc.iter_nodes():
+            for position, child_id in enumerate(node.get("children", [])):
+                self.assertIs(node, self.doc.get_parent(child_id))
+                self.assertEqual(position, self.doc.get_position(child_id))
+
+    def test_get_depth_and_path(self):
+        """ Depth matches the length of the path from the root. """
+        self.assertEqual(0, self.doc.get_depth("root"))
+        for node in self.doc.iter_nodes():
+            path = self.doc.get_path(node["id"])
+            self.assertEqual(self.doc.get_depth(node["id"]), len(path) - 1)
+            self.assertEqual("root", path[0]["id"])
+            self.assertIs(node, path[-1])
+
+    def test_is_ancestor(self):
+        """ Ancestors are exactly the nodes on the path, minus the node. """
+        nodes = self.doc.get_nodes()
+        for node in nodes:
+            path_ids = {path_node["id"]
+                        for path_node in self.doc.get_path(node["id"])}
+            path_ids.discard(node["id"])
+            for other in nodes:
+                self.assertEqual(other["id"] in path_ids,
+                                 self.doc.is_ancestor(other["id"], node["id"]))
+
+
+class TestSnapshot(unittest.TestCase):
+    """ Tests for Document snapshots """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "doc.snapshot")
+        self.json_filename = os.path.join(TEST_DIR, "test_dynalist_collapsed.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """ A reloaded snapshot matches the original in either backend """
+        for backend in dynalist.BACKENDS:
+            doc = dynalist.Document.from_json_file(self.json_filename, backend)
+            doc.save_snapshot(self.filename)
+            loaded = dynalist.Document.from_snapshot(self.filename)
+            self.assertEqual(backend, loaded.get_backend())
+            self.assertEqual(doc.to_json(), loaded.to_json())
+            self.assertEqual(doc.get_nodes(), loaded.get_nodes())
+            for node in doc.iter_nodes():
+                self.assertEqual(doc.get_path(node["id"]), loaded.get_path(node["id"]))
+
+    def test_change_backend(self):
+        """ A snapshot can be reloaded into a different backend """
+        doc = dynalist.Document.from_json_file(self.json_filename)
+        doc.save_snapshot(self.filename)
+        loaded = dynalist.Document.from_snapshot(self.filename, backend="compact")
+        self.assertEqual("compact", loaded.get_backend())
+        self.assertEqual(json.loads(doc.to_json()), json.loads(loaded.to_json()))
+
+    def test_not_a_snapshot(self):
+        """ Other pickles are rejected """
+        with open(self.filename, "wb") as outfile:
+            pickle.dump([1, 2, 3], outfile)
+        with self.assertRaises(dynalist.ParseException):
+            dynalist.Document.from_snapshot(self.filename)
+
+
+class TestLinkIndex(unittest.TestCase):
+    """ Tests for the link index on Document """
+
+    def setUp(self):
+        self.data = {"file_id": "doc1", "nodes": [
+            {"id": "root", "content": "root", "note": "", "children": ["a", "b", "c"]},
+            {"id": "a", "content": "[see b](https://dynalist.io/d/doc1#z=b)",
+             "note": "also https://www.example.com"},
+            {"id": "b", "content": "b", "note": "[mirror](https://dynalist.io/d/doc1#z=a)"},
+            {"id": "c", "content": "[b again](https://dynalist.io/d/doc1#z=b) "
+                                   "[other doc](https://dynalist.io/d/doc2#z=b) "
+                                   "[gone](https://dynalist.io/d/doc1#z=zzz)", "note": ""}]}
+
+    def test_links(self):
+        """ Outgoing links, backlinks and iteration in both backends """
+        for backend in dynalist.BACKENDS:
+            doc = dynalist.Document.from_dict(dict(self.data), backend)
+            links = doc.get_links("a")
+            self.assertEqual(["see b", ""], [link.title for link in links])
+            self.assertEqual("b", links[0].target["zoom_node_id"])
+            self.assertIsNone(links[1].target)
+            self.assertEqual([], doc.get_links("root"))
+            self.assertEqual(["a", "c"],
+                             [link.source_id for link in doc.get_backlinks("b")])
+            self.assertEqual(["b"], [link.source_id for link in doc.get_backlinks("a")])
+            self.assertEqual(["c"], [link.source_id for link in doc.get_backlinks("zzz")])
+            self.assertEqual([], doc.get_backlinks("c"))
+            self.assertEqual(["a", "a", "b", "c", "c", "c"],
+                             [link.source_id for link in doc.iter_links()])
+
+
 # vim: foldmethod=indent
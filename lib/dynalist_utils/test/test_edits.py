@@ -0,0 +1,110 @@
+""" Tests for edits """
+
+# Python
+import unittest
+
+# Project
+from dynalist_utils import batch
+from dynalist_utils import client
+from dynalist_utils import dynalist
+from dynalist_utils import edits
+from dynalist_utils.test import fake_dynalist
+
+NODES = [{"id": "root", "content": "root", "note": "",
+          "children": ["n{}".format(i) for i in range(10)]}]
+NODES.extend({"id": "n{}".format(i), "content": "old {}".format(i), "note": ""}
+             for i in range(10))
+
+
+def make_changes(count=10):
+    """ Returns edit changes for the first count nodes """
+    return [{"action": "edit", "node_id": "n{}".format(i), "content": "new {}".format(i)}
+            for i in range(count)]
+
+
+class TestApplyEdits(unittest.TestCase):
+    """ Tests for edits.apply_edits() against a local stand-in server """
+
+    def setUp(self):
+        self.server = fake_dynalist.FakeDynalist().__enter__()
+        self.server.add_document("doc1", NODES)
+        self.api = client.DynalistClient(fake_dynalist.TOKEN, api_url=self.server.url,
+                                         sleep=lambda seconds: None)
+
+    def tearDown(self):
+        self.api.close()
+        self.server.__exit__()
+
+    def get_edit_sizes(self):
+        """ Returns the number of changes in each /doc/edit request """
+        return [len(body["changes"]) for endpoint, body, _ in self.server.requests
+                if endpoint == "doc/edit"]
+
+    def test_chunks(self):
+        """ Changes go in chunks, paced by the limiter """
+        acquired = []
+        limiter = batch.RateLimiter(1000, 1, sleep=lambda seconds: None)
+        limiter.acquire = lambda: acquired.append(True)
+        report = edits.apply_edits(self.api, "doc1", make_changes(), chunk_size=4,
+                                   limiter=limiter)
+        self.assertEqual((10, 10, [], 3), report[:4])
+        self.assertEqual([4, 4, 2], self.get_edit_sizes())
+        self.assertEqual(3, len(acquired))
+        doc = dynalist.Document.from_dict(self.api.read_doc("doc1"))
+        self.assertEqual([], edits.verify_edits(doc, make_changes()))
+        self.assertIn("Applied 10 of 10 changes in 3 requests", edits.format_report(report))
+
+    def test_rejected_chunk(self):
+        """ A rejected chunk is split until the bad change is found """
+        changes = make_changes(8)
+        changes[5]["node_id"] = "missing"
+        report = edits.apply_edits(self.api, "doc1", changes, chunk_size=8)
+        self.assertEqual(7, report.applied)
+        self.assertEqual([changes[5]], [failed.change for failed in report.failed])
+        self.assertEqual([8, 4, 4, 2, 1, 1, 2], self.get_edit_sizes())
+
+    def test_bad_token(self):
+        """ Errors no change could cause are raised without splitting """
+        api = client.DynalistClient("bad-token", api_url=self.server.url,
+                                    sleep=lambda seconds: None)
+        with self.assertRaises(dynalist.ApiException) as context:
+            edits.apply_edits(api, "doc1", make_changes(8), chunk_size=8)
+        api.close()
+        self.assertEqual("InvalidToken", context.exception.code)
+        self.assertEqual([8], self.get_edit_sizes())
+
+    def test_transient_failure(self):
+        """ A chunk that keeps failing transiently isn't split """
+        self.server.scripted = [(503, {}, {})] * 6
+        with self.assertLogs(level="WARNING"):
+            report = edits.apply_edits(self.api, "doc1", make_changes(4), chunk_size=2)
+        self.assertEqual((2, 2, 2), (report.applied, len(report.failed), report.requests))
+
+    def test_results(self):
+        """ Changes the API reports as not applied are failures """
+        self.server.scripted = [(200, {}, {"_code": "Ok", "results": [True, False]})]
+        report = edits.apply_edits(self.api, "doc1", make_changes(2))
+        self.assertEqual(1, report.applied)
+        self.assertEqual("n1", report.failed[0].change["node_id"])
+
+
+class TestDiff(unittest.TestCase):
+    """ Tests for edits.format_diff() and verify_edits() """
+
+    def test_format_diff(self):
+        """ One line per node, with old and new values """
+        doc = dynalist.Document.from_dict({"nodes": NODES})
+        changes = [{"action": "edit", "node_id": "n1", "content": "x" * 50, "color": 2}]
+        self.assertEqual(["~ n1: content 'old 1' -> '" + "x" * 36 + "...; color 0 -> 2"],
+                         edits.format_diff(doc, changes))
+
+    def test_verify(self):
+        """ Unset fields compare as their defaults """
+        doc = dynalist.Document.from_dict({"nodes": NODES})
+        changes = [{"action": "edit", "node_id": "n1", "content": "old 1", "color": 0},
+                   {"action": "edit", "node_id": "n2", "note": "new"},
+                   {"action": "edit", "node_id": "gone", "note": ""}]
+        self.assertEqual(changes[1:], edits.verify_edits(doc, changes))
+
+
+# vim: foldmethod=indent
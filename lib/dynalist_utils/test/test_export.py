@@ -0,0 +1,141 @@
+""" Tests for export """
+
+# Python
+import copy
+import os
+import tempfile
+import unittest
+
+# Project
+from dynalist_utils import dynalist
+from dynalist_utils import export
+from dynalist_utils import html_export
+from dynalist_utils import markdown
+
+NODES = [
+    {"id": "root", "content": "Manual", "note": "", "children": ["s1", "s2", "s3"]},
+    {"id": "s1", "content": "Getting Started!", "note": "", "children": ["s1a"]},
+    {"id": "s1a", "content": "Install", "note": "pip install"},
+    {"id": "s2", "content": "Reference", "note": "", "collapsed": True, "children": ["s2a"]},
+    {"id": "s2a", "content": "API", "note": ""},
+    {"id": "s3", "content": "***", "note": ""}]
+
+
+class TestExportSubtrees(unittest.TestCase):
+    """ Tests for export.export_subtrees() """
+
+    def setUp(self):
+        self.doc = dynalist.Document.from_dict({"nodes": NODES})
+        self.outdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.outdir.cleanup()
+
+    def check_export(self, **kwargs):
+        """ Export every section and compare with markdown.convert """
+        results = list(export.export_subtrees(self.doc, ["s1", "s2", "s3"],
+                                              self.outdir.name, max_workers=2, **kwargs))
+        self.assertEqual({None}, {result.error for result in results})
+        filenames = {result.node_id: os.path.basename(result.filename) for result in results}
+        self.assertEqual({"s1": "1-getting-started.md", "s2": "2-reference.md",
+                          "s3": "3-s3.md"}, filenames)
+        for node_id, filename in filenames.items():
+            with open(os.path.join(self.outdir.name, filename)) as infile:
+                self.assertEqual(markdown.convert(self.doc, node_id), infile.read())
+
+    def test_fork(self):
+        """ Workers inherit the document """
+        self.check_export(start_method="fork")
+
+    def test_snapshot(self):
+        """ Workers load the document from a snapshot """
+        self.check_export(start_method="spawn")
+
+    def test_errors(self):
+        """ A missing node is reported without stopping the others """
+        results = list(export.export_subtrees(self.doc, ["s1", "nope"], self.outdir.name,
+                                              fmt="html", max_workers=1))
+        errors = {result.node_id: result.error for result in results}
+        self.assertIsNone(errors["s1"])
+        self.assertIn("nope", str(errors["nope"]))
+        self.assertEqual(["1-getting-started.html"], os.listdir(self.outdir.name))
+        with self.assertRaises(Exception):
+            list(export.export_subtrees(self.doc, ["s1"], self.outdir.name, fmt="pdf"))
+
+
+class TestExportIncremental(unittest.TestCase):
+    """ Tests for export.export_incremental() """
+
+    def setUp(self):
+        self.outdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.outdir.name, "doc.md")
+
+    def tearDown(self):
+        self.outdir.cleanup()
+
+    def export(self, nodes, version=None, **kwargs):
+        """ Export the nodes and check the output matches a full render """
+        doc = dynalist.Document.from_dict({"version": version, "nodes": nodes})
+        result = export.export_incremental(doc, "root", self.filename, **kwargs)
+        with open(self.filename) as infile:
+            if kwargs.get("fmt") == "html":
+                expected = html_export.convert(doc, "root", kwargs.get("css"))
+            else:
+                expected = markdown.convert(doc, "root")
+            self.assertEqual(expected, infile.read())
+        return result
+
+    def test_changes(self):
+        """ Only changed sections are rendered again """
+        nodes = copy.deepcopy(NODES)
+        self.assertEqual((5, 0), self.export(nodes))
+        modified = os.stat(self.filename).st_mtime_ns
+        self.assertEqual((0, 5), self.export(nodes))
+        self.assertEqual(modified, os.stat(self.filename).st_mtime_ns)
+        nodes[4]["content"] = "API changed"
+        self.assertEqual((1, 4), self.export(nodes))
+        nodes[3]["collapsed"] = False
+        nodes[0]["note"] = "New intro"
+        self.assertEqual((2, 3), self.export(nodes))
+        nodes[0]["children"] = ["s3", "s1"]
+        self.assertEqual((0, 4), self.export(nodes))
+
+    def test_version(self):
+        """ An unchanged version skips rendering altogether """
+        nodes = copy.deepcopy(NODES)
+        self.export(nodes, version=3)
+        nodes[2]["note"] = "ignored, same version"
+        doc = dynalist.Document.from_dict({"version": 3, "nodes": nodes})
+        self.assertEqual((0, 5), export.export_incremental(doc, "root", self.filename))
+        self.assertEqual((1, 4), self.export(nodes, version=4))
+
+    def test_edited_output(self):
+        """ Output changed since the last run is rendered again in full """
+        self.export(NODES)
+        with open(self.filename, "a") as outfile:
+            outfile.write("extra")
+        self.assertEqual((5, 0), self.export(NODES))
+        os.remove(self.filename + ".manifest.json")
+        self.assertEqual((5, 0), self.export(NODES))
+
+    def test_html(self):
+        """ HTML pages, rendered again when the stylesheet changes """
+        self.assertEqual((5, 0), self.export(NODES, fmt="html", css="h1 {}"))
+        self.assertEqual((0, 5), self.export(NODES, fmt="html", css="h1 {}"))
+        self.assertEqual((5, 0), self.export(NODES, fmt="html", css="h2 {}"))
+
+
+class TestMakeFilenames(unittest.TestCase):
+    """ Tests for export.make_filenames() """
+
+    def test_numbering(self):
+        """ Numbers are padded so files sort in order """
+        doc = dynalist.Document.from_dict({"nodes": NODES})
+        filenames = export.make_filenames(doc, ["s3", "s1"], ".md")
+        self.assertEqual(["1-s3.md", "2-getting-started.md"], list(filenames.values()))
+        many = export.make_filenames(doc, ["n{}".format(i) for i in range(12)], ".md")
+        self.assertEqual("01-n0.md", many["n0"])
+        self.assertEqual("12-n11.md", many["n11"])
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,89 @@
+""" Tests for html_export """
+
+# Python
+import io
+import os
+import unittest
+
+# Project
+from dynalist_utils import dynalist
+from dynalist_utils import html_export
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+NODES = [
+    {"id": "root", "content": "Doc", "note": "Intro\n\nSecond line", "children": ["h", "c"]},
+    {"id": "h", "content": "Header **bold**", "note": "", "children": ["h1"]},
+    {"id": "h1", "content": "Sub", "note": ""},
+    {"id": "c", "content": "Collapsed", "note": "", "collapsed": True, "children": ["a", "b"]},
+    {"id": "a", "content": "a", "note": "", "children": ["a1"]},
+    {"id": "a1", "content": "a1", "note": "a1 note"},
+    {"id": "b", "content": "b", "note": ""}]
+
+class TestConvert(unittest.TestCase):
+    """ tests for html_export.convert() """
+
+    def test_layout(self):
+        """ Headers, notes and nested lists follow the Markdown layout """
+        doc = dynalist.Document.from_dict({"nodes": NODES})
+        expected = ("<h1>Doc</h1>\n<p>Intro</p>\n<p>Second line</p>\n"
+                    "<h2>Header <strong>bold</strong></h2>\n"
+                    "<h3>Sub</h3>\n"
+                    "<h2>Collapsed</h2>\n"
+                    "<ul>\n<li>a<ul>\n<li>a1\n<p>a1 note</p>\n</li>\n</ul>\n</li>\n"
+                    "<li>b</li>\n</ul>\n")
+        self.assertEqual(expected, "".join(html_export.iter_html(doc, "root")))
+
+    def test_page(self):
+        """ A standalone page with the stylesheet inlined """
+        doc = dynalist.Document.from_json_file(
+            os.path.join(TEST_DIR, "test_markdown_collapsed.json"), "compact")
+        page = html_export.convert(doc, "root", css="h1 { color: red; }")
+        self.assertTrue(page.startswith("<!DOCTYPE html>\n<html>\n<head>\n"))
+        self.assertIn("<title>Test Doc</title>", page)
+        self.assertIn("<style>\nh1 { color: red; }\n</style>", page)
+        self.assertIn("<h2>Attendees (should be collapsed)</h2>\n<ul>\n<li>Alan</li>\n", page)
+        self.assertEqual(page.count("<ul>"), page.count("</ul>"))
+        self.assertEqual(page.count("<li>"), page.count("</li>"))
+        outfile = io.StringIO()
+        html_export.write(doc, "root", outfile, css="h1 { color: red; }")
+        self.assertEqual(page, outfile.getvalue())
+
+    def test_lists_at_depth(self):
+        """ Starting inside a collapsed node opens enclosing lists """
+        doc = dynalist.Document.from_dict({"nodes": NODES})
+        self.assertEqual("<ul>\n<li>\n<ul>\n<li>b</li>\n</ul>\n</li>\n</ul>\n",
+                         "".join(html_export.iter_html(doc, "b", False, 1, 2)))
+
+class TestConvertInline(unittest.TestCase):
+    """ tests for html_export.convert_inline() """
+
+    def test_styles(self):
+        """ Dynalist styling, links and escaping """
+        tests = [
+            ("a < b & c", "a &lt; b &amp; c"),
+            ("**bold** __italic__ ~~gone~~",
+             "<strong>bold</strong> <em>italic</em> <del>gone</del>"),
+            ("`**not bold** <x>`", "<code>**not bold** &lt;x&gt;</code>"),
+            ("[**Example**](https://example.com/?a=1&b=2)",
+             "<a href=\"https://example.com/?a=1&amp;b=2\"><strong>Example</strong></a>"),
+            ("see https://example.com now",
+             "see <a href=\"https://example.com\">https://example.com</a> now"),
+            ("![cat](https://example.com/cat.png)",
+             "<img src=\"https://example.com/cat.png\" alt=\"cat\">")]
+        for source, expected in tests:
+            self.assertEqual(expected, html_export.convert_inline(source), source)
+
+    def test_unsafe_urls(self):
+        """ Only http, https, mailto and relative URLs become links """
+        tests = [
+            ("[x](javascript:alert(1))", "[x](javascript:alert(1))"),
+            ("[x](JavaScript:alert)", "[x](JavaScript:alert)"),
+            ("![x](data:image/png;base64,AAAA)", "![x](data:image/png;base64,AAAA)"),
+            ("[x](\x01javascript:alert)", "[x](\x01javascript:alert)"),
+            ("[mail](mailto:a@example.com)", "<a href=\"mailto:a@example.com\">mail</a>"),
+            ("[up](../index.html)", "<a href=\"../index.html\">up</a>")]
+        for source, expected in tests:
+            self.assertEqual(expected, html_export.convert_inline(source), source)
+
+# vim: foldmethod=indent
@@ -0,0 +1,81 @@
+""" Tests for jsonstream """
+
+# Python
+import io
+import json
+import os
+import unittest
+
+# Project
+from dynalist_utils import dynalist
+from dynalist_utils import jsonstream
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+def load_all(text, chunk_size):
+    """ Loads text with jsonstream and exhausts the nodes iterator. """
+    data = jsonstream.load(io.StringIO(text), chunk_size)
+    if "nodes" in data:
+        data["nodes"] = list(data["nodes"])
+    return data
+
+
+class TestLoad(unittest.TestCase):
+    """ Tests for jsonstream.load() """
+
+    def test_matches_json_load(self):
+        """ Every chunk size gives the same result as json.load """
+        filename = os.path.join(TEST_DIR, "test_dynalist_collapsed.json")
+        with open(filename) as infile:
+            text = infile.read()
+        expected = json.loads(text)
+        for chunk_size in (1, 2, 3, 7, 64, 100000):
+            self.assertEqual(expected, load_all(text, chunk_size), chunk_size)
+
+    def test_binary_stream(self):
+        """ Binary streams are decoded as UTF-8, even across chunks """
+        text = json.dumps({"nodes": [{"id": "root", "content": "café ☃"}]},
+                          ensure_ascii=False)
+        for chunk_size in (1, 2, 5):
+            data = jsonstream.load(io.BytesIO(text.encode("utf-8")), chunk_size)
+            self.assertEqual(json.loads(text)["nodes"], list(data["nodes"]))
+
+    def test_fields_after_nodes(self):
+        """ Fields after the nodes array appear once nodes are consumed """
+        text = '{"_code": "Ok", "nodes": [{"id": "root"}], "version": 12345}'
+        data = jsonstream.load(io.StringIO(text), 4)
+        self.assertEqual("Ok", data["_code"])
+        self.assertNotIn("version", data)
+        self.assertEqual([{"id": "root"}], list(data["nodes"]))
+        self.assertEqual(12345, data["version"])
+
+    def test_no_nodes(self):
+        """ Objects without nodes, such as API errors, load whole """
+        self.assertEqual({"_code": "InvalidToken", "_msg": "x"},
+                         load_all('{"_code": "InvalidToken", "_msg": "x"}', 3))
+        self.assertEqual({}, load_all(" { } ", 1))
+        self.assertEqual({"nodes": []}, load_all('{"nodes": [ ]}', 1))
+
+    def test_invalid(self):
+        """ Malformed JSON raises JSONDecodeError """
+        for text in ("", "[]", '{"a" 1}', '{"a": 1', '{"nodes": [{"id": 1}',
+                     '{"nodes": [1 2]}', '{"nodes": [], "nodes": []}'):
+            with self.assertRaises(json.JSONDecodeError, msg=text):
+                load_all(text, 2)
+
+
+class TestDocumentFromStream(unittest.TestCase):
+    """ Tests for streaming Document construction """
+
+    def test_backends(self):
+        """ Both backends build the same document from a stream """
+        filename = os.path.join(TEST_DIR, "test_dynalist_collapsed.json")
+        expected = dynalist.load_json_from_file(filename)
+        for backend in dynalist.BACKENDS:
+            with open(filename, "rb") as stream:
+                doc = dynalist.Document.from_json_stream(stream, backend)
+            self.assertEqual(expected, json.loads(doc.to_json()), backend)
+
+
+# vim: foldmethod=indent
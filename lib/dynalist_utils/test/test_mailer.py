@@ -0,0 +1,83 @@
+""" Tests for mailer """
+
+# Python
+from email.mime.text import MIMEText
+import unittest
+
+# Project
+from dynalist_utils import mailer
+from dynalist_utils.test import fake_smtp
+
+
+def make_message(number):
+    """ Returns a small test email """
+    message = MIMEText("Body {}".format(number))
+    message["From"] = "from@example.com"
+    message["To"] = "to{}@example.com".format(number)
+    message["Subject"] = "Message {}".format(number)
+    return message
+
+
+class TestMailer(unittest.TestCase):
+    """ Tests for mailer.Mailer against a local stand-in server """
+
+    def setUp(self):
+        self.server = fake_smtp.FakeSmtp().__enter__()
+        self.sleeps = []
+        self.mailer = mailer.Mailer(self.server.host, fake_smtp.USERNAME, fake_smtp.PASSWORD,
+                                    security="none", sleep=self.sleeps.append)
+
+    def tearDown(self):
+        self.mailer.close()
+        self.server.__exit__()
+
+    def test_one_connection(self):
+        """ Many messages go over one connection and one login """
+        for number in range(10):
+            self.mailer.send(make_message(number))
+        self.mailer.close()
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(1, self.server.logins)
+        self.assertEqual(["Message {}".format(number) for number in range(10)],
+                         [message["Subject"] for _, _, message in self.server.messages])
+        self.assertEqual(["<to3@example.com>"], self.server.messages[3][1])
+
+    def test_reconnect(self):
+        """ A dropped connection is reopened and the message sent again """
+        self.server.drop_after = 2
+        with self.assertLogs(level="WARNING"):
+            for number in range(5):
+                self.mailer.send(make_message(number))
+        self.assertEqual(5, len(self.server.messages))
+        self.assertEqual(3, self.mailer.get_connection_count())
+
+    def test_transient_error(self):
+        """ 4xx replies are retried with growing delays """
+        self.server.scripted = ["451 Try again later", "421 Too busy"]
+        with self.assertLogs(level="WARNING"):
+            self.mailer.send(make_message(1))
+        self.assertEqual([1.0, 2.0], self.sleeps)
+        self.assertEqual(1, len(self.server.messages))
+
+    def test_permanent_error(self):
+        """ 5xx replies and failed logins are not retried """
+        self.server.scripted = ["550 No such sender"]
+        with self.assertRaises(mailer.MailerException):
+            self.mailer.send(make_message(1))
+        bad_login = mailer.Mailer(self.server.host, "user", "wrong", security="none",
+                                  sleep=self.fail)
+        with self.assertRaises(mailer.MailerException):
+            bad_login.send(make_message(2))
+        self.assertEqual([], self.server.messages)
+
+    def test_retries_exhausted(self):
+        """ Give up after max_retries """
+        self.server.scripted = ["421 Too busy"] * 5
+        limited = mailer.Mailer(self.server.host, fake_smtp.USERNAME, fake_smtp.PASSWORD,
+                                security="none", max_retries=2, sleep=self.sleeps.append)
+        with self.assertRaises(mailer.MailerException), self.assertLogs(level="WARNING"):
+            limited.send(make_message(1))
+        self.assertEqual([1.0, 2.0], self.sleeps)
+
+
+# vim: foldmethod=indent
@@ -2,8 +2,10 @@
 
 # Python
 import json
+import io
 import os
 import pathlib
+import sys
 import unittest
 
 # Project
@@ -87,6 +89,48 @@ class TestConvert(unittest.TestCase):
         actual = markdown.convert(doc, "root")
         self.assertEqual(expected, actual)
 
+    def test_write(self):
+        """ Writing to a file gives the same text as convert() """
+        for backend in dynalist.BACKENDS:
+            doc = dynalist.Document.from_json_file(
+                os.path.join(TEST_DIR, "test_markdown_collapsed.json"), backend)
+            outfile = io.StringIO()
+            markdown.write(doc, "root", outfile)
+            self.assertEqual(markdown.convert(doc, "root"), outfile.getvalue(), backend)
+
+    def test_convert_node(self):
+        """ Converting a subtree at given levels """
+        data = json.loads(CONVERT_TESTS[0]["source"])
+        doc = dynalist.Document.from_dict(data)
+        self.assertEqual("### list-root\n\n#### item-1\n\n#### item-2\n\n#### item-3\n\n",
+                         markdown.convert_node(doc, "SPhwaj_3zX2hGgZHLTZ9LI0p", False, 3, 0))
+        self.assertEqual("        - list-root\n            - item-1\n            - item-2\n"
+                         "            - item-3\n",
+                         markdown.convert_node(doc, "SPhwaj_3zX2hGgZHLTZ9LI0p", False, 1, 3))
+
+    def test_search_tree(self):
+        """ Rendering only the nodes of a search tree """
+        data = json.loads(CONVERT_TESTS[0]["source"])
+        doc = dynalist.Document.from_dict(data)
+        tree = doc.get_search_index().get_tree("item-2")
+        self.assertEqual("# root\n\n## header\n\n- list-root\n    - item-2\n\n",
+                         markdown.convert(doc, "root", tree))
+        outfile = io.StringIO()
+        markdown.write(doc, "root", outfile, tree)
+        self.assertEqual(markdown.convert(doc, "root", tree), outfile.getvalue())
+
+    def test_deep_outline(self):
+        """ Outlines deeper than the recursion limit """
+        depth = sys.getrecursionlimit() + 100
+        nodes = [{"id": str(i), "content": "n", "note": "", "collapsed": i == 1,
+                  "children": [str(i + 1)]} for i in range(depth)]
+        nodes[0]["id"] = "root"
+        del nodes[-1]["children"]
+        doc = dynalist.Document.from_dict({"nodes": nodes})
+        lines = markdown.convert(doc, "root").splitlines()
+        self.assertEqual(["# n", "", "## n", "", "- n"], lines[:5])
+        self.assertEqual("    " * (depth - 3) + "- n", lines[-2])
+
 class TestMarkdown(unittest.TestCase):
     """ Test other markdown functions """
     def test_find_links(self):
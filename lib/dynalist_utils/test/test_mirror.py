@@ -0,0 +1,93 @@
+""" Tests for mirror """
+
+# Python
+import copy
+import unittest
+
+# Project
+from dynalist_utils import dynalist
+from dynalist_utils import mirror
+
+URL = "https://dynalist.io/d/doc1#z={}"
+
+NODES = [
+    {"id": "root", "content": "root", "note": "", "children": ["a", "b", "c", "d", "x", "y"]},
+    {"id": "a", "content": "Source", "note": "Details", "color": 2},
+    {"id": "b", "content": "old", "note": "[mirror](" + URL.format("a") + ")"},
+    {"id": "c", "content": "old", "note": "[mirror](" + URL.format("b") + ")", "heading": 1},
+    {"id": "d", "content": "Source", "note": "Details [mirror](" + URL.format("a") + ")",
+     "color": 2},
+    {"id": "x", "content": "x", "note": "[mirror](" + URL.format("y") + ")"},
+    {"id": "y", "content": "y", "note": "[mirror](" + URL.format("x") + ")"}]
+
+
+def make_doc(nodes=None):
+    """ Returns a Document of the given nodes, all children of the first """
+    nodes = copy.deepcopy(nodes or NODES)
+    nodes[0]["children"] = [node["id"] for node in nodes[1:]]
+    return dynalist.Document.from_dict({"file_id": "doc1", "nodes": nodes})
+
+
+def apply_changes(doc, changes):
+    """ Applies edit changes to a Document's nodes in place """
+    for change in changes:
+        node = doc.get_node(change["node_id"])
+        node.update((key, value) for key, value in change.items()
+                    if key not in ("action", "node_id"))
+
+
+class TestMirror(unittest.TestCase):
+    """ Tests for mirror.plan_changes() """
+
+    def test_transitive(self):
+        """ Mirrors of mirrors copy the original source, cycles are skipped """
+        doc = make_doc()
+        with self.assertLogs(level="ERROR"):
+            plan = mirror.plan_changes(doc)
+        self.assertEqual(["x", "y"], sorted(plan.cycles))
+        self.assertEqual((3, 0), (plan.examined, plan.skipped))
+        self.assertEqual([
+            {"action": "edit", "node_id": "b", "content": "Source",
+             "note": "Details [mirror](" + URL.format("a") + ")", "color": 2},
+            {"action": "edit", "node_id": "c", "content": "Source",
+             "note": "Details [mirror](" + URL.format("b") + ")", "color": 2, "heading": 0}],
+                         plan.changes)
+
+    def test_order(self):
+        """ Sources come before their mirrors, whatever the document order """
+        doc = make_doc(NODES[:1] + NODES[1:4][::-1])
+        ordered, cycles = mirror.order_mirror_nodes(mirror.find_mirror_nodes(doc))
+        self.assertEqual(["b", "c"], [item.target_node["id"] for item in ordered])
+        self.assertEqual([], cycles)
+
+    def test_state(self):
+        """ Only mirrors whose source changed are examined """
+        doc = make_doc(NODES[:5])
+        plan = mirror.plan_changes(doc)
+        apply_changes(doc, plan.changes)
+        plan = mirror.plan_changes(doc, plan.state)
+        self.assertEqual(([], 0, 3), (plan.changes, plan.examined, plan.skipped))
+
+        # The source changes: its mirrors, direct and indirect, follow
+        doc.get_node("a")["content"] = "Renamed"
+        plan = mirror.plan_changes(doc, plan.state)
+        self.assertEqual((3, 0), (plan.examined, plan.skipped))
+        self.assertEqual(["b", "c", "d"], sorted(change["node_id"] for change in plan.changes))
+        apply_changes(doc, plan.changes)
+
+        # A mirror edited by hand isn't read, until it is forgotten
+        doc.get_node("d")["color"] = 5
+        plan = mirror.plan_changes(doc, plan.state)
+        self.assertEqual(([], 0, 3), (plan.changes, plan.examined, plan.skipped))
+        plan = mirror.plan_changes(doc, mirror.forget_mirrors(plan.state, ["d"]))
+        self.assertEqual((1, 2), (plan.examined, plan.skipped))
+        self.assertEqual([{"action": "edit", "node_id": "d", "color": 2}], plan.changes)
+
+        # Another document's state is ignored
+        apply_changes(doc, plan.changes)
+        state = plan.state
+        state["file_id"] = "doc2"
+        self.assertEqual(3, mirror.plan_changes(doc, state).examined)
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,160 @@
+""" Tests for mirror_watch """
+
+# Python
+import os
+import unittest
+
+# Libraries
+import mock
+
+# Project
+from dynalist_utils import client
+from dynalist_utils import dynalist
+from dynalist_utils import mirror_watch
+from dynalist_utils.test import fake_dynalist
+
+URL = "https://dynalist.io/d/doc1#z={}"
+
+NODES = [
+    {"id": "root", "content": "root", "note": "", "children": ["a", "b", "c"]},
+    {"id": "a", "content": "Source", "note": "", "color": 2},
+    {"id": "b", "content": "old", "note": "[mirror](" + URL.format("a") + ")"},
+    {"id": "c", "content": "other", "note": ""}]
+
+
+class TestMirrorWatcher(unittest.TestCase):
+    """ Tests for mirror_watch.MirrorWatcher against a local stand-in server """
+
+    def setUp(self):
+        self.server = fake_dynalist.FakeDynalist().__enter__()
+        self.environ = mock.patch.dict(os.environ, {"DYNALIST_API_URL": self.server.url})
+        self.environ.start()
+        self.server.add_document("doc1", NODES)
+        self.api = client.DynalistClient(fake_dynalist.TOKEN, api_url=self.server.url)
+        self.states = []
+        self.watcher = mirror_watch.MirrorWatcher("https://dynalist.io/d/doc1",
+                                                  fake_dynalist.TOKEN, api=self.api,
+                                                  poll_interval=0.5,
+                                                  on_sync=self.states.append)
+
+    def tearDown(self):
+        self.api.close()
+        self.environ.stop()
+        self.server.__exit__()
+
+    def endpoints(self):
+        """ Returns and clears the endpoints the server has seen """
+        endpoints = [endpoint for endpoint, _, _ in self.server.requests]
+        self.server.requests.clear()
+        return endpoints
+
+    def get_node(self, node_id):
+        """ Returns a node of the served document """
+        return next(node for node in self.server.documents["doc1"]["nodes"]
+                    if node["id"] == node_id)
+
+    def test_watch(self):
+        """ Edits are pushed when the document changes, and only then """
+        self.assertLessEqual(self.watcher.step(), 0.5)
+        self.assertEqual(["doc/check_for_updates", "doc/read", "doc/edit"], self.endpoints())
+        self.assertEqual(("Source", 2), (self.get_node("b")["content"],
+                                         self.get_node("b")["color"]))
+        status = self.watcher.get_status()
+        self.assertEqual((1, 1, 1, 1, 1, 0), (status.version, status.mirrors, status.syncs,
+                                              status.last_changes, status.applied,
+                                              status.failed))
+
+        # Our own edit is read back, and found to be in place
+        self.watcher.step()
+        self.assertEqual(["doc/check_for_updates", "doc/read"], self.endpoints())
+        status = self.watcher.get_status()
+        self.assertEqual((2, 2, 0, 0), (status.version, status.syncs, status.last_examined,
+                                        status.last_changes))
+
+        # Nothing changed: one cheap version check
+        self.watcher.step()
+        self.assertEqual(["doc/check_for_updates"], self.endpoints())
+
+        # An unrelated edit is read but examines nothing; a source edit is pushed
+        self.get_node("c")["content"] = "changed"
+        self.server.documents["doc1"]["version"] += 1
+        self.watcher.step()
+        self.assertEqual(0, self.watcher.get_status().last_examined)
+        self.get_node("a")["content"] = "Renamed"
+        self.server.documents["doc1"]["version"] += 1
+        self.endpoints()
+        self.watcher.step()
+        self.assertEqual(["doc/check_for_updates", "doc/read", "doc/edit"], self.endpoints())
+        self.assertEqual("Renamed", self.get_node("b")["content"])
+        self.assertEqual(5, self.watcher.get_status().polls)
+        self.assertEqual(4, len(self.states))
+        self.assertIs(self.states[-1], self.watcher.get_state())
+
+    def test_poll_error(self):
+        """ A failed poll is counted and retried on the next step """
+        self.server.scripted = [(200, {}, {"_code": "InvalidToken"})]
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(0.5, self.watcher.step())
+        status = self.watcher.get_status()
+        self.assertEqual((1, 1, 0), (status.polls, status.poll_errors, status.syncs))
+        self.watcher.step()
+        self.assertEqual(1, self.watcher.get_status().syncs)
+
+    def test_sync_error(self):
+        """ A failed sync is counted and retried on the next step, though
+            the document hasn't changed """
+        error = dynalist.ApiException("ERROR: API request failed.", "Unauthorized")
+        with mock.patch.object(self.api, "edit_doc", side_effect=error):
+            with self.assertLogs(level="ERROR"):
+                self.watcher.step()
+        self.assertEqual("old", self.get_node("b")["content"])
+        status = self.watcher.get_status()
+        self.assertEqual((0, 1), (status.syncs, status.sync_errors))
+        self.endpoints()
+        self.watcher.step()
+        self.assertEqual(["doc/check_for_updates", "doc/edit"], self.endpoints())
+        self.assertEqual("Source", self.get_node("b")["content"])
+        self.assertEqual(1, self.watcher.get_status().syncs)
+
+    def test_failed_changes(self):
+        """ Changes the API didn't apply are sent again on the next step """
+        self.server.scripted = [(200, {}, {"_code": "Ok", "versions": {"doc1": 1}}),
+                                (200, {}, {"_code": "Ok", "file_id": "doc1", "title": "",
+                                           "version": 1, "nodes": NODES}),
+                                (200, {}, {"_code": "Ok", "results": [False]})]
+        with self.assertLogs(level="ERROR") as logs:
+            self.watcher.step()
+        self.assertEqual(["ERROR:root:Could not update b: ERROR: The API did not apply it."],
+                         logs.output)
+        self.assertEqual(1, self.watcher.get_status().failed)
+        self.endpoints()
+        self.watcher.step()
+        self.assertEqual(["doc/check_for_updates", "doc/edit"], self.endpoints())
+        self.assertEqual("Source", self.get_node("b")["content"])
+
+    def test_lost_change(self):
+        """ A change the read-back doesn't show is sent again """
+        self.server.scripted = [(200, {}, {"_code": "Ok", "versions": {"doc1": 1}}),
+                                (200, {}, {"_code": "Ok", "file_id": "doc1", "title": "",
+                                           "version": 1, "nodes": NODES}),
+                                (200, {}, {"_code": "Ok", "results": [True]})]
+        self.watcher.step()
+        self.assertEqual("old", self.get_node("b")["content"])
+        self.server.documents["doc1"]["version"] += 1
+        self.endpoints()
+        with self.assertLogs(level="WARNING"):
+            self.watcher.step()
+        self.assertEqual(["doc/check_for_updates", "doc/read", "doc/edit"], self.endpoints())
+        self.assertEqual("Source", self.get_node("b")["content"])
+
+    def test_run_forever(self):
+        """ Steps until stopped, calling on_step after each """
+        stop = mock.Mock()
+        stop.is_set.side_effect = [False, False, True]
+        steps = []
+        self.watcher.run_forever(stop, lambda: steps.append(self.watcher.get_status().polls))
+        self.assertEqual([1, 2], steps)
+        self.assertEqual(2, stop.wait.call_count)
+
+
+# vim: foldmethod=indent
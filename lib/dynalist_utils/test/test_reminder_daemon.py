@@ -0,0 +1,158 @@
+""" Tests for reminder_daemon """
+
+# Python
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import unittest
+
+# Project
+from dynalist_utils import reminder_daemon
+from dynalist_utils import reminders
+from dynalist_utils import watch
+from dynalist_utils.test import helpers
+
+START = datetime.datetime(2019, 4, 10, 6, 0)
+
+
+class FakeWatcher:
+    """ Hands out queued document versions as changes """
+    def __init__(self):
+        self.docs = {}
+        self.queued = []
+
+    def poll(self):
+        """ Returns the queued documents as changes """
+        changes = []
+        for ref, doc in self.queued:
+            changes.append(watch.Change(ref, self.docs.get(ref), doc))
+            self.docs[ref] = doc
+        self.queued = []
+        return changes
+
+
+class TestReminderDaemon(unittest.TestCase):
+    """ Tests for reminder_daemon.ReminderDaemon """
+
+    def setUp(self):
+        self.now = START
+        self.sent = []
+        self.watcher = FakeWatcher()
+        self.watcher.queued = [("d1", helpers.make_doc("d1", "one !(2019-04-10)")),
+                               ("d2", helpers.make_doc("d2", "two !(2019-04-09)"))]
+        routes = [reminders.Route(["a@example.com"], ["d1"], ["today"]),
+                  reminders.Route(["b@example.com"], ["d1", "d2"], ["today", "overdue"])]
+        self.daemon = reminder_daemon.ReminderDaemon(
+            routes, self.watcher, "r@example.com", self.sent.append,
+            [datetime.time(7, 0), datetime.time(18, 0)], poll_interval=60,
+            clock=lambda: self.now)
+
+    def bodies(self):
+        """ Returns and clears the (to, body) of sent messages """
+        bodies = [(message["To"], message.get_payload()[0].get_payload())
+                  for message in self.sent]
+        self.sent.clear()
+        return bodies
+
+    def test_schedule(self):
+        """ Polls on the interval and sends at the scheduled times """
+        self.assertEqual(60, self.daemon.step())
+        status = self.daemon.get_status()
+        self.assertEqual((2, 2, 2), (status.documents, status.dated_nodes,
+                                     status.last_poll_changed_nodes))
+        self.assertEqual(datetime.datetime(2019, 4, 10, 7, 0), status.next_run)
+        self.assertEqual([], self.sent)
+
+        self.now = datetime.datetime(2019, 4, 10, 7, 0, 30)
+        self.daemon.step()
+        bodies = self.bodies()
+        self.assertEqual(["a@example.com", "b@example.com"], [to for to, _ in bodies])
+        self.assertIn("one", bodies[1][1])
+        self.assertIn("two", bodies[1][1])
+        self.assertNotIn("two", bodies[0][1])
+        status = self.daemon.get_status()
+        self.assertEqual((2, 0, 0), (status.last_run_sent, status.last_run_failed,
+                                     status.pending_runs))
+        self.assertEqual(datetime.datetime(2019, 4, 10, 18, 0), status.next_run)
+
+    def test_changes(self):
+        """ Changed documents update the index from their changed nodes """
+        self.daemon.step()
+        self.watcher.queued = [("d1", helpers.make_doc("d1", "one !(2019-04-10)",
+                                                       "new !(2019-04-10)", version=2))]
+        self.now += datetime.timedelta(minutes=1)
+        self.daemon.step()
+        status = self.daemon.get_status()
+        self.assertEqual((1, 3), (status.last_poll_changed_nodes, status.dated_nodes))
+        self.daemon.run()
+        self.assertIn("new", self.bodies()[0][1])
+
+    def test_fell_behind(self):
+        """ Missed runs are folded into one """
+        self.daemon.step()
+        self.now = datetime.datetime(2019, 4, 11, 8, 0)
+        self.daemon.step()
+        self.assertEqual(2, len(self.sent))
+        status = self.daemon.get_status()
+        self.assertEqual(2, status.skipped_runs)
+        self.assertEqual(datetime.datetime(2019, 4, 11, 18, 0), status.next_run)
+        formatted = json.loads(json.dumps(reminder_daemon.format_status(status)))
+        self.assertEqual("2019-04-11T18:00:00", formatted["next_run"])
+
+    def test_send_failure(self):
+        """ A failed send is counted and the others still go out """
+        def send(message):
+            if message["To"] == "a@example.com":
+                raise Exception("refused")
+            self.sent.append(message)
+        daemon = reminder_daemon.ReminderDaemon(
+            [reminders.Route(["a@example.com"], ["d1"], ["today"]),
+             reminders.Route(["b@example.com"], ["d1"], ["today"])],
+            self.watcher, "r@example.com", send, [datetime.time(7, 0)],
+            clock=lambda: self.now)
+        daemon.poll()
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(1, daemon.run())
+        self.assertEqual((1, 1), daemon.get_status()[7:9])
+
+    def test_not_loaded(self):
+        """ Routes with documents that haven't loaded are not sent """
+        self.watcher.queued.pop()
+        self.now = datetime.datetime(2019, 4, 10, 7, 0)
+        with self.assertLogs(level="ERROR"):
+            self.daemon.step()
+        self.assertEqual(["a@example.com"], [to for to, _ in self.bodies()])
+        self.assertEqual((1, 1), (self.daemon.get_status().last_run_sent,
+                                  self.daemon.get_status().last_run_failed))
+
+
+class TestGetNextRun(unittest.TestCase):
+    """ Tests for reminder_daemon.get_next_run() and parse_time() """
+
+    def test_next_run(self):
+        """ Later today, or the first time tomorrow """
+        times = [reminder_daemon.parse_time("07:00"), reminder_daemon.parse_time("18:30")]
+        self.assertEqual(datetime.datetime(2019, 4, 10, 18, 30),
+                         reminder_daemon.get_next_run(times, datetime.datetime(2019, 4, 10, 7)))
+        self.assertEqual(datetime.datetime(2019, 4, 11, 7, 0),
+                         reminder_daemon.get_next_run(times, datetime.datetime(2019, 4, 10, 19)))
+        with self.assertRaises(ValueError):
+            reminder_daemon.get_next_run([], datetime.datetime(2019, 4, 10, 7))
+
+    def test_parse_time(self):
+        """ Bad times are argparse usage errors """
+        with self.assertRaises(argparse.ArgumentTypeError):
+            reminder_daemon.parse_time("7am")
+        with self.assertRaises(argparse.ArgumentTypeError):
+            reminder_daemon.parse_time("25:00")
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--at", type=reminder_daemon.parse_time)
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit):
+            parser.parse_args(["--at", "25:00"])
+        self.assertIn("Not a time of day (HH:MM): 25:00", stderr.getvalue())
+
+
+# vim: foldmethod=indent
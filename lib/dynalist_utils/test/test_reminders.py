@@ -0,0 +1,73 @@
+""" Tests for reminders """
+
+# Python
+import datetime
+import io
+import unittest
+
+# Project
+from dynalist_utils import dates
+from dynalist_utils import reminders
+from dynalist_utils.test import helpers
+
+TODAY = datetime.date(2019, 4, 10)
+
+
+class TestReadRoutes(unittest.TestCase):
+    """ Tests for reminders.read_routes() """
+
+    def test_routes(self):
+        """ Recipients may be one address or a list; windows default to all """
+        email_from, routes = reminders.read_routes(io.StringIO(
+            '{"from": "r@example.com", "routes": ['
+            '{"to": "a@example.com", "documents": ["d1"]},'
+            '{"to": ["b@example.com", "c@example.com"], "documents": ["d1", "d2"],'
+            ' "windows": ["overdue"]}]}'))
+        self.assertEqual("r@example.com", email_from)
+        self.assertEqual([reminders.Route(["a@example.com"], ["d1"], list(reminders.WINDOWS)),
+                          reminders.Route(["b@example.com", "c@example.com"], ["d1", "d2"],
+                                          ["overdue"])], routes)
+
+    def test_errors(self):
+        """ Bad configs are rejected """
+        for config in ('{"routes": []}',
+                       '{"routes": [{"to": "a@example.com"}]}',
+                       '{"routes": [{"to": "a", "documents": ["d"], "windows": ["later"]}]}'):
+            with self.assertRaises(Exception, msg=config):
+                reminders.read_routes(io.StringIO(config))
+
+
+class TestCreateMessages(unittest.TestCase):
+    """ Tests for reminders.get_sections() and create_messages() """
+
+    def test_sections(self):
+        """ Each window finds its range of days """
+        index = dates.DateIndex.from_documents([helpers.make_doc(
+            "d1", "late !(2019-04-01)", "now !(2019-04-10)", "soon !(2019-04-13)",
+            "week !(2019-04-17)", "later !(2019-04-18)")])
+        sections = reminders.get_sections(index, TODAY)
+        self.assertEqual([("Due Today", ["now"]), ("Overdue", ["late"]),
+                          ("Due Soon", ["soon"]), ("This Week", ["week"])],
+                         [(title, [item.content.split()[0] for item in items])
+                          for title, items in sections])
+
+    def test_routing(self):
+        """ One message per route, from the routed documents only """
+        docs = {"d1": helpers.make_doc("d1", "one !(2019-04-10)"),
+                "d2": helpers.make_doc("d2", "two !(2019-04-09)")}
+        routes = [reminders.Route(["a@example.com"], ["d1"], ["today"]),
+                  reminders.Route(["b@example.com", "c@example.com"], ["d1", "d2", "gone"],
+                                  ["today", "overdue"])]
+        messages = reminders.create_messages(routes, docs, TODAY, "r@example.com")
+        self.assertEqual(["a@example.com", "b@example.com, c@example.com"],
+                         [message["To"] for _, message in messages])
+        first = messages[0][1].get_payload()[0].get_payload()
+        second = messages[1][1].get_payload()[0].get_payload()
+        self.assertIn("one", first)
+        self.assertNotIn("two", first)
+        self.assertIn("<h1>Overdue</h1><ul><li>two !(2019-04-09)", second)
+        self.assertIn("https://dynalist.io/d/d2#z=n0", second)
+        self.assertEqual("Items due for 2019-04-10", messages[0][1]["Subject"])
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,108 @@
+""" Tests for search """
+
+# Python
+import unittest
+
+# Project
+from dynalist_utils import dynalist
+from dynalist_utils import search
+
+NODES = [
+    {"id": "root", "content": "Groceries", "note": "", "children": ["a", "b", "e"]},
+    {"id": "a", "content": "Red apples #fruit", "note": "From @bob", "children": ["c", "d"],
+     "color": 1},
+    {"id": "b", "content": "Apple pie", "note": "red-apple recipe !(2019-04-10)",
+     "checkbox": True, "checked": True},
+    {"id": "c", "content": "Pears #fruit-basket", "note": "", "checkbox": True},
+    {"id": "d", "content": "Applesauce", "note": "[link](https://example.com)"},
+    {"id": "e", "content": "bob@example.com #Fruit", "note": "", "color": 5}]
+
+
+def make_doc():
+    """ Returns a Document of the nodes """
+    return dynalist.Document.from_dict({"nodes": NODES})
+
+
+class TestSearch(unittest.TestCase):
+    """ Tests for search.SearchIndex and Document.search() """
+
+    def setUp(self):
+        self.doc = make_doc()
+
+    def find(self, query, node_id="root"):
+        """ Returns the ids of the nodes that match """
+        return [node["id"] for node in self.doc.search(query, node_id)]
+
+    def test_words(self):
+        """ Words match as prefixes, case-insensitively, in tree order; every
+            term must match """
+        self.assertEqual(["a", "d", "b"], self.find("APPLE"))
+        self.assertEqual(["a", "b"], self.find("apple red"))
+        self.assertEqual(["d"], self.find("applesauce"))
+        self.assertEqual([], self.find("kiwi"))
+        self.assertEqual(["a", "c", "d", "b", "e"], self.find(""))
+
+    def test_phrases(self):
+        """ Quoted words match exactly and in order """
+        self.assertEqual(["b"], self.find('"red apple"'))
+        self.assertEqual(["b"], self.find("red-apple"))
+        self.assertEqual([], self.find('"apple red"'))
+        self.assertEqual(["b"], self.find('"apple"'))
+
+    def test_tags(self):
+        """ Tags and mentions are their own terms """
+        self.assertEqual(["a", "e"], self.find("#fruit"))
+        self.assertEqual(["c"], self.find("#fruit-basket"))
+        self.assertEqual(["a"], self.find("@bob"))
+        self.assertEqual(["a", "e"], self.find("bob"))
+
+    def test_negation_and_scope(self):
+        """ Negated terms and searches within a subtree """
+        self.assertEqual(["c", "d", "e"], self.find("-red"))
+        self.assertEqual(["d"], self.find("apple -red"))
+        self.assertEqual(["c", "d"], self.find("", "a"))
+        self.assertEqual(["d"], self.find("apple", "a"))
+        self.assertEqual([], self.find("apple", "d"))
+        with self.assertRaises(Exception):
+            self.find("apple", "missing")
+
+    def test_filters(self):
+        """ Dynalist-style filters """
+        self.assertEqual(["b"], self.find("is:completed"))
+        self.assertEqual(["a", "c", "d", "e"], self.find("is:incomplete"))
+        self.assertEqual(["c", "b"], self.find("has:checkbox"))
+        self.assertEqual(["b"], self.find("has:date"))
+        self.assertEqual(["a", "d", "b"], self.find("has:note"))
+        self.assertEqual(["d"], self.find("has:link"))
+        self.assertEqual(["a"], self.find("color:red"))
+        self.assertEqual(["e"], self.find("color:5 #fruit"))
+        self.assertEqual(["c"], self.find("has:checkbox -is:completed"))
+        with self.assertRaises(Exception):
+            self.find("is:bogus")
+
+    def test_get_tree(self):
+        """ Matches with their ancestors, each node's children in tree
+            order """
+        def ids(tree):
+            return {node_id: [node["id"] for node in children]
+                    for node_id, children in tree.items()}
+        index = self.doc.get_search_index()
+        self.assertEqual({"root": ["a", "b"], "a": ["d"], "d": [], "b": []},
+                         ids(index.get_tree("apple")))
+        self.assertEqual({"root": ["a"], "a": ["c"], "c": []},
+                         ids(index.get_tree("pears")))
+        self.assertEqual({"a": ["c"], "c": []}, ids(index.get_tree("pears", "a")))
+        self.assertEqual({"root": []}, ids(index.get_tree("kiwi")))
+
+    def test_parse_query(self):
+        """ Queries become Terms """
+        self.assertEqual([search.Term(False, "word", "apple"),
+                          search.Term(True, "phrase", ("red", "apple")),
+                          search.Term(False, "tag", "#fruit"),
+                          search.Term(True, "filter", "color:1")],
+                         search.parse_query('Apple -"Red apple" #Fruit -color:red'))
+        self.assertEqual(5, len(self.doc.get_search_index()) - 1)
+        self.assertIs(self.doc.get_search_index(), self.doc.get_search_index())
+
+
+# vim: foldmethod=indent
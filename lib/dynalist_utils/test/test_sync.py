@@ -0,0 +1,83 @@
+""" Tests for sync """
+
+# Python
+import json
+import os
+import tempfile
+import unittest
+
+# Libraries
+import mock
+
+# Project
+from dynalist_utils import sync
+from dynalist_utils.test import fake_dynalist
+from dynalist_utils.test import helpers
+
+
+class TestSyncDirectory(unittest.TestCase):
+    """ Tests for sync.SyncDirectory against a local stand-in server """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = fake_dynalist.FakeDynalist().__enter__()
+        self.environ = mock.patch.dict(os.environ, {"DYNALIST_API_URL": self.server.url})
+        self.environ.start()
+        for doc_id in ("a", "b", "c"):
+            self.server.add_document(doc_id, helpers.make_nodes(doc_id))
+
+    def tearDown(self):
+        self.environ.stop()
+        self.server.__exit__()
+        self.directory.cleanup()
+
+    def read_local(self, doc_id):
+        """ Returns the root content of the local copy of a document. """
+        with open(os.path.join(self.directory.name, doc_id + ".json")) as infile:
+            return json.load(infile)["nodes"][0]["content"]
+
+    def endpoints(self):
+        """ Returns and clears the endpoints the server has seen. """
+        endpoints = [endpoint for endpoint, _, _ in self.server.requests]
+        self.server.requests.clear()
+        return endpoints
+
+    def test_sync(self):
+        """ Only changed documents are downloaded again """
+        directory = sync.SyncDirectory(self.directory.name)
+        result = directory.sync(["a", "b", "c"], fake_dynalist.TOKEN)
+        self.assertEqual(["a", "b", "c"], sorted(result.updated))
+        self.assertEqual(["doc/check_for_updates"] + ["doc/read"] * 3,
+                         self.endpoints())
+
+        # Nothing changed: one cheap check, no downloads
+        directory = sync.SyncDirectory(self.directory.name)
+        self.assertEqual({"a": 1, "b": 1, "c": 1}, directory.get_versions())
+        result = directory.sync(["a", "b", "c"], fake_dynalist.TOKEN)
+        self.assertEqual(sync.SyncResult([], ["a", "b", "c"], []), result)
+        self.assertEqual(["doc/check_for_updates"], self.endpoints())
+
+        # One document changed
+        self.server.add_document("b", helpers.make_nodes("b2"), version=2)
+        result = directory.sync(["a", "b", "c"], fake_dynalist.TOKEN)
+        self.assertEqual(sync.SyncResult(["b"], ["a", "c"], []), result)
+        self.assertEqual("b2", self.read_local("b"))
+        self.assertEqual(["doc/check_for_updates", "doc/read"], self.endpoints())
+
+    def test_missing_file(self):
+        """ Documents whose local file went missing are downloaded again """
+        directory = sync.SyncDirectory(self.directory.name)
+        directory.sync(["a"], fake_dynalist.TOKEN)
+        os.remove(directory.get_filename("a"))
+        self.assertEqual(["a"], directory.sync(["a"], fake_dynalist.TOKEN).updated)
+
+    def test_failures(self):
+        """ Unknown documents are reported as failed, not recorded """
+        directory = sync.SyncDirectory(self.directory.name)
+        with self.assertLogs(level="ERROR"):
+            result = directory.sync(["a", "nope"], fake_dynalist.TOKEN)
+        self.assertEqual(["nope"], result.failed)
+        self.assertNotIn("nope", directory.get_versions())
+
+
+# vim: foldmethod=indent
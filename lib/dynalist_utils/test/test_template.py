@@ -0,0 +1,167 @@
+""" Tests for template """
+
+# Python
+import collections
+import random
+import unittest
+
+# Project
+from dynalist_utils import dynalist
+from dynalist_utils import template
+
+NODES = [
+    {"id": "root", "content": "root", "note": "", "children": ["t"]},
+    {"id": "t", "content": "The {{animal}}  {{verb}} {{nowhere}}.", "note": "",
+     "children": ["animal", "verb", "color", "empty"]},
+    {"id": "animal", "content": "animal", "note": "", "children": ["a1", "a2", "a3"]},
+    {"id": "a1", "content": "cat", "note": ""},
+    {"id": "a2", "content": "{{color}} dog", "note": ""},
+    {"id": "a3", "content": "{{color}} {{animal}}", "note": ""},
+    {"id": "verb", "content": "verb", "note": "", "children": ["v1", "v2"]},
+    {"id": "v1", "content": "runs", "note": ""},
+    {"id": "v2", "content": "sleeps", "note": ""},
+    {"id": "color", "content": "color", "note": "", "children": ["c1", "c2"]},
+    {"id": "c1", "content": "red", "note": ""},
+    {"id": "c2", "content": "blue", "note": ""},
+    {"id": "empty", "content": "empty", "note": ""}]
+
+
+def make_doc():
+    """ Returns a Document of the template nodes """
+    return dynalist.Document.from_dict({"nodes": NODES})
+
+
+def process_by_rescanning(doc, node_id, rng):
+    """ The previous, rescanning process_template(), as a reference """
+    keys = {child["content"]: child for child in doc.get_children(node_id)}
+    text = doc.get_node(node_id)["content"]
+    while True:
+        match = template.FIELD_REGEX.search(text)
+        if not match:
+            break
+        key = match.group(1)
+        if key in keys:
+            value = rng.choice(doc.get_children(keys[key]["id"]))["content"]
+        else:
+            value = "MISS({})".format(key)
+        text = text[:match.start()] + value + text[match.end():]
+    return template.WHITESPACE_REGEX.sub(" ", text)
+
+
+class TestTemplate(unittest.TestCase):
+    """ Tests for template.compile_template() """
+
+    def test_tokens(self):
+        """ Literals are merged, fields become shared Choices """
+        with self.assertLogs(level="WARNING"):
+            compiled = template.compile_template(make_doc(), "t")
+        tokens = compiled.get_tokens()
+        self.assertEqual(("The ", " ", " MISS(nowhere)."), tokens[0::2])
+        animal, verb = tokens[1], tokens[3]
+        self.assertEqual(["runs", "sleeps"], verb)
+        self.assertEqual("cat", animal[0])
+        self.assertEqual((" dog",), animal[1][1:])
+        self.assertIs(animal, animal[2][2])
+        self.assertEqual((), compiled.get_missing_keys())
+
+    def test_same_as_rescanning(self):
+        """ A seeded rng gives the same texts as the rescanning version """
+        doc = make_doc()
+        with self.assertLogs(level="WARNING"):
+            compiled = template.compile_template(doc, "t")
+        expected_rng, rng = random.Random(42), random.Random(42)
+        expected = [process_by_rescanning(doc, "t", expected_rng) for _ in range(200)]
+        self.assertEqual(expected, list(compiled.iter_generate(200, rng)))
+        self.assertIn("The cat runs MISS(nowhere).", expected)
+
+    def test_flat(self):
+        """ Templates without nested fields, and without any fields """
+        doc = dynalist.Document.from_dict({"nodes": [
+            {"id": "root", "content": "{{color}}-{{color}}", "note": "",
+             "children": ["color", "empty"]},
+            {"id": "color", "content": "color", "note": "", "children": ["c1"]},
+            {"id": "c1", "content": "red", "note": ""},
+            {"id": "empty", "content": "empty", "note": ""}]})
+        self.assertEqual("red-red", template.process_template(doc, "root"))
+        self.assertEqual(["plain"], template.parse("plain", lambda key: None))
+        self.assertEqual([""], template.parse("", lambda key: None))
+
+    def test_whitespace(self):
+        """ Runs of whitespace across tokens are only collapsed if they can occur """
+        red, blank = template.Choice("red"), template.Choice("blank")
+        red.extend(["red", "dark red"])
+        blank.extend(["", " x"])
+        self.assertFalse(template.needs_cleanup(("a ", red, " b")))
+        self.assertTrue(template.needs_cleanup(("a ", red, " ", blank, " ")))
+        self.assertTrue(template.needs_cleanup(("a ", blank, " b")))
+        self.assertEqual("a red b", template.Template(("a ", red, " b")).generate(
+            random.Random(1)))
+        self.assertEqual("a b", template.Template(("a ", blank, " b")).generate(
+            random.Random(2)))
+
+    def test_missing_values(self):
+        """ Keys with no values are reported """
+        doc = dynalist.Document.from_dict({"nodes": [
+            {"id": "root", "content": "{{empty}}", "note": "", "children": ["empty"]},
+            {"id": "empty", "content": "empty", "note": ""}]})
+        compiled = template.compile_template(doc, "root")
+        self.assertEqual(("empty",), compiled.get_missing_keys())
+        with self.assertRaises(IndexError):
+            compiled.generate()
+
+
+
+class TestWeights(unittest.TestCase):
+    """ Tests for weighted picks """
+
+    def test_alias_table(self):
+        """ Picks follow the weights """
+        choice = template.Choice("key")
+        choice.extend(["a", "b", "c", "d"])
+        choice.set_weights([1, 0, 3, 4])
+        rng = random.Random(0)
+        counts = collections.Counter(choice.pick(rng) for _ in range(80000))
+        self.assertNotIn("b", counts)
+        for value, expected in (("a", 10000), ("c", 30000), ("d", 40000)):
+            self.assertAlmostEqual(expected, counts[value], delta=expected * 0.05)
+        self.assertIsNone(template.make_alias_table([0, 0]))
+
+    def test_weight_notes(self):
+        """ Weights are read from notes """
+        doc = dynalist.Document.from_dict({"nodes": [
+            {"id": "root", "content": "{{color}}", "note": "", "children": ["color"]},
+            {"id": "color", "content": "color", "note": "", "children": ["c1", "c2", "c3"]},
+            {"id": "c1", "content": "red", "note": "Weight: 0"},
+            {"id": "c2", "content": "blue", "note": "bright\nweight: 2.5"},
+            {"id": "c3", "content": "green", "note": ""}]})
+        self.assertEqual([0.0, 2.5, 1.0], [template.get_weight(doc.get_node(node_id))
+                                           for node_id in ("c1", "c2", "c3")])
+        compiled = template.compile_template(doc, "root")
+        self.assertEqual({"blue", "green"}, set(compiled.iter_generate(200)))
+        doc.get_node("c3")["note"] = "weight: -1"
+        with self.assertRaises(Exception):
+            template.compile_template(doc, "root")
+        for note in ("weight: 0", "weight: nan"):
+            doc.get_node("c2")["note"] = doc.get_node("c3")["note"] = note
+            with self.assertRaises(Exception):
+                template.compile_template(doc, "root")
+
+
+class TestGenerateSeeded(unittest.TestCase):
+    """ Tests for template.generate_seeded() """
+
+    def test_deterministic(self):
+        """ The same seed gives the same texts with any number of workers """
+        with self.assertLogs(level="WARNING"):
+            compiled = template.compile_template(make_doc(), "t")
+        serial = list(template.generate_seeded(compiled, 250, 7, chunk_size=40))
+        self.assertEqual(250, len(serial))
+        self.assertEqual(serial, list(template.generate_seeded(compiled, 250, 7, max_workers=3,
+                                                               chunk_size=40)))
+        self.assertEqual(serial[40:80], template.generate_chunk(1, 40, 7, compiled))
+        self.assertNotEqual(serial, list(template.generate_seeded(compiled, 250, 8,
+                                                                  chunk_size=40)))
+        self.assertEqual([], list(template.generate_seeded(compiled, 0, 7)))
+
+
+# vim: foldmethod=indent
@@ -0,0 +1,69 @@
+""" Tests for watch """
+
+# Python
+import os
+import unittest
+
+# Libraries
+import mock
+
+# Project
+from dynalist_utils.test import fake_dynalist
+from dynalist_utils.test import helpers
+from dynalist_utils import watch
+
+
+class TestDocumentWatcher(unittest.TestCase):
+    """ Tests for watch.DocumentWatcher against a local stand-in server """
+
+    def setUp(self):
+        self.server = fake_dynalist.FakeDynalist().__enter__()
+        self.environ = mock.patch.dict(os.environ, {"DYNALIST_API_URL": self.server.url})
+        self.environ.start()
+        for doc_id in ("a", "b"):
+            self.server.add_document(doc_id, helpers.make_nodes(doc_id))
+        self.watcher = watch.DocumentWatcher(["https://dynalist.io/d/a", "b", "b"],
+                                             fake_dynalist.TOKEN)
+
+    def tearDown(self):
+        self.environ.stop()
+        self.server.__exit__()
+
+    def endpoints(self):
+        """ Returns and clears the endpoints the server has seen. """
+        endpoints = sorted(endpoint for endpoint, _, _ in self.server.requests)
+        self.server.requests.clear()
+        return endpoints
+
+    def test_poll(self):
+        """ Only documents whose version changed are loaded again """
+        changes = self.watcher.poll()
+        self.assertEqual(["https://dynalist.io/d/a", "b"], [change.ref for change in changes])
+        self.assertEqual([None, None], [change.old_doc for change in changes])
+        self.assertEqual(["doc/check_for_updates", "doc/read", "doc/read"], self.endpoints())
+
+        self.assertEqual([], self.watcher.poll())
+        self.assertEqual(["doc/check_for_updates"], self.endpoints())
+        self.assertEqual((2, 0, 0), self.watcher.get_last_poll()[:3])
+
+        old_doc = self.watcher.get_document("b")
+        self.server.add_document("b", helpers.make_nodes("b2"), version=2)
+        changes = self.watcher.poll()
+        self.assertEqual([("b", old_doc)], [(change.ref, change.old_doc) for change in changes])
+        self.assertEqual("b2", self.watcher.get_document("b").get_root()["content"])
+        self.assertEqual(["doc/check_for_updates", "doc/read"], self.endpoints())
+
+    def test_failures(self):
+        """ Documents that fail to load are tried again """
+        self.server.documents.pop("a")
+        with self.assertLogs(level="ERROR"):
+            changes = self.watcher.poll()
+        self.assertEqual(["b"], [change.ref for change in changes])
+        self.assertEqual(1, self.watcher.get_last_poll().failed)
+        self.assertIsNone(self.watcher.get_document("https://dynalist.io/d/a"))
+        self.server.add_document("a", helpers.make_nodes("a"))
+        self.assertEqual(["https://dynalist.io/d/a"],
+                         [change.ref for change in self.watcher.poll()])
+
+
+# vim: foldmethod=indent
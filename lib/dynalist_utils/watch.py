@@ -0,0 +1,104 @@
+"""
+Follows a set of Dynalist documents as they change.
+
+Each poll asks the API for the current versions of all the documents in
+one request and downloads again only those whose version moved, keeping
+the latest copy of each in memory.
+"""
+
+# Python
+import collections
+import logging
+import threading
+import time
+
+# Project
+from dynalist_utils import batch
+from dynalist_utils import sync
+
+Change = collections.namedtuple("Change", ["ref", "old_doc", "new_doc"])
+Change.__doc__ = """ A document that was loaded for the first time, when
+    old_doc is None, or whose version changed. """
+
+PollStats = collections.namedtuple("PollStats", ["checked", "changed", "failed", "seconds"])
+
+
+class DocumentWatcher:
+    """ Keeps the latest version of each of the given documents (URLs or
+        doc ids).  Call poll() to bring them up to date. """
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, refs, token, max_workers=batch.DEFAULT_MAX_WORKERS, backend="dict",
+                 load=batch.load_document, get_versions=sync.get_versions,
+                 timer=time.perf_counter):
+        self.__refs = list(dict.fromkeys(refs))
+        self.__doc_ids = {ref: batch.get_doc_id(ref) for ref in self.__refs}
+        self.__token = token
+        self.__max_workers = max_workers
+        self.__backend = backend
+        self.__load = load
+        self.__get_versions = get_versions
+        self.__timer = timer
+        self.__docs = {}
+        self.__versions = {}
+        self.__last_poll = None
+
+
+    def poll(self):
+        """ Checks the versions of all the documents and reloads the ones
+            that changed, or were never loaded, concurrently.  Returns a list
+            of Changes in the order the documents were given.  Documents that
+            fail to load are logged and tried again on the next poll. """
+        start = self.__timer()
+        versions = self.__get_versions(list(self.__doc_ids.values()), self.__token)
+        stale = [ref for ref in self.__refs
+                 if ref not in self.__docs
+                 or versions.get(self.__doc_ids[ref]) != self.__versions.get(ref)]
+        changes = {}
+        failed = 0
+        for result in batch.load_documents(stale, self.__token, self.__max_workers,
+                                           backend=self.__backend, load=self.__load):
+            if result.error:
+                logging.error("Could not load %s: %s", result.ref, result.error)
+                failed += 1
+                continue
+            changes[result.ref] = Change(result.ref, self.__docs.get(result.ref), result.doc)
+            self.__docs[result.ref] = result.doc
+            self.__versions[result.ref] = result.doc.get_metadata().get(
+                "version", versions.get(self.__doc_ids[result.ref]))
+        self.__last_poll = PollStats(len(self.__refs), len(changes), failed,
+                                     self.__timer() - start)
+        return [changes[ref] for ref in self.__refs if ref in changes]
+
+
+    def get_refs(self):
+        """ Returns the watched documents' references, in order. """
+        return list(self.__refs)
+
+
+    def get_document(self, ref):
+        """ Returns the latest copy of a document, or None if it hasn't been
+            loaded yet. """
+        return self.__docs.get(ref)
+
+
+    def get_last_poll(self):
+        """ Returns the PollStats of the last poll, or None. """
+        return self.__last_poll
+
+
+
+def run_forever(step, stop=None, on_step=None):
+    """ Calls step(), which returns the number of seconds to wait before
+        calling it again, until the stop threading.Event, if given, is set.
+        on_step(), if given, is called after every step, e.g. to write a
+        status file. """
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        wait = step()
+        if on_step:
+            on_step()
+        stop.wait(wait)
+
+
+# vim: foldmethod=indent